@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Rende importabile il pacchetto condiviso smart_physio dalla radice del progetto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smart_physio import dataset
+from smart_physio.dataset import RAW_VALID_LABELS, LABEL_MAPPING, build_dataset_index, load_dataset_index
+
+SUBJECTS = ("Alberto", "Etienne", "amir", "dorsa")
+
+
+def create_synthetic_dataset(folder, n_captures):
+    """File vuoti con i nomi del dataset reale: n_captures acquisizioni x 3 antenne."""
+    for i in range(n_captures):
+        subject = SUBJECTS[i % len(SUBJECTS)]
+        label = RAW_VALID_LABELS[(i // len(SUBJECTS)) % len(RAW_VALID_LABELS)].capitalize()
+        base = f"{subject}_{label}_Fisio_2025{i // 86400 % 12 + 1:02d}01-{i % 86400:06d}"
+        for rx_key in ("rx0", "rx1", "rx2"):
+            open(os.path.join(folder, f"{base}_Infineon_{rx_key}.npy"), "wb").close()
+
+
+def legacy_group_dataset_files(base_path):
+    """Il raggruppamento degli script originali: listdir, rsplit e ricerca delle etichette per ogni file."""
+    file_groups = {}
+    for f in os.listdir(base_path):
+        if f.endswith(".npy"):
+            parts = f.rsplit('_', 2)
+            if len(parts) < 3:
+                continue
+            acquisition_base_name = "_".join(parts[:-2])
+            rx_suffix_full = parts[-1]
+            rx_key = None
+            for suffix in ['rx0.npy', 'rx1.npy', 'rx2.npy']:
+                if suffix in rx_suffix_full:
+                    rx_key = suffix.split('.')[0]
+                    break
+            if not rx_key:
+                continue
+            if acquisition_base_name not in file_groups:
+                file_groups[acquisition_base_name] = {'rx0': None, 'rx1': None, 'rx2': None, 'label': None}
+            file_groups[acquisition_base_name][rx_key] = f
+            found_label = None
+            for label in sorted(RAW_VALID_LABELS, key=len, reverse=True):
+                if label.lower() in acquisition_base_name.lower():
+                    found_label = label
+                    break
+            if found_label:
+                file_groups[acquisition_base_name]['label'] = LABEL_MAPPING[found_label.lower()]
+            else:
+                del file_groups[acquisition_base_name]
+    return file_groups
+
+
+def timed(label, function, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<42} {best * 1e3:8.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan, group and filter a synthetic dataset of empty captures.")
+    parser.add_argument("--captures", type=int, default=33334, help="Acquisitions (3 files each).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        folder = os.path.join(root, "Dataset")
+        os.makedirs(folder)
+        create_synthetic_dataset(folder, args.captures)
+        print(f"Files: {len(os.listdir(folder))}")
+
+        timed("legacy listdir + rsplit + label scan", lambda: legacy_group_dataset_files(folder))
+        timed("scandir + regex index (cold)", lambda: build_dataset_index(folder))
+        load_dataset_index(folder)
+
+        def from_disk():
+            dataset._INDEX_CACHE.clear()
+            return load_dataset_index(folder)
+
+        timed("index from the .index.json cache", from_disk)
+        index = timed("index from the in-process cache", lambda: load_dataset_index(folder))
+        groups = timed("group all captures", lambda: index.groups(verbose=False))
+        selected = timed("filter subject=Alberto, label=left_leg_up",
+                         lambda: index.groups(subjects=["Alberto"], labels=["left_leg_up"], verbose=False))
+        print(f"Groups: {len(groups)}, filtered: {len(selected)}")
+
+
+if __name__ == "__main__":
+    main()
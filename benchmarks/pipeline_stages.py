@@ -0,0 +1,241 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: la memoria di picco non viene misurata
+    resource = None
+
+# Rende importabile il pacchetto condiviso smart_physio dalla radice del progetto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smart_physio.capture_io import CHANNEL_FUSIONS, fused_magnitude, fusion_channel, open_capture, select_capture_slice
+from smart_physio.clutter import CLUTTER_REMOVALS, remove_clutter
+from smart_physio.dataset import build_dataset_index
+from smart_physio.doppler import FEATURES, antenna_spectrograms
+from smart_physio.image_io import encode_gray_png, quantize_to_gray
+from smart_physio.pipeline import SENSORS, PipelineConfig, image_file_name, run_pipeline
+from smart_physio.synthetic import CAPTURE_FORMATS, write_synthetic_dataset
+from smart_physio.transforms import NORMALIZATIONS, apply_normalization, merge_antennas
+
+RESULTS_VERSION = 1
+# Fasi misurate separatamente, nell'ordine della pipeline
+STAGES = ("scan", "load", "magnitude", "clutter", "doppler", "merge", "normalize", "encode", "write")
+
+
+def peak_rss_mb():
+    """Memoria residente di picco del processo in MB (None dove resource non esiste)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux riporta KB, macOS byte
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def time_stages(config, dataset_path, output_path):
+    """
+    Esegue la pipeline di un'acquisizione alla volta misurando ogni fase:
+    scan (indice della cartella), load (lettura della fetta usata dal memory-map),
+    magnitude (np.abs), clutter (rimozione del clutter, se scelta), doppler (spettrogrammi micro-Doppler
+    al posto di magnitude e clutter, con feature="doppler"), merge (RX0 | RX1 | ...), normalize,
+    encode (livelli di grigio + PNG), write.
+    Nella pipeline load e magnitude sono un'unica operazione; qui sono separate per misurarle.
+    """
+    totals = Counter()
+    start = time.perf_counter()
+    file_groups = build_dataset_index(dataset_path).groups(verbose=False)
+    totals["scan"] = time.perf_counter() - start
+
+    os.makedirs(output_path, exist_ok=True)
+    channel = fusion_channel(config.channel_fusion, config.sensor_spec.channel)
+    for base_name, files_info in file_groups.items():
+        t0 = time.perf_counter()
+        slices = [
+            np.array(select_capture_slice(open_capture(os.path.join(dataset_path, files_info[rx_key])),
+                                          config.bin_range, channel))
+            for rx_key in config.antennas
+        ]
+        t1 = time.perf_counter()
+        if config.stft_window is None:
+            magnitudes = [fused_magnitude(capture_slice, config.channel_fusion) for capture_slice in slices]
+            t2 = time.perf_counter()
+            for magnitude in magnitudes:
+                remove_clutter(magnitude, config.clutter, config.clutter_alpha)
+            t3 = t4 = time.perf_counter()
+        else:
+            t2 = t3 = t1
+            spectrograms = antenna_spectrograms(dict(zip(config.antennas, slices)), config.stft_window,
+                                                config.channel_fusion)
+            magnitudes = [spectrograms[rx_key] for rx_key in config.antennas]
+            t4 = time.perf_counter()
+        merged = merge_antennas(magnitudes)[:config.max_height]
+        t5 = time.perf_counter()
+        image = apply_normalization(merged, config.normalization)
+        t6 = time.perf_counter()
+        png = encode_gray_png(quantize_to_gray(image))
+        t7 = time.perf_counter()
+        file_name = image_file_name(base_name, files_info['label'], config.sensor_spec.output_tag)
+        with open(os.path.join(output_path, file_name), "wb") as f:
+            f.write(png)
+        t8 = time.perf_counter()
+        times = (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5, t7 - t6, t8 - t7)
+        for stage, elapsed in zip(STAGES[1:], times):
+            totals[stage] += elapsed
+    return len(file_groups), totals
+
+
+def stage_report(n_captures, totals):
+    return {
+        stage: {
+            "total_s": totals[stage],
+            "per_capture_us": totals[stage] / n_captures * 1e6,
+            "captures_per_s": n_captures / totals[stage] if totals[stage] else None,
+        }
+        for stage in STAGES
+    }
+
+
+def bench_sensor(sensor, args, root):
+    """Genera il dataset sintetico di un sensore e ne misura fasi e pipeline completa."""
+    antennas = ("rx0", "rx1", "rx2")[:args.antennas]
+    dataset_path = os.path.join(root, sensor, "Dataset")
+    start = time.perf_counter()
+    write_synthetic_dataset(dataset_path, sensor, args.captures, args.frames, antennas, seed=args.seed)
+    print(f"[{sensor}] wrote {args.captures} synthetic captures in {time.perf_counter() - start:.1f} s")
+
+    config = PipelineConfig(sensor=sensor, antennas=antennas, max_height=args.max_height or None,
+                            normalization=args.normalization, channel_fusion=args.channel_fusion,
+                            clutter=args.clutter, feature=args.feature)
+    best = None
+    for _ in range(args.repeat):
+        n_captures, totals = time_stages(config, dataset_path, os.path.join(root, sensor, "stages"))
+        if best is None or sum(totals.values()) < sum(best.values()):
+            best = totals
+
+    # Pipeline completa (un processo), come la eseguono gli script
+    end_to_end = {}
+    for mode in ("per_group", "batch"):
+        times = []
+        for _ in range(args.repeat):
+            # I messaggi "Saving: ..." della pipeline non vengono stampati durante la misura
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                run_pipeline(config, dataset_path, os.path.join(root, sensor, mode), batch=mode == "batch")
+                times.append(time.perf_counter() - start)
+        end_to_end[mode] = {"total_s": min(times), "captures_per_s": n_captures / min(times)}
+
+    return {
+        "captures": n_captures,
+        "frame_shape": list(CAPTURE_FORMATS[sensor][0]),
+        "dtype": np.dtype(CAPTURE_FORMATS[sensor][1]).name,
+        "stages": stage_report(n_captures, best),
+        "end_to_end": end_to_end,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_results(results):
+    for sensor, result in results["sensors"].items():
+        print(f"\n{sensor}: {result['captures']} captures {result['dtype']} (frames, {result['frame_shape']})")
+        for stage, values in result["stages"].items():
+            rate = values["captures_per_s"]
+            print(f"  {stage:<10} {values['per_capture_us']:10.1f} us/capture"
+                  + (f" {rate:12.0f} captures/s" if rate else ""))
+        for mode, values in result["end_to_end"].items():
+            print(f"  pipeline {mode:<9} {values['total_s']:8.3f} s {values['captures_per_s']:10.0f} captures/s")
+        if result["peak_rss_mb"] is not None:
+            print(f"  peak RSS so far: {result['peak_rss_mb']:.1f} MB")
+
+
+def compare_results(results, baseline, tolerance):
+    """
+    Confronta con un file JSON precedente: stampa il rapporto dei tempi e restituisce
+    le misure più lente del baseline di oltre tolerance (es. 0.2 = 20%).
+    """
+    regressions = []
+    print(f"\nComparison with baseline (tolerance {tolerance:.0%}):")
+    for sensor, result in results["sensors"].items():
+        old = baseline.get("sensors", {}).get(sensor)
+        if old is None:
+            print(f"  {sensor}: not in baseline")
+            continue
+        pairs = [(f"stage {stage}", result["stages"][stage]["per_capture_us"],
+                  old["stages"].get(stage, {}).get("per_capture_us")) for stage in STAGES]
+        pairs += [(f"pipeline {mode}", 1 / values["captures_per_s"],
+                   1 / old["end_to_end"][mode]["captures_per_s"] if mode in old.get("end_to_end", {}) else None)
+                  for mode, values in result["end_to_end"].items()]
+        for name, new_value, old_value in pairs:
+            if not old_value:
+                continue
+            ratio = new_value / old_value
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag = "  REGRESSION"
+                regressions.append(f"{sensor} {name}")
+            print(f"  {sensor:<10} {name:<20} x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each preprocessing stage on synthetic captures.")
+    parser.add_argument("--sensors", nargs="+", choices=sorted(SENSORS), default=sorted(SENSORS))
+    parser.add_argument("--captures", type=int, default=200, help="Synthetic captures per sensor.")
+    parser.add_argument("--frames", type=int, default=100, help="Frames per capture.")
+    parser.add_argument("--antennas", type=int, choices=(1, 2, 3), default=2)
+    parser.add_argument("--max-height", type=int, default=125, help="0 = whole capture.")
+    parser.add_argument("--normalization", choices=NORMALIZATIONS, default="log")
+    parser.add_argument("--channel-fusion", choices=CHANNEL_FUSIONS, default="single",
+                        help="Combination of the internal channels of Infineon captures.")
+    parser.add_argument("--clutter", choices=CLUTTER_REMOVALS, default="none", help="Static clutter removal.")
+    parser.add_argument("--feature", choices=FEATURES, default="range_time",
+                        help="Image content: range-time magnitude or micro-Doppler spectrogram.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the fastest is kept.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON file from a previous run.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="With --compare, slowdown that counts as a regression (default: 0.2 = 20%%).")
+    args = parser.parse_args()
+
+    results = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": {name: getattr(args, name) for name in
+                   ("captures", "frames", "antennas", "max_height", "normalization", "channel_fusion",
+                    "clutter", "feature", "repeat", "seed")},
+        "sensors": {},
+    }
+    with tempfile.TemporaryDirectory() as root:
+        for sensor in args.sensors:
+            results["sensors"][sensor] = bench_sensor(sensor, args, root)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"\nResults written to {args.json}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Rende importabile il pacchetto condiviso smart_physio dalla radice del progetto
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smart_physio.capture_io import select_capture_slice
+from smart_physio.streaming import DEFAULT_WINDOW, FRAME_PERIOD_S, StreamingPreprocessor
+from smart_physio.transforms import normalize_and_log_transform
+
+# Forma e tipo di un frame di ogni sensore (una riga dell'acquisizione .npy)
+FRAME_SHAPES = {
+    "infineon": ((4, 128), np.float32),
+    "sr250mate": ((120,), np.complex64),
+}
+
+
+def synthetic_frames(sensor, n_frames, n_antennas, seed=0):
+    """Frame casuali con la forma e il tipo di quelli del sensore: (antenne, frames, ...)."""
+    shape, dtype = FRAME_SHAPES[sensor]
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((n_antennas, n_frames) + shape).astype(np.float32)
+    if dtype == np.complex64:
+        data = data + 1j * rng.standard_normal(data.shape).astype(np.float32)
+    return data.astype(dtype)
+
+
+def percentiles_us(samples_ns):
+    samples_us = np.asarray(samples_ns, dtype=np.float64) / 1e3
+    return {"p50": np.percentile(samples_us, 50), "p99": np.percentile(samples_us, 99), "max": samples_us.max()}
+
+
+def format_stats(stats):
+    return ", ".join(f"{name}={value:.1f} us" for name, value in stats.items())
+
+
+def bench_streaming(frames, antennas, window, hop):
+    """Latenza di push() per ogni frame, separando i frame che emettono una finestra."""
+    preprocessor = StreamingPreprocessor(antennas=antennas, window=window, hop=hop)
+    plain, emitting = [], []
+    for t in range(frames.shape[1]):
+        frame = [frames[a, t] for a in range(len(antennas))]
+        start = time.perf_counter_ns()
+        image = preprocessor.push(frame)
+        elapsed = time.perf_counter_ns() - start
+        (plain if image is None else emitting).append(elapsed)
+    return plain, emitting
+
+
+def bench_recompute(frames, antennas, window, hop):
+    """Riferimento: a ogni hop si ricostruisce e si normalizza da zero l'intera finestra."""
+    n_frames = frames.shape[1]
+    latencies = []
+    for end in range(window, n_frames + 1, hop):
+        start = time.perf_counter_ns()
+        merged = np.hstack([np.abs(select_capture_slice(f[end - window:end])) for f in frames])
+        normalize_and_log_transform(merged)
+        latencies.append(time.perf_counter_ns() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame latency of the streaming preprocessor.")
+    parser.add_argument("--sensor", choices=sorted(FRAME_SHAPES), default="infineon")
+    parser.add_argument("--antennas", type=int, choices=(2, 3), default=3)
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW)
+    parser.add_argument("--hop", type=int, default=25, help="Frames between two emitted windows (25 = 1 s).")
+    args = parser.parse_args()
+
+    antennas = ("rx0", "rx1", "rx2")[:args.antennas]
+    frames = synthetic_frames(args.sensor, args.frames, len(antennas))
+    # Riscaldamento: allocazioni pigre di NumPy e cache
+    bench_streaming(frames[:, :2 * args.window], antennas, args.window, args.hop)
+
+    plain, emitting = bench_streaming(frames, antennas, args.window, args.hop)
+    recompute = bench_recompute(frames, antennas, args.window, args.hop)
+
+    print(f"Sensor: {args.sensor}, antennas: {len(antennas)}, frames: {args.frames}, "
+          f"window: {args.window}, hop: {args.hop}")
+    print(f"Frame period: {FRAME_PERIOD_S * 1e6:.0f} us")
+    print(f"push() without window:  {format_stats(percentiles_us(plain))}")
+    print(f"push() emitting window: {format_stats(percentiles_us(emitting))}")
+    print(f"full window recompute:  {format_stats(percentiles_us(recompute))}")
+    # Latenza costante: la mediana del primo e dell'ultimo quarto dello stream coincidono
+    quarter = len(plain) // 4
+    print(f"Median push() latency, first vs last quarter of the stream: "
+          f"{np.median(plain[:quarter]) / 1e3:.1f} us vs {np.median(plain[-quarter:]) / 1e3:.1f} us")
+    worst = max(max(plain), max(emitting)) / 1e9
+    print(f"Worst-case push() uses {100 * worst / FRAME_PERIOD_S:.2f}% of the frame period.")
+
+
+if __name__ == "__main__":
+    main()
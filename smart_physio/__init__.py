@@ -0,0 +1,3 @@
+"""
+Funzioni condivise della pipeline di pre-processing radar (Infineon e SR250Mate).
+"""
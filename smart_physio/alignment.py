@@ -0,0 +1,155 @@
+import numpy as np
+
+from .streaming import FRAME_PERIOD_S
+
+# --- ALLINEAMENTO DELLE ANTENNE ---
+# Le acquisizioni rx0, rx1 e rx2 di un gruppo possono avere un numero di frame diverso e, in
+# streaming, i frame delle antenne arrivano leggermente sfasati. Politiche:
+# - "strict": altezze diverse = gruppo scartato ("Inconsistent heights"), come gli script originali
+# - "trim":   solo i frame presenti in tutte le antenne (la sovrapposizione comune)
+# - "pad":    tutti i frame; quelli mancanti a un'antenna sono zeri (come con pad_height)
+# I frame sono associati per indice (le acquisizioni di un gruppo partono insieme) o, in
+# streaming, per numero di sequenza o istante di acquisizione.
+ALIGNMENTS = ("strict", "trim", "pad")
+
+# Frame di anticipo dell'antenna più avanti oltre i quali un frame incompleto non è più atteso
+DEFAULT_MAX_SKEW = 4
+
+
+def check_alignment(mode):
+    if mode not in ALIGNMENTS:
+        raise ValueError(f"Unknown antenna alignment '{mode}', expected one of {ALIGNMENTS}")
+    return mode
+
+
+def aligned_height(heights, mode="strict"):
+    """Righe delle antenne allineate, da quelle di ogni antenna; None se "strict" scarta il gruppo."""
+    if min(heights) == max(heights):
+        return heights[0]
+    if mode == "trim":
+        return min(heights)
+    if mode == "pad":
+        return max(heights)
+    return None
+
+
+def merge_aligned(antenna_data, rows, out=None):
+    """
+    Come merge_antennas, per antenne di altezza diversa: le prime rows righe di ogni antenna
+    affiancate (RX0 | RX1 | RX2), con zeri al posto delle righe che un'antenna non ha.
+    I dati sono letti dalle matrici originali (anche viste in memory-map): l'unica copia è
+    quella nella matrice affiancata, come per antenne della stessa altezza.
+    """
+    width = sum(data.shape[1] for data in antenna_data)
+    if out is None:
+        out = np.empty((rows, width), dtype=np.result_type(*antenna_data))
+    column = 0
+    for data in antenna_data:
+        n_bins = data.shape[1]
+        used = min(rows, data.shape[0])
+        out[:used, column:column + n_bins] = data[:used]
+        out[used:, column:column + n_bins] = 0
+        column += n_bins
+    return out
+
+
+class AntennaAligner:
+    """
+    Allineamento incrementale di stream di frame separati per antenna: push() riceve un frame
+    di un'antenna con il suo indice (numero di sequenza, o istante di acquisizione convertito
+    in indice con period_s) e restituisce i frame completi, in ordine, come (indice, [frame per
+    antenna]). I frame restituiti sono gli array ricevuti (nessuna copia); con "pad" i frame
+    mancanti sono un array di zeri condiviso, in sola lettura.
+    Un indice incompleto è atteso finché l'antenna più avanti non lo supera di max_skew frame,
+    poi è scartato ("trim") o completato con zeri ("pad"). I frame che arrivano dopo sono contati
+    come late e ignorati.
+    """
+
+    def __init__(self, antennas=("rx0", "rx1"), mode="trim", max_skew=DEFAULT_MAX_SKEW, period_s=FRAME_PERIOD_S):
+        if check_alignment(mode) == "strict":
+            raise ValueError("Streaming alignment needs 'trim' or 'pad': frames arrive one at a time")
+        if max_skew < 0:
+            raise ValueError(f"Invalid max skew {max_skew}")
+        self.antennas = tuple(antennas)
+        self.mode = mode
+        self.max_skew = max_skew
+        self.period_s = period_s
+        self._zeros = [None] * len(self.antennas)
+        self.reset()
+
+    def reset(self):
+        """Dimentica i frame in attesa e la numerazione (es. riconnessione del sensore)."""
+        self._pending = {}
+        self._next = None
+        self._latest = None
+        self._origin = None
+        self._received = [0] * len(self.antennas)
+        self.aligned = 0
+        self.dropped = 0
+        self.padded = 0
+        self.late = 0
+
+    def frame_index(self, timestamp):
+        """Indice del frame acquisito a timestamp (secondi), contando dal primo frame ricevuto."""
+        if self._origin is None:
+            self._origin = timestamp
+        return int(round((timestamp - self._origin) / self.period_s))
+
+    def push(self, antenna, frame, index=None, timestamp=None):
+        """
+        Aggiunge il frame di un'antenna (rx_key o posizione in antennas). Senza index né timestamp
+        l'indice è il numero di frame già ricevuti da quell'antenna.
+        Restituisce la lista, anche vuota, dei frame completi (indice, [frame per antenna]).
+        """
+        position = self.antennas.index(antenna) if isinstance(antenna, str) else antenna
+        if index is None:
+            index = self.frame_index(timestamp) if timestamp is not None else self._received[position]
+        self._received[position] += 1
+        if self._zeros[position] is None:
+            zeros = np.zeros(np.shape(frame), dtype=np.asarray(frame).dtype)
+            zeros.flags.writeable = False
+            self._zeros[position] = zeros
+        if self._next is None:
+            self._next = self._latest = index
+        if index < self._next:
+            self.late += 1
+            return []
+        slot = self._pending.get(index)
+        if slot is None:
+            slot = self._pending[index] = [None] * len(self.antennas)
+        slot[position] = frame
+        self._latest = max(self._latest, index)
+        return self._release(self._latest - self.max_skew)
+
+    def flush(self):
+        """Fine dello stream: restituisce i frame ancora in attesa, allineati con la politica scelta."""
+        if self._latest is None:
+            return []
+        return self._release(self._latest + 1)
+
+    def _release(self, expired):
+        """Frame completi dall'indice _next in poi; quelli incompleti con indice < expired non sono più attesi."""
+        ready = []
+        while self._pending:
+            slot = self._pending.get(self._next)
+            if slot is None:
+                if self._next >= expired:
+                    break
+                # Nessuna antenna ha questo indice (frame perso a monte da tutte)
+                self._next = min(self._pending)
+                continue
+            complete = all(frame is not None for frame in slot)
+            if not complete and self._next >= expired:
+                break
+            del self._pending[self._next]
+            if complete:
+                self.aligned += 1
+                ready.append((self._next, slot))
+            elif self.mode == "pad" and all(slot[i] is not None or self._zeros[i] is not None for i in range(len(slot))):
+                # Servono la forma e il tipo dei frame dell'antenna: un'antenna mai ricevuta non si completa
+                self.padded += 1
+                ready.append((self._next, [self._zeros[i] if frame is None else frame for i, frame in enumerate(slot)]))
+            else:
+                self.dropped += 1
+            self._next += 1
+        return ready
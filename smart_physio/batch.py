@@ -0,0 +1,224 @@
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from .alignment import aligned_height
+from .capture_io import fused_magnitude, fusion_channel, open_capture, select_capture_slice
+from .clutter import DEFAULT_CLUTTER_ALPHA, remove_clutter
+from .doppler import DOPPLER_BATCH_SAMPLES, doppler_spectrogram, static_free_signal
+from .instrumentation import SKIP_HEIGHT_MISMATCH, SKIP_LOAD_ERROR, SKIP_WIDTH_MISMATCH, get_recorder
+
+
+@dataclass
+class CaptureBatch:
+    """
+    Acquisizioni di più gruppi impilate in un unico tensore.
+    - data: magnitudine o spettrogramma Doppler (gruppi, frames, antenne, bins);
+      le righe oltre lengths[i] sono zeri
+    - lengths: righe valide di ogni gruppo
+    """
+    base_names: list
+    labels: list
+    antennas: tuple
+    bin_range: tuple
+    data: np.ndarray
+    lengths: np.ndarray
+
+    def __len__(self):
+        return len(self.base_names)
+
+    def select(self, antennas, bin_range, height=None, groups=None, dtype=None):
+        """
+        Immagini (gruppi, righe, antenne x bins) per un sottoinsieme di antenne e range bins,
+        con le antenne affiancate come in merge_antennas (RX0 | RX1 | RX2).
+        groups: indici dei gruppi da includere (None = tutti).
+        Restituisce sempre una copia contigua, che può essere normalizzata sul posto.
+        """
+        antenna_index = [self.antennas.index(rx_key) for rx_key in antennas]
+        start = bin_range[0] - self.bin_range[0]
+        stop = bin_range[1] - self.bin_range[0]
+        data = self.data if groups is None else self.data[np.asarray(groups, dtype=np.intp)]
+        height = data.shape[1] if height is None else height
+        images = np.zeros((data.shape[0], height, len(antenna_index), stop - start), dtype=dtype or data.dtype)
+        rows = min(height, data.shape[1])
+        images[:, :rows] = data[:, :rows, antenna_index, start:stop]
+        return images.reshape(data.shape[0], height, -1)
+
+
+def valid_rows_mask(lengths, height):
+    """Maschera (gruppi, righe, 1): vera per le righe che contengono dati."""
+    return (np.arange(height) < np.asarray(lengths)[:, np.newaxis])[:, :, np.newaxis]
+
+
+def load_capture_batch(dataset_path, file_groups, antennas, bin_range, channel, max_height=None,
+                       dtype=np.float32, fusion="single", clutter="none", clutter_alpha=DEFAULT_CLUTTER_ALPHA,
+                       stft_window=None, alignment="strict"):
+    """
+    Carica in un unico tensore preallocato la magnitudine delle antenne richieste di tutti i gruppi
+    {base_name: files_info}. I dati di ogni file sono letti una sola volta (memory-map + fetta usata).
+    fusion: combinazione dei canali interni (capture_io.CHANNEL_FUSIONS).
+    clutter, clutter_alpha: rimozione del clutter sulla magnitudine di ogni acquisizione intera,
+    come nella pipeline per gruppo (vedi clutter.CLUTTER_REMOVALS).
+    stft_window: al posto della magnitudine, spettrogrammi micro-Doppler (doppler.doppler_spectrogram):
+    i segnali di tutti i gruppi sono raccolti in un tensore e trasformati con pochi STFT vettoriali
+    (gruppi e antenne insieme), a blocchi di gruppi per limitare la memoria.
+    alignment: antenne con un numero di frame diverso (alignment.ALIGNMENTS): con "trim" sono lette
+    solo le righe comuni, con "pad" le righe mancanti di un'antenna restano zeri nel tensore.
+    Restituisce (CaptureBatch, {base_name: (motivo SKIP_*, messaggio di errore)}) per i gruppi scartati.
+    """
+    recorder = get_recorder()
+    failed = {}
+    names, labels, lengths = [], [], []
+    n_bins = bin_range[1] - bin_range[0]
+    # Tensore allocato una volta: max_height righe, o l'altezza della prima acquisizione
+    # (ingrandito solo se ne arriva una più lunga); le righe in eccesso vengono tolte alla fine
+    data = None
+    # Con stft_window: segnali (gruppi, antenne, frames, bins) senza componente statica, con le
+    # righe successive a quelle dell'immagine che entrano nelle finestre delle sue ultime righe
+    signals = None
+    extra_rows = 0 if stft_window is None else stft_window - 1 - stft_window // 2
+    # Con stft_window: righe valide di ogni antenna, per gruppo (diverse solo con alignment="pad")
+    antenna_rows = []
+
+    for base_name, files_info in file_groups.items():
+        try:
+            with recorder.stage("load"):
+                slices = [
+                    select_capture_slice(open_capture(os.path.join(dataset_path, files_info[rx_key])), bin_range,
+                                         fusion_channel(fusion, channel))
+                    for rx_key in antennas
+                ]
+        except Exception as e:
+            failed[base_name] = (SKIP_LOAD_ERROR, f"Skipping group '{base_name}' due to processing error: {e}")
+            continue
+        heights = [capture_slice.shape[0] for capture_slice in slices]
+        aligned_rows = aligned_height(heights, alignment)
+        if aligned_rows is None:
+            detail = ", ".join(f"{rx.upper()} ({h})" for rx, h in zip(antennas, heights))
+            failed[base_name] = (
+                SKIP_HEIGHT_MISMATCH, f"ERROR: Inconsistent heights for {detail} in group '{base_name}'. Skipping.",
+            )
+            continue
+        widths = [capture_slice.shape[-1] for capture_slice in slices]
+        if any(width != n_bins for width in widths):
+            failed[base_name] = (
+                SKIP_WIDTH_MISMATCH,
+                f"ERROR: Merged data width is {sum(widths)}, but expected {n_bins * len(antennas)} "
+                f"for group '{base_name}'. Skipping.",
+            )
+            continue
+
+        rows = min(aligned_rows, max_height) if max_height else aligned_rows
+        if data is None:
+            data = np.zeros((len(file_groups), max_height or rows, len(antennas), n_bins), dtype=dtype)
+        elif rows > data.shape[1]:
+            grown = np.zeros((data.shape[0], rows) + data.shape[2:], dtype=dtype)
+            grown[:, :data.shape[1]] = data
+            data = grown
+
+        if stft_window is not None:
+            index = len(names)
+            signal_rows = [min(height, rows + extra_rows) for height in heights]
+            if signals is None:
+                signal_dtype = np.result_type(slices[0].dtype, dtype)
+                signals = np.zeros((len(file_groups), len(antennas), data.shape[1] + extra_rows, n_bins),
+                                   dtype=signal_dtype)
+            elif max(signal_rows) > signals.shape[2]:
+                grown = np.zeros(signals.shape[:2] + (data.shape[1] + extra_rows, n_bins), dtype=signals.dtype)
+                grown[:, :, :signals.shape[2]] = signals
+                signals = grown
+            with recorder.stage("doppler"):
+                for antenna, (capture_slice, used) in enumerate(zip(slices, signal_rows)):
+                    static_free_signal(capture_slice, fusion, used, out=signals[index, antenna, :used])
+            names.append(base_name)
+            labels.append(files_info['label'])
+            lengths.append(rows)
+            antenna_rows.append([min(height, rows) for height in heights])
+            continue
+
+        # La magnitudine è scritta direttamente nel tensore, senza matrici intermedie
+        index = len(names)
+        with recorder.stage("magnitude"):
+            for antenna, capture_slice in enumerate(slices):
+                used = min(rows, capture_slice.shape[0])
+                fused_magnitude(capture_slice[:used], fusion, out=data[index, :used, antenna])
+        if clutter != "none":
+            with recorder.stage("clutter"):
+                for antenna, capture_slice in enumerate(slices):
+                    magnitude = data[index, :min(rows, capture_slice.shape[0]), antenna]
+                    if clutter == "mean" and magnitude.shape[0] < capture_slice.shape[0]:
+                        # Lo sfondo è la media di tutta l'acquisizione, non solo delle righe caricate
+                        background = fused_magnitude(capture_slice, fusion).mean(axis=0, dtype=np.float64)
+                        np.subtract(magnitude, background, out=magnitude, casting="same_kind")
+                        np.abs(magnitude, out=magnitude)
+                    else:
+                        # Con "ema" e "highpass" le prime righe non dipendono da quelle successive
+                        remove_clutter(magnitude, clutter, clutter_alpha)
+        names.append(base_name)
+        labels.append(files_info['label'])
+        lengths.append(rows)
+
+    lengths = np.array(lengths, dtype=np.intp)
+    height = int(lengths.max()) if len(lengths) else 0
+    if data is None:
+        data = np.zeros((0, 0, len(antennas), n_bins), dtype=dtype)
+    if signals is not None and names:
+        # Un blocco di gruppi per STFT; il risultato è scritto nel tensore data con gli assi
+        # (gruppi, antenne, frames, bins) dello STFT
+        per_group = len(antennas) * data.shape[1] * n_bins * stft_window
+        step = max(1, DOPPLER_BATCH_SAMPLES // per_group)
+        with recorder.stage("doppler"):
+            for start in range(0, len(names), step):
+                stop = min(start + step, len(names))
+                doppler_spectrogram(signals[start:stop], stft_window, rows=data.shape[1],
+                                    out=data[start:stop].transpose(0, 2, 1, 3))
+            for index, valid in enumerate(antenna_rows):
+                for antenna, used in enumerate(valid):
+                    data[index, used:, antenna] = 0
+    data = data[:len(names), :height]
+
+    batch = CaptureBatch(
+        base_names=names,
+        labels=labels,
+        antennas=tuple(antennas),
+        bin_range=tuple(bin_range),
+        data=data,
+        lengths=lengths,
+    )
+    return batch, failed
+
+
+def normalize_and_log_transform_batch(images, lengths=None):
+    """
+    normalize_and_log_transform applicata sul posto a ogni immagine (gruppi, righe, colonne)
+    con poche operazioni vettoriali lungo l'asse del batch. Con lengths, le righe oltre
+    lengths[i] (riempimento) sono escluse da minimo e massimo e restano a zero.
+    Il risultato di ogni immagine è identico a quello di normalize_and_log_transform.
+    """
+    np.log1p(images, out=images)
+    if lengths is None or np.all(np.asarray(lengths) == images.shape[1]):
+        data_min = images.min(axis=(1, 2), keepdims=True)
+        data_max = images.max(axis=(1, 2), keepdims=True)
+        mask = None
+    else:
+        mask = valid_rows_mask(lengths, images.shape[1])
+        data_min = images.min(axis=(1, 2), keepdims=True, where=mask, initial=np.inf)
+        data_max = images.max(axis=(1, 2), keepdims=True, where=mask, initial=-np.inf)
+
+    # Immagini costanti: (x - min) è già zero, la divisione viene saltata (immagine nera)
+    np.subtract(images, data_min, out=images)
+    data_range = data_max - data_min
+    np.divide(images, data_range, out=images, where=data_range != 0)
+    if mask is not None:
+        images *= mask
+    return images
+
+
+def apply_normalization_batch(images, normalization, lengths=None):
+    """Applica sul posto la normalizzazione scelta ("none" o "log") a tutte le immagini."""
+    if normalization == "none":
+        return images
+    if normalization == "log":
+        return normalize_and_log_transform_batch(images, lengths)
+    raise ValueError(f"Unknown normalization '{normalization}'")
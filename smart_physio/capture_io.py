@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+
+from .clutter import DEFAULT_CLUTTER_ALPHA, remove_clutter
+from .instrumentation import get_recorder
+
+# Range bins usati dalle immagini: i primi 40 (soggetto a circa 1 metro)
+DEFAULT_BIN_RANGE = (0, 40)
+# Canale interno usato per le acquisizioni 3D (frames, canali_interni, range_bins)
+DEFAULT_CHANNEL = 0
+
+# Combinazione dei canali interni delle acquisizioni 3D (le acquisizioni 2D hanno un solo canale):
+# - "single":     solo il canale DEFAULT_CHANNEL, come gli script originali
+# - "coherent":   magnitudine della media dei valori dei canali (il rumore non correlato si attenua)
+# - "incoherent": media delle magnitudini dei canali
+# - "max":        massimo delle magnitudini dei canali (max-hold)
+CHANNEL_FUSIONS = ("single", "coherent", "incoherent", "max")
+
+
+def open_capture(file_path):
+    """
+    Apre un file .npy in memory-map (sola lettura) senza caricarlo in RAM.
+    I byte vengono letti dal disco solo quando si accede alla porzione richiesta.
+    """
+    data = np.load(file_path, mmap_mode="r")
+    # Dimensione del file: con il memory-map le pagine lette sono in pratica tutte
+    get_recorder().count("bytes_read", data.offset + data.nbytes)
+    return data
+
+
+def select_capture_slice(data, bin_range=DEFAULT_BIN_RANGE, channel=DEFAULT_CHANNEL):
+    """
+    Restituisce la vista (frames, bins) della porzione usata di un'acquisizione:
+    - dati 2D (frames, range_bins), es. SR250Mate: data[:, start:stop]
+    - dati 3D (frames, canali, range_bins), es. Infineon: data[:, channel, start:stop]
+      (con channel=None tutti i canali, vista (frames, canali, bins) per fused_magnitude)
+    Nessuna copia: l'aritmetica va applicata solo dopo questa selezione.
+    """
+    start, stop = bin_range
+    if data.ndim == 2:
+        if data.shape[1] < stop:
+            raise ValueError(f"Unexpected data shape {data.shape}: need at least {stop} range bins")
+        return data[:, start:stop]
+    if data.ndim == 3:
+        if channel is None:
+            if data.shape[2] < stop:
+                raise ValueError(f"Unexpected data shape {data.shape}: need at least {stop} range bins")
+            return data[:, :, start:stop]
+        if data.shape[1] <= channel or data.shape[2] < stop:
+            raise ValueError(f"Unexpected data shape {data.shape}: need channel {channel} and at least {stop} range bins")
+        return data[:, channel, start:stop]
+    raise ValueError(f"Unsupported array dimension ({data.ndim}D), expected 2D or 3D")
+
+
+def check_channel_fusion(fusion):
+    """Verifica che la combinazione dei canali sia una di CHANNEL_FUSIONS."""
+    if fusion not in CHANNEL_FUSIONS:
+        raise ValueError(f"Unknown channel fusion '{fusion}', expected one of {CHANNEL_FUSIONS}")
+    return fusion
+
+
+def fusion_channel(fusion, channel=DEFAULT_CHANNEL):
+    """Canale da passare a select_capture_slice: channel con "single", None (tutti) altrimenti."""
+    return channel if fusion == "single" else None
+
+
+def fused_magnitude(selected, fusion="single", out=None):
+    """
+    Magnitudine (frames, bins) di una fetta di select_capture_slice.
+    Una fetta 3D (frames, canali, bins) viene ridotta lungo l'asse dei canali con una sola
+    operazione vettoriale (vedi CHANNEL_FUSIONS); una fetta 2D è già un solo canale.
+    out: matrice (frames, bins) in cui scrivere il risultato (None = nuova matrice).
+    """
+    if selected.ndim == 2:
+        return np.abs(selected, out=out)
+    n_channels = selected.shape[1]
+    # Riduzioni con ufunc.reduce: più rapide di mean/max sulla vista a passo non unitario
+    if fusion == "coherent":
+        # La somma (complessa per dati complessi) precede la magnitudine: le fasi contano
+        out = np.abs(np.add.reduce(selected, axis=1), out=out)
+        return np.divide(out, n_channels, out=out)
+    if fusion == "incoherent":
+        out = np.add.reduce(np.abs(selected), axis=1, out=out)
+        return np.divide(out, n_channels, out=out)
+    if fusion == "max":
+        return np.maximum.reduce(np.abs(selected), axis=1, out=out)
+    raise ValueError(f"Channel fusion '{fusion}' needs all channels (channel=None in select_capture_slice)")
+
+
+def load_capture_magnitude(file_path, bin_range=DEFAULT_BIN_RANGE, channel=DEFAULT_CHANNEL, allocate=None,
+                           fusion="single", clutter="none", clutter_alpha=DEFAULT_CLUTTER_ALPHA):
+    """
+    Carica da un file .npy solo la fetta usata (canale e range bins) e ne calcola la magnitudine.
+    Il file è aperto in memory-map: np.abs lavora solo sulla fetta (frames, bins) e non
+    sull'intero array (frames, canali, 128), quindi lettura e memoria di picco si riducono.
+    allocate: funzione (forma, dtype) -> matrice in cui scrivere la magnitudine, es. un buffer
+    riutilizzato di TransformWorkspace (None = nuova matrice).
+    fusion: con un valore diverso da "single" i canali interni sono combinati (CHANNEL_FUSIONS).
+    clutter, clutter_alpha: rimozione del clutter applicata sul posto alla magnitudine
+    (vedi clutter.CLUTTER_REMOVALS).
+    """
+    recorder = get_recorder()
+    with recorder.stage("load"):
+        data = open_capture(file_path)
+        try:
+            selected = select_capture_slice(data, bin_range, fusion_channel(fusion, channel))
+        except ValueError as e:
+            raise ValueError(f"{os.path.basename(file_path)}: {e}") from None
+    # np.abs crea un nuovo array in RAM: il memory-map non resta referenziato
+    with recorder.stage("magnitude"):
+        if allocate is None:
+            magnitude = fused_magnitude(selected, fusion)
+        else:
+            # selected.real ha il dtype della magnitudine (float32 anche per i dati complex64)
+            shape = (selected.shape[0], selected.shape[-1])
+            magnitude = fused_magnitude(selected, fusion, out=allocate(shape, selected.real.dtype))
+    if clutter != "none":
+        with recorder.stage("clutter"):
+            remove_clutter(magnitude, clutter, clutter_alpha)
+    return magnitude
+
+
+def load_capture_or_none(file_path, bin_range=DEFAULT_BIN_RANGE, channel=DEFAULT_CHANNEL, **options):
+    """
+    Come load_capture_magnitude, ma come le funzioni process_*_npy_data dei vecchi script
+    restituisce None (con un messaggio) invece di sollevare un'eccezione.
+    options: fusion, clutter, clutter_alpha (es. PipelineConfig.capture_options()).
+    """
+    try:
+        return load_capture_magnitude(file_path, bin_range, channel, **options)
+    except Exception as e:
+        print(f"Error while loading or processing {os.path.basename(file_path)}: {e}")
+        return None
@@ -0,0 +1,305 @@
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+from .dataset import LABEL_MAPPING, RX_KEYS, load_dataset_index
+
+# Catalogo salvato accanto alla cartella del dataset (es. Dataset.catalog.sqlite)
+CATALOG_SUFFIX = ".catalog.sqlite"
+
+# --- SCHEMA DEL CATALOGO ---
+# - files: un file .npy con forma, dtype e numero di frame letti dall'header (senza caricare i dati),
+#   più dimensione e mtime per aggiornare solo i file cambiati
+# - captures: un'acquisizione con sensore, soggetto, etichetta e data/ora ricavati dal nome
+# - capture_summary: vista con le antenne disponibili e il numero di frame dell'acquisizione
+#   (il minimo tra le antenne), usata dalle query
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    dataset TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    base_name TEXT NOT NULL,
+    rx TEXT NOT NULL,
+    shape TEXT,
+    dtype TEXT,
+    frames INTEGER,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    error TEXT,
+    PRIMARY KEY (dataset, file_name)
+);
+CREATE TABLE IF NOT EXISTS captures (
+    dataset TEXT NOT NULL,
+    base_name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    sensor TEXT,
+    subject TEXT,
+    label TEXT,
+    timestamp TEXT,
+    PRIMARY KEY (dataset, base_name)
+);
+CREATE VIEW IF NOT EXISTS capture_summary AS
+SELECT c.dataset, c.base_name, c.position, c.sensor, c.subject, c.label, c.timestamp,
+       substr(c.timestamp, 1, 8) AS date,
+       MAX(CASE WHEN f.rx = 'rx0' THEN f.file_name END) AS rx0,
+       MAX(CASE WHEN f.rx = 'rx1' THEN f.file_name END) AS rx1,
+       MAX(CASE WHEN f.rx = 'rx2' THEN f.file_name END) AS rx2,
+       COUNT(f.file_name) AS antennas,
+       MIN(f.frames) AS frames
+FROM captures c JOIN files f ON f.dataset = c.dataset AND f.base_name = c.base_name
+GROUP BY c.dataset, c.base_name;
+"""
+
+# Campi utilizzabili nelle query: nome -> numerico (True) o testo (False)
+QUERY_FIELDS = {
+    "subject": False,
+    "label": False,
+    "sensor": False,
+    "timestamp": False,
+    "date": False,
+    "frames": True,
+    "antennas": True,
+}
+
+# Una condizione della query: campo, operatore e valore (o insieme di valori tra graffe)
+_CLAUSE_PATTERN = re.compile(
+    r"\s*(?P<field>\w+)\s*(?P<op>==|!=|>=|<=|=|<|>|not\s+in\b|in\b)\s*(?P<value>\{[^}]*\}|[^,{}]*?)\s*(?:,|$)",
+    re.IGNORECASE,
+)
+_COMPARISONS = {"=": "=", "==": "=", "!=": "!=", ">=": ">=", "<=": "<=", "<": "<", ">": ">"}
+
+
+def catalog_path_for(base_path):
+    """Percorso predefinito del catalogo di una cartella del dataset."""
+    return os.path.normpath(base_path) + CATALOG_SUFFIX
+
+
+def read_capture_header(file_path):
+    """
+    (forma, dtype, errore) di un file .npy leggendo solo l'header.
+    Per un file illeggibile forma e dtype valgono None e errore contiene il motivo.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                data = np.load(file_path, mmap_mode="r")
+                shape, dtype = data.shape, data.dtype
+    except Exception as e:
+        return None, None, str(e) or type(e).__name__
+    return tuple(shape), np.dtype(dtype).name, None
+
+
+def _convert_value(field, value):
+    value = value.strip()
+    if QUERY_FIELDS[field]:
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"Field '{field}' expects an integer, got '{value}'") from None
+    if field == "label":
+        # Accetta anche le etichette nel formato dei file ("left leg up")
+        return LABEL_MAPPING.get(value.lower(), value)
+    return value
+
+
+def parse_query(query):
+    """
+    Converte una query come "subject != Etienne, label in {left_leg_up}, sensor=Infineon"
+    in (condizione SQL, parametri) sulla vista capture_summary.
+    Le condizioni sono separate da virgole e valgono tutte insieme; il confronto dei testi
+    non distingue maiuscole e minuscole.
+    """
+    conditions, params = [], []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = _CLAUSE_PATTERN.match(query, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Invalid query near '{query[position:]}'")
+        position = match.end()
+
+        field = match.group("field").lower()
+        if field not in QUERY_FIELDS:
+            raise ValueError(f"Unknown query field '{field}', expected one of {sorted(QUERY_FIELDS)}")
+        op = " ".join(match.group("op").lower().split())
+        value = match.group("value")
+        collate = "" if QUERY_FIELDS[field] else " COLLATE NOCASE"
+
+        if value.startswith("{"):
+            values = [_convert_value(field, v) for v in value[1:-1].split(",") if v.strip()]
+            if not values:
+                raise ValueError(f"Empty set of values for '{field}'")
+            if op in ("=", "=="):
+                op = "in"
+            elif op == "!=":
+                op = "not in"
+            if op not in ("in", "not in"):
+                raise ValueError(f"Operator '{op}' cannot be used with a set of values for '{field}'")
+            placeholders = ", ".join("?" * len(values))
+            conditions.append(f"{field}{collate} {op.upper()} ({placeholders})")
+            params.extend(values)
+        else:
+            if op in ("in", "not in"):
+                raise ValueError(f"Operator '{op}' needs a set of values, e.g. {field} {op} {{a, b}}")
+            if not value:
+                raise ValueError(f"Missing value for '{field}'")
+            conditions.append(f"{field}{collate} {_COMPARISONS[op]} ?")
+            params.append(_convert_value(field, value))
+    return " AND ".join(conditions) or "1", params
+
+
+class CaptureCatalog:
+    """
+    Catalogo SQLite delle acquisizioni di una o più cartelle del dataset.
+    update() lo allinea a una cartella leggendo solo gli header dei file nuovi o modificati;
+    select() restituisce le acquisizioni che soddisfano una query.
+    """
+
+    def __init__(self, path):
+        # sqlite3 è importato solo quando il catalogo viene usato (--query), non all'avvio della CLI
+        import sqlite3
+
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, dataset_path):
+        """
+        Aggiorna le righe di una cartella del dataset.
+        Restituisce {"added": n, "updated": n, "removed": n, "unchanged": n} (file).
+        """
+        index = load_dataset_index(dataset_path)
+        dataset = index.path
+        existing = {
+            row["file_name"]: (row["size"], row["mtime_ns"])
+            for row in self.connection.execute("SELECT file_name, size, mtime_ns FROM files WHERE dataset = ?",
+                                               (dataset,))
+        }
+
+        counts = dict.fromkeys(("added", "updated", "removed", "unchanged"), 0)
+        rows = []
+        for file_name, group, rx in zip(index.file_names, index.file_groups.tolist(), index.file_rx.tolist()):
+            file_path = os.path.join(dataset, file_name)
+            stat = os.stat(file_path)
+            previous = existing.pop(file_name, None)
+            if previous == (stat.st_size, stat.st_mtime_ns):
+                counts["unchanged"] += 1
+                continue
+            counts["added" if previous is None else "updated"] += 1
+            shape, dtype, error = read_capture_header(file_path)
+            rows.append((
+                dataset, file_name, index.base_names[group], RX_KEYS[rx],
+                json.dumps(shape) if shape is not None else None, dtype,
+                shape[0] if shape else None, stat.st_size, stat.st_mtime_ns, error,
+            ))
+        counts["removed"] = len(existing)
+
+        with self.connection:
+            self.connection.executemany("DELETE FROM files WHERE dataset = ? AND file_name = ?",
+                                        [(dataset, file_name) for file_name in existing])
+            self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            # Le acquisizioni derivano dall'indice (già in cache): vengono sempre riscritte
+            self.connection.execute("DELETE FROM captures WHERE dataset = ?", (dataset,))
+            self.connection.executemany(
+                "INSERT INTO captures VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (dataset, base_name, position, sensor, subject, label, timestamp)
+                    for position, (base_name, sensor, subject, label, timestamp) in enumerate(zip(
+                        index.base_names, index.sensors, index.subjects, index.labels, index.timestamps,
+                    ))
+                ],
+            )
+        return counts
+
+    def select(self, query=None, dataset_path=None):
+        """Righe di capture_summary che soddisfano la query (tutte con query vuota o None)."""
+        condition, params = parse_query(query or "")
+        if dataset_path is not None:
+            condition += " AND dataset = ?"
+            params.append(os.path.abspath(dataset_path))
+        return self.connection.execute(
+            f"SELECT * FROM capture_summary WHERE {condition} ORDER BY dataset, position", params
+        ).fetchall()
+
+    def file_groups(self, dataset_path, query=None):
+        """
+        Acquisizioni etichettate di una cartella che soddisfano la query, nel formato
+        di group_dataset_files: {base_name: {'rx0': file, 'rx1': file, 'rx2': file, 'label': etichetta}}.
+        """
+        return {
+            row["base_name"]: {**{rx_key: row[rx_key] for rx_key in RX_KEYS}, "label": row["label"]}
+            for row in self.select(query, dataset_path)
+            if row["label"] is not None
+        }
+
+
+def select_file_groups(dataset_path, query, catalog_path=None):
+    """
+    Aggiorna il catalogo della cartella e restituisce i gruppi selezionati dalla query:
+    solo i file di questi gruppi vengono poi letti dalla pipeline.
+    """
+    with CaptureCatalog(catalog_path or catalog_path_for(dataset_path)) as catalog:
+        catalog.update(dataset_path)
+        total = len(catalog.file_groups(dataset_path))
+        file_groups = catalog.file_groups(dataset_path, query)
+    print(f"Catalog query '{query}' selected {len(file_groups)} of {total} labeled acquisition groups.")
+    return file_groups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query the SQLite catalog of the radar captures.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update = commands.add_parser("update", help="Add or refresh one or more dataset folders in the catalog.")
+    update.add_argument("datasets", nargs="+", help="Folders with the .npy captures.")
+    update.add_argument("--catalog", help=f"Catalog file (default: <first dataset>{CATALOG_SUFFIX}).")
+
+    query = commands.add_parser("query", help="List the captures matching a query.")
+    query.add_argument("dataset", help="Folder with the .npy captures.")
+    query.add_argument("where", nargs="?", default="",
+                       help="Conditions separated by commas, e.g. \"subject != Etienne, label in {left_leg_up}, "
+                            f"sensor=Infineon\" (fields: {', '.join(QUERY_FIELDS)}).")
+    query.add_argument("--catalog", help=f"Catalog file (default: <dataset>{CATALOG_SUFFIX}).")
+
+    args = parser.parse_args(argv)
+    if args.command == "update":
+        with CaptureCatalog(args.catalog or catalog_path_for(args.datasets[0])) as catalog:
+            for dataset_path in args.datasets:
+                counts = catalog.update(dataset_path)
+                print(f"{dataset_path}: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+        return None
+
+    try:
+        parse_query(args.where)
+    except ValueError as e:
+        parser.error(str(e))
+    with CaptureCatalog(args.catalog or catalog_path_for(args.dataset)) as catalog:
+        catalog.update(args.dataset)
+        rows = catalog.select(args.where, args.dataset)
+    for row in rows:
+        antennas = "+".join(rx_key for rx_key in RX_KEYS if row[rx_key])
+        print(f"{row['base_name']}\t{row['sensor']}\t{row['subject']}\t{row['label']}\t"
+              f"{row['frames']} frames\t{antennas}")
+    print(f"{len(rows)} capture(s)")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import argparse
+from contextlib import nullcontext
+from dataclasses import replace
+
+from .alignment import ALIGNMENTS
+from .catalog import CATALOG_SUFFIX, QUERY_FIELDS, parse_query, select_file_groups
+from .capture_io import CHANNEL_FUSIONS
+from .clutter import CLUTTER_REMOVALS
+from .dataset import RX_KEYS
+from .doppler import FEATURES
+from .gating import RANGE_GATES
+from .instrumentation import (
+    NULL_RECORDER, StageRecorder, add_instrumentation_arguments, profiling, recording, write_summary,
+)
+from .manifest import add_incremental_arguments
+from .parallel import GROUP_ERROR, GROUP_GENERATED, GROUP_SKIPPED, add_workers_argument
+from .pipeline import SENSORS, OutputHead, PipelineConfig, check_batch_heads, check_heads, run_heads
+from .transforms import BACKENDS, NORMALIZATIONS
+from .windowing import TAIL_POLICIES
+
+
+def _parse_bool(value):
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Invalid boolean value '{value}'")
+
+
+# Opzioni di una testa (--head): chiave -> (campo di PipelineConfig, conversione del valore)
+HEAD_OPTIONS = {
+    "antennas": ("antennas", lambda value: tuple(value.split("+"))),
+    "bins": ("bin_range", lambda value: tuple(int(v) for v in value.split("-"))),
+    "max_height": ("max_height", lambda value: int(value) or None),
+    "normalization": ("normalization", str),
+    "pad_height": ("pad_height", _parse_bool),
+    "split_height": ("split_height", _parse_bool),
+    "hop": ("hop", lambda value: int(value) or None),
+    "tail": ("tail", str),
+    "backend": ("backend", str),
+    "range_gate": ("range_gate", str),
+    "channel_fusion": ("channel_fusion", str),
+    "clutter": ("clutter", str),
+    "clutter_alpha": ("clutter_alpha", float),
+    "feature": ("feature", str),
+    "doppler_window": ("doppler_window", int),
+    "alignment": ("alignment", str),
+}
+
+
+def parse_head_spec(spec, defaults):
+    """
+    Converte una testa della riga di comando in OutputHead, es.
+    "output=Photos_120_log,antennas=rx0+rx1+rx2,normalization=log".
+    Le opzioni non indicate sono prese da defaults (le opzioni principali della CLI).
+    """
+    output_path = None
+    fields = {}
+    for item in spec.split(","):
+        key, sep, value = item.partition("=")
+        key = key.strip().replace("-", "_")
+        if not sep or not value:
+            raise ValueError(f"Invalid head option '{item}' in '{spec}', expected key=value")
+        if key == "output":
+            output_path = value
+        elif key in HEAD_OPTIONS:
+            field_name, convert = HEAD_OPTIONS[key]
+            fields[field_name] = convert(value)
+        else:
+            raise ValueError(f"Unknown head option '{key}', expected output or one of {sorted(HEAD_OPTIONS)}")
+    if not output_path:
+        raise ValueError(f"Head '{spec}' has no output folder (output=...)")
+    return OutputHead(replace(defaults, **fields), output_path)
+
+
+def add_config_arguments(parser, defaults):
+    """Aggiunge al parser le opzioni di PipelineConfig, con i valori predefiniti di defaults."""
+    parser.add_argument(
+        "--sensor", choices=sorted(SENSORS), default=defaults.sensor,
+        help=f"Radar sensor of the captures (default: {defaults.sensor}).",
+    )
+    parser.add_argument(
+        "--antennas", nargs="+", choices=RX_KEYS, default=list(defaults.antennas),
+        help=f"Antennas placed side by side, left to right (default: {' '.join(defaults.antennas)}).",
+    )
+    parser.add_argument(
+        "--bins", nargs=2, type=int, metavar=("START", "STOP"), default=list(defaults.bin_range),
+        help=f"Range bins kept for each antenna (default: {defaults.bin_range[0]} {defaults.bin_range[1]}).",
+    )
+    parser.add_argument(
+        "--range-gate", choices=RANGE_GATES, default=defaults.range_gate,
+        help="fixed: always use --bins; capture/session: center a window as wide as --bins on the range bins "
+             "with the most motion in each capture or in each session (subject + day), "
+             f"cached in <dataset>.gates.json (default: {defaults.range_gate}).",
+    )
+    parser.add_argument(
+        "--channel-fusion", choices=CHANNEL_FUSIONS, default=defaults.channel_fusion,
+        help="How the internal channels of 3D (Infineon) captures are combined: single (only the sensor channel), "
+             "coherent (magnitude of the channel mean), incoherent (mean of the magnitudes) or max "
+             f"(default: {defaults.channel_fusion}).",
+    )
+    parser.add_argument(
+        "--clutter", choices=CLUTTER_REMOVALS, default=defaults.clutter,
+        help="Static clutter removal along the frame axis, before normalization: mean (subtract the capture mean "
+             "of each range bin), ema (subtract an exponential moving average) or highpass (first-order slow-time "
+             f"high-pass filter) (default: {defaults.clutter}).",
+    )
+    parser.add_argument(
+        "--clutter-alpha", type=float, default=defaults.clutter_alpha,
+        help=f"Weight of the newest frame for --clutter ema/highpass, 0 < alpha < 1 (default: {defaults.clutter_alpha}).",
+    )
+    parser.add_argument(
+        "--feature", choices=FEATURES, default=defaults.feature,
+        help="Image content: range_time (magnitude of the range bins over time) or doppler (micro-Doppler "
+             "spectrogram of the selected range bins over time, same image size) "
+             f"(default: {defaults.feature}).",
+    )
+    parser.add_argument(
+        "--doppler-window", type=int, default=defaults.doppler_window,
+        help="Frames in the STFT window of --feature doppler, at most the range bins of one antenna "
+             f"(default: {defaults.doppler_window}).",
+    )
+    parser.add_argument(
+        "--alignment", choices=ALIGNMENTS, default=defaults.alignment,
+        help="Antennas with different frame counts: strict (skip the group, like the original scripts), "
+             "trim (keep the frames common to all antennas) or pad (complete the shorter antennas with zero rows) "
+             f"(default: {defaults.alignment}).",
+    )
+    parser.add_argument(
+        "--max-height", type=int, default=defaults.max_height,
+        help=f"Maximum image height in frames, 0 = whole capture (default: {defaults.max_height}).",
+    )
+    parser.add_argument(
+        "--normalization", choices=NORMALIZATIONS, default=defaults.normalization,
+        help=f"Pixel normalization (default: {defaults.normalization}).",
+    )
+    parser.add_argument(
+        "--pad-height", action=argparse.BooleanOptionalAction, default=defaults.pad_height,
+        help="Pad shorter captures with zero rows up to --max-height.",
+    )
+    parser.add_argument(
+        "--split-height", action=argparse.BooleanOptionalAction, default=defaults.split_height,
+        help="Split long captures into several images of --max-height rows instead of truncating them.",
+    )
+    parser.add_argument(
+        "--hop", type=int, default=defaults.hop,
+        help="With --split-height, frames between the starts of two windows (default: --max-height, no overlap).",
+    )
+    parser.add_argument(
+        "--tail", choices=TAIL_POLICIES, default=defaults.tail,
+        help=f"With --split-height, what to do with the last incomplete window (default: {defaults.tail}).",
+    )
+    parser.add_argument(
+        "--backend", choices=BACKENDS, default=defaults.backend,
+        help=f"Implementation of the in-place log normalization; numexpr and numba must be installed and "
+             f"may differ from numpy in the last digit (default: {defaults.backend}).",
+    )
+
+
+def build_parser(defaults=None, dataset_path=None, output_path=None, description=None):
+    """
+    Parser della riga di comando della pipeline.
+    defaults (PipelineConfig), dataset_path e output_path permettono agli script storici
+    di riusare la CLI con i propri valori predefiniti.
+    """
+    defaults = defaults or PipelineConfig()
+    parser = argparse.ArgumentParser(
+        description=description or "Generate grayscale radar images for Edge Impulse from .npy captures.",
+    )
+    parser.add_argument(
+        "--dataset", default=dataset_path, required=dataset_path is None,
+        help="Folder with the .npy captures.",
+    )
+    parser.add_argument(
+        "--output", default=output_path,
+        help="Output folder for the PNG images (wiped unless --incremental).",
+    )
+    parser.add_argument(
+        "--head", action="append", default=[], metavar="SPEC",
+        help="Extra output variant built from the same read of the dataset, e.g. "
+             "output=Photos_120_log,antennas=rx0+rx1+rx2,normalization=log "
+             f"(keys: output, {', '.join(HEAD_OPTIONS)}). Unset keys inherit the main options. Can be repeated.",
+    )
+    parser.add_argument(
+        "--query", metavar="EXPR",
+        help="Process only the captures matching a catalog query, e.g. "
+             "\"subject != Etienne, label in {left_leg_up}, sensor=Infineon\" "
+             f"(fields: {', '.join(QUERY_FIELDS)}).",
+    )
+    parser.add_argument(
+        "--catalog", metavar="PATH",
+        help=f"SQLite catalog used by --query (default: <dataset>{CATALOG_SUFFIX}, refreshed before the query).",
+    )
+    add_config_arguments(parser, defaults)
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="Stack all captures in one tensor and normalize them with vectorized operations "
+             "(single process, not compatible with --split-height).",
+    )
+    add_workers_argument(parser)
+    add_incremental_arguments(parser)
+    add_instrumentation_arguments(parser)
+    return parser
+
+
+def config_from_args(args):
+    """Costruisce la PipelineConfig dalle opzioni della riga di comando."""
+    return PipelineConfig(
+        sensor=args.sensor,
+        antennas=tuple(args.antennas),
+        bin_range=tuple(args.bins),
+        max_height=args.max_height or None,
+        normalization=args.normalization,
+        pad_height=args.pad_height,
+        split_height=args.split_height,
+        hop=args.hop or None,
+        tail=args.tail,
+        backend=args.backend,
+        range_gate=args.range_gate,
+        channel_fusion=args.channel_fusion,
+        clutter=args.clutter,
+        clutter_alpha=args.clutter_alpha,
+        feature=args.feature,
+        doppler_window=args.doppler_window,
+        alignment=args.alignment,
+    )
+
+
+def main(argv=None, defaults=None, dataset_path=None, output_path=None, description=None):
+    parser = build_parser(defaults, dataset_path, output_path, description)
+    args = parser.parse_args(argv)
+    try:
+        config = config_from_args(args)
+        heads = [OutputHead(config, args.output)] if args.output else []
+        heads += [parse_head_spec(spec, config) for spec in args.head]
+        if not heads:
+            raise ValueError("an output folder is required: use --output and/or --head")
+        check_heads(heads)
+        if args.batch:
+            check_batch_heads(heads)
+        if args.query is not None:
+            parse_query(args.query)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Strumentazione solo se richiesta: altrimenti ogni misura è una chiamata vuota
+    recorder = StageRecorder() if args.stats is not None else NULL_RECORDER
+    profile = profiling(args.profile or None) if args.profile is not None else nullcontext()
+    with recording(recorder), profile:
+        # Con --query vengono letti solo i file delle acquisizioni selezionate
+        file_groups = select_file_groups(args.dataset, args.query, args.catalog) if args.query is not None else None
+        results = run_heads(
+            heads, args.dataset,
+            workers=args.workers, chunksize=args.chunksize,
+            incremental=args.incremental, hash_sources=args.hash_sources, batch=args.batch,
+            file_groups=file_groups,
+        )
+    for head, result in zip(heads, results):
+        print_summary(head, result, show_output=len(heads) > 1)
+    if recorder.enabled:
+        print_stats(recorder, heads, results, args.stats)
+    return results
+
+
+def print_stats(recorder, heads, results, output_path=None):
+    """Stampa le misure dell'esecuzione e, con output_path, le scrive in JSON insieme agli esiti delle teste."""
+    print("\nRun statistics:")
+    print(recorder.format_summary())
+    if output_path:
+        summary = recorder.summary()
+        summary["heads"] = [
+            {
+                "output": head.output_path,
+                "groups_found": result.groups_found,
+                "generated_images": result.generated_images,
+                "group_counts": dict(result.group_counts),
+            }
+            for head, result in zip(heads, results)
+        ]
+        write_summary(summary, output_path)
+
+
+def print_summary(head, result, show_output=False):
+    """Stampa il riepilogo di una testa."""
+    config, counts = head.config, result.group_counts
+    target = f" for {head.output_path}" if show_output else ""
+    print(f"\nElaboration completed{target}! Total images generated: {result.generated_images}")
+    print(f"Skipped groups: {counts[GROUP_SKIPPED]}, groups with errors: {counts[GROUP_ERROR]}")
+    if counts[GROUP_GENERATED] > 0:
+        if config.pad_height or (config.split_height and config.tail in ("pad", "drop")):
+            height = f"of {config.max_height} pixels"
+        elif config.max_height:
+            height = f"of up to {config.max_height} pixels"
+        else:
+            height = "equal to the number of frames"
+        print(f"All generated images have a consistent width of {config.image_width} pixels and a height {height}.")
@@ -0,0 +1,134 @@
+from functools import lru_cache
+
+import numpy as np
+
+# Rimozione del clutter (riflessi statici di pareti e mobili) dalla magnitudine (frames, bins),
+# lungo l'asse dei frame (slow time), tra magnitudine e normalizzazione:
+# - "none":     nessuna, come gli script originali
+# - "mean":     sottrae a ogni bin la sua media sull'acquisizione
+#               (in streaming la media dei frame ricevuti fino a quel momento)
+# - "ema":      sottrae uno sfondo che segue lentamente il segnale (media mobile esponenziale)
+# - "highpass": filtro passa-alto del primo ordine y[n] = w * (y[n-1] + x[n] - x[n-1])
+# Il risultato è preso in valore assoluto: resta una magnitudine (>= 0), come richiede log1p.
+CLUTTER_REMOVALS = ("none", "mean", "ema", "highpass")
+
+# Peso del frame nuovo (alpha, w = 1 - alpha): 0.05 = costante di tempo di 20 frame (0.8 s a 25 frame/s)
+DEFAULT_CLUTTER_ALPHA = 0.05
+
+# Frame filtrati insieme con un prodotto matriciale: la ricorsione frame per frame
+# diventa un'operazione vettoriale per blocco di frame (un solo blocco per le acquisizioni
+# del dataset, 100-125 frame)
+_BLOCK_FRAMES = 256
+
+
+def check_clutter(mode, alpha=DEFAULT_CLUTTER_ALPHA):
+    """Verifica il tipo di rimozione del clutter e il peso alpha (0 < alpha < 1)."""
+    if mode not in CLUTTER_REMOVALS:
+        raise ValueError(f"Unknown clutter removal '{mode}', expected one of {CLUTTER_REMOVALS}")
+    if not 0 < alpha < 1:
+        raise ValueError(f"Invalid clutter alpha {alpha}, expected 0 < alpha < 1")
+    return mode
+
+
+@lru_cache(maxsize=32)
+def _recursion_terms(w, length, dtype):
+    """
+    Matrice triangolare T[j, k] = w ** (j - k) per k <= j e colonna p[j] = w ** (j + 1):
+    s = T @ u + p * s[-1] risolve s[n] = w * s[n-1] + u[n] per un blocco di length frame.
+    """
+    exponent = np.subtract.outer(np.arange(length), np.arange(length))
+    matrix = np.where(exponent >= 0, w ** np.maximum(exponent, 0).astype(np.float64), 0.0).astype(dtype)
+    powers = (w ** np.arange(1, length + 1, dtype=np.float64)).astype(dtype)[:, np.newaxis]
+    matrix.flags.writeable = False
+    powers.flags.writeable = False
+    return matrix, powers
+
+
+def _first_order(u, w, gain, previous):
+    """Righe di s[n] = w * s[n-1] + gain * u[n] per un blocco u (frames, bins), da s[-1] = previous."""
+    matrix, powers = _recursion_terms(w, u.shape[0], u.dtype)
+    result = matrix @ u
+    result *= gain
+    result += powers * previous
+    return result
+
+
+def _work_dtype(dtype):
+    """Precisione dei calcoli: quella della magnitudine (float32), float64 per gli altri tipi."""
+    return dtype if dtype in (np.float32, np.float64) else np.dtype(np.float64)
+
+
+class ClutterFilter:
+    """
+    Rimozione del clutter incrementale: apply() riceve i frame di un'antenna a blocchi
+    (anche uno alla volta, in streaming) e li filtra sul posto. Lo stato è di O(bins)
+    valori (sfondo, ultimo frame, somma): un'antenna = un filtro.
+    Con "ema" e "highpass" applicare il filtro a un'acquisizione intera o frame per frame
+    dà lo stesso risultato (a meno degli arrotondamenti); con "mean" lo sfondo è la media
+    dei frame ricevuti finora, non quella dell'intera acquisizione (vedi remove_clutter).
+    """
+
+    def __init__(self, mode="ema", alpha=DEFAULT_CLUTTER_ALPHA):
+        self.mode = check_clutter(mode, alpha)
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        """Dimentica lo sfondo (es. cambio di paziente o di acquisizione)."""
+        self._state = None
+        self._last = None
+        self.frames_seen = 0
+
+    def apply(self, rows):
+        """Filtra sul posto i frame rows (frames, bins) e restituisce rows."""
+        if self.mode == "none":
+            return rows
+        for start in range(0, rows.shape[0], _BLOCK_FRAMES):
+            self._apply_block(rows[start:start + _BLOCK_FRAMES])
+        return rows
+
+    def _apply_block(self, x):
+        w = 1.0 - self.alpha
+        dtype = _work_dtype(x.dtype)
+        if self.mode == "mean":
+            # Media progressiva: somma cumulata dei frame divisa per il loro numero
+            background = np.cumsum(x, axis=0, dtype=np.float64)
+            if self._state is not None:
+                background += self._state
+            self._state = background[-1].copy()
+            background /= np.arange(self.frames_seen + 1, self.frames_seen + x.shape[0] + 1)[:, np.newaxis]
+            np.subtract(x, background, out=x, casting="same_kind")
+        elif self.mode == "ema":
+            if self._state is None:
+                # Lo sfondo parte dal primo frame: il primo frame filtrato è zero
+                self._state = x[0].astype(dtype)
+            background = _first_order(x.astype(dtype, copy=False), w, self.alpha, self._state)
+            self._state = background[-1].copy()
+            np.subtract(x, background, out=x, casting="same_kind")
+        else:
+            if self._last is None:
+                self._last = x[0].astype(dtype)
+                self._state = np.zeros(x.shape[1], dtype=dtype)
+            differences = np.empty(x.shape, dtype=dtype)
+            np.subtract(x[0], self._last, out=differences[0])
+            np.subtract(x[1:], x[:-1], out=differences[1:], dtype=dtype)
+            self._last = x[-1].astype(dtype)
+            filtered = _first_order(differences, w, w, self._state)
+            self._state = filtered[-1].copy()
+            np.copyto(x, filtered, casting="same_kind")
+        np.abs(x, out=x)
+        self.frames_seen += x.shape[0]
+
+
+def remove_clutter(data, mode, alpha=DEFAULT_CLUTTER_ALPHA):
+    """
+    Rimuove il clutter da un'acquisizione intera (frames, bins), sul posto: nessuna copia dei dati.
+    Con "mean" lo sfondo è la media di ogni bin su tutti i frame dell'acquisizione.
+    """
+    if mode == "none":
+        return data
+    if mode == "mean":
+        check_clutter(mode, alpha)
+        np.subtract(data, data.mean(axis=0, dtype=np.float64), out=data, casting="same_kind")
+        return np.abs(data, out=data)
+    return ClutterFilter(mode, alpha).apply(data)
@@ -0,0 +1,275 @@
+import json
+import os
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# Etichette valide nel formato originale dei file (le più specifiche prima per priorità)
+RAW_VALID_LABELS = [
+    "right arm up",
+    "left arm up",
+    "right leg up",
+    "left leg up",
+    "still position"
+]
+
+# Mappa per convertire le etichette raw in un formato pulito per i nomi delle classi/file
+# es. "right arm up" -> "right_arm_up" per Edge Impulse.
+LABEL_MAPPING = {
+    "right arm up": "right_arm_up",
+    "left arm up": "left_arm_up",
+    "right leg up": "right_leg_up",
+    "left leg up": "left_leg_up",
+    "still position": "still_position"
+}
+
+# Antenne riconosciute nei nomi dei file (..._Infineon_rx0.npy, ..._sr250_rx2.npy)
+RX_KEYS = ("rx0", "rx1", "rx2")
+
+# Data e ora della sessione nel nome dell'acquisizione (es. ..._Fisio_20250528-145949)
+_TIMESTAMP_PATTERN = re.compile(r"(\d{8}-\d{6})")
+
+# Nome di un file di acquisizione: [base]_[sensore]_[rxN].npy, come f.rsplit('_', 2)
+_CAPTURE_FILE_PATTERN = re.compile(r"^(?P<base>.+)_(?P<sensor>[^_]*)_(?P<rx>rx[0-2])\.npy$")
+_RX_CODES = {rx_key: code for code, rx_key in enumerate(RX_KEYS)}
+
+# Indice del dataset salvato accanto alla cartella (es. Dataset.index.json),
+# riutilizzato finché la cartella non cambia (file aggiunti, rimossi o rinominati)
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".index.json"
+
+# Etichette ordinate una sola volta: la più specifica (più lunga) viene cercata per prima
+_LABELS_BY_PRIORITY = sorted(RAW_VALID_LABELS, key=len, reverse=True)
+
+
+def find_label(acquisition_base_name):
+    """
+    Restituisce l'etichetta pulita (es. "right_arm_up") contenuta nel nome dell'acquisizione,
+    oppure None se il nome non contiene nessuna etichetta valida.
+    """
+    name = acquisition_base_name.lower()
+    for label in _LABELS_BY_PRIORITY:
+        if label in name:
+            return LABEL_MAPPING[label]
+    return None
+
+
+def parse_acquisition_name(acquisition_base_name):
+    """
+    Soggetto, etichetta e data/ora di un'acquisizione:
+    "Alberto_Right arm up_Fisio_20250528-145949" -> ("Alberto", "right_arm_up", "20250528-145949").
+    Le parti non riconosciute valgono None.
+    """
+    subject = acquisition_base_name.split('_', 1)[0] or None
+    match = _TIMESTAMP_PATTERN.search(acquisition_base_name)
+    return subject, find_label(acquisition_base_name), match.group(1) if match else None
+
+
+def split_capture_file_name(file_name):
+    """
+    Divide il nome di un file di acquisizione nelle sue parti:
+    "Alberto_Right arm up_Fisio_20250528-145949_Infineon_rx0.npy"
+    -> ("Alberto_Right arm up_Fisio_20250528-145949", "Infineon", "rx0").
+    Restituisce None se il nome non ha il formato [base]_[sensore]_[rxN.npy].
+    """
+    match = _CAPTURE_FILE_PATTERN.match(file_name)
+    if match is None:
+        return None
+    return match.group("base", "sensor", "rx")
+
+
+@dataclass
+class DatasetIndex:
+    """
+    Tabella compatta dei file di un dataset, costruita con una sola scansione della cartella.
+    - per file: nome, gruppo (indice in base_names) e antenna (indice in RX_KEYS)
+    - per gruppo: nome base, sensore, soggetto, etichetta pulita (o None) e data/ora
+    - skipped: file .npy con un nome non riconosciuto
+    """
+    path: str
+    mtime_ns: int
+    file_names: list
+    file_groups: np.ndarray
+    file_rx: np.ndarray
+    base_names: list
+    sensors: list
+    subjects: list
+    labels: list
+    timestamps: list
+    skipped: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def select(self, subjects=None, labels=None, sensor=None):
+        """Indici dei gruppi etichettati che soddisfano i filtri (None = nessun filtro)."""
+        keep = np.array([label is not None for label in self.labels], dtype=bool)
+        for values, wanted in ((self.subjects, subjects), (self.labels, labels)):
+            if wanted is not None:
+                wanted = set(wanted)
+                keep &= np.array([value in wanted for value in values], dtype=bool)
+        if sensor is not None:
+            keep &= np.array([value == sensor for value in self.sensors], dtype=bool)
+        return np.flatnonzero(keep)
+
+    def groups(self, subjects=None, labels=None, sensor=None, verbose=True):
+        """
+        Gruppi nel formato di group_dataset_files:
+        {base_name: {'rx0': file, 'rx1': file, 'rx2': file, 'label': etichetta}}.
+        """
+        if verbose:
+            for file_name in self.skipped:
+                print(f"Skipping file {file_name}: Cannot determine acquisition name or RX antenna type.")
+            for base_name, label in zip(self.base_names, self.labels):
+                if label is None:
+                    print(f"Warning: No valid action label found for '{base_name}'. This group will be skipped.")
+
+        selected = self.select(subjects, labels, sensor)
+        groups = {}
+        for group in selected.tolist():
+            entry = dict.fromkeys(RX_KEYS)
+            entry['label'] = self.labels[group]
+            groups[self.base_names[group]] = entry
+        wanted = np.zeros(len(self.base_names), dtype=bool)
+        wanted[selected] = True
+        for file_index in np.flatnonzero(wanted[self.file_groups]).tolist():
+            groups[self.base_names[self.file_groups[file_index]]][RX_KEYS[self.file_rx[file_index]]] = \
+                self.file_names[file_index]
+        return groups
+
+    def to_json(self):
+        return {
+            "version": INDEX_VERSION,
+            "path": self.path,
+            "mtime_ns": self.mtime_ns,
+            "file_names": self.file_names,
+            "file_groups": self.file_groups.tolist(),
+            "file_rx": self.file_rx.tolist(),
+            "base_names": self.base_names,
+            "sensors": self.sensors,
+            "subjects": self.subjects,
+            "labels": self.labels,
+            "timestamps": self.timestamps,
+            "skipped": self.skipped,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            path=data["path"],
+            mtime_ns=data["mtime_ns"],
+            file_names=data["file_names"],
+            file_groups=np.array(data["file_groups"], dtype=np.int32),
+            file_rx=np.array(data["file_rx"], dtype=np.int8),
+            base_names=data["base_names"],
+            sensors=data["sensors"],
+            subjects=data["subjects"],
+            labels=data["labels"],
+            timestamps=data["timestamps"],
+            skipped=data["skipped"],
+        )
+
+
+def index_path_for(base_path):
+    """Percorso del file di cache dell'indice di una cartella del dataset."""
+    return os.path.normpath(base_path) + INDEX_SUFFIX
+
+
+def build_dataset_index(base_path):
+    """
+    Scansione della cartella con os.scandir e una sola regex per file: ogni nome base
+    viene analizzato (soggetto, etichetta, data/ora) una volta sola, non per ogni antenna.
+    """
+    mtime_ns = os.stat(base_path).st_mtime_ns
+    with os.scandir(base_path) as entries:
+        names = sorted(entry.name for entry in entries if entry.name.endswith(".npy"))
+
+    file_names, file_groups, file_rx, skipped = [], [], [], []
+    group_ids = {}
+    base_names, sensors, subjects, labels, timestamps = [], [], [], [], []
+    match_capture = _CAPTURE_FILE_PATTERN.match
+    for name in names:
+        match = match_capture(name)
+        if match is None:
+            skipped.append(name)
+            continue
+        base_name = match.group("base")
+        group = group_ids.get(base_name)
+        if group is None:
+            group = group_ids[base_name] = len(base_names)
+            subject, label, timestamp = parse_acquisition_name(base_name)
+            base_names.append(base_name)
+            sensors.append(match.group("sensor"))
+            subjects.append(subject)
+            labels.append(label)
+            timestamps.append(timestamp)
+        file_names.append(name)
+        file_groups.append(group)
+        file_rx.append(_RX_CODES[match.group("rx")])
+
+    return DatasetIndex(
+        path=os.path.abspath(base_path),
+        mtime_ns=mtime_ns,
+        file_names=file_names,
+        file_groups=np.array(file_groups, dtype=np.int32),
+        file_rx=np.array(file_rx, dtype=np.int8),
+        base_names=base_names,
+        sensors=sensors,
+        subjects=subjects,
+        labels=labels,
+        timestamps=timestamps,
+        skipped=skipped,
+    )
+
+
+# Indici già costruiti in questo processo: {percorso assoluto: DatasetIndex}
+_INDEX_CACHE = {}
+
+
+def load_dataset_index(base_path, use_cache=True):
+    """
+    Indice del dataset, ricostruito solo se la cartella è cambiata (mtime della cartella).
+    L'indice resta in memoria per il processo ed è salvato in <cartella>.index.json;
+    se il file non si può scrivere (es. cartella di sola lettura) si usa solo la memoria.
+    """
+    path = os.path.abspath(base_path)
+    if not use_cache:
+        return build_dataset_index(path)
+
+    mtime_ns = os.stat(path).st_mtime_ns
+    cached = _INDEX_CACHE.get(path)
+    if cached is not None and cached.mtime_ns == mtime_ns:
+        return cached
+
+    cache_file = index_path_for(path)
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.get("version") == INDEX_VERSION and stored.get("path") == path and stored.get("mtime_ns") == mtime_ns:
+            index = DatasetIndex.from_json(stored)
+            _INDEX_CACHE[path] = index
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = build_dataset_index(path)
+    _INDEX_CACHE[path] = index
+    try:
+        tmp_path = cache_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index.to_json(), f)
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        pass
+    return index
+
+
+def group_dataset_files(base_path, subjects=None, labels=None, sensor=None):
+    """
+    Raggruppa i file .npy del dataset per acquisizione e ne identifica l'etichetta.
+    Restituisce {base_name: {'rx0': file, 'rx1': file, 'rx2': file, 'label': etichetta}},
+    con None per le antenne mancanti. I gruppi senza etichetta valida vengono scartati.
+    subjects, labels e sensor filtrano i gruppi (es. subjects=["Alberto"]).
+    """
+    return load_dataset_index(base_path).groups(subjects, labels, sensor)
@@ -0,0 +1,151 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .capture_io import fusion_channel, open_capture, select_capture_slice
+from .instrumentation import get_recorder
+
+# Rappresentazioni (feature) delle immagini:
+# - "range_time": magnitudine range-tempo delle antenne affiancate, come gli script originali
+# - "doppler":    spettrogramma micro-Doppler: per ogni frame lo spettro Doppler (STFT lungo lo
+#                 slow time) della finestra di frame centrata su di esso, sommato sui range bins
+#                 selezionati. Una colonna per bin Doppler, tante quanti i range bins di
+#                 un'antenna: le immagini hanno la stessa dimensione di quelle range-tempo.
+# Con i dati complessi di SR250Mate lo spettro distingue avvicinamento (frequenze positive) e
+# allontanamento (negative); con i dati reali di Infineon è simmetrico rispetto al centro.
+FEATURES = ("range_time", "doppler")
+
+# Frame della finestra dello STFT: 32 frame = 1.28 s a 25 frame/s
+DEFAULT_DOPPLER_WINDOW = 32
+
+# Combinazioni dei canali che conservano la fase del segnale: le altre sono già magnitudini
+DOPPLER_FUSIONS = ("single", "coherent")
+
+# Campioni (frame x bins x finestra) di uno STFT per chiamata nella modalità batch:
+# con gli array temporanei circa 40 MB, i gruppi sono elaborati a blocchi di questa dimensione
+DOPPLER_BATCH_SAMPLES = 1 << 21
+
+
+def check_feature(feature, doppler_window=DEFAULT_DOPPLER_WINDOW, n_doppler=None):
+    """
+    Verifica la feature e, per "doppler", la finestra dello STFT: almeno 2 frame e non più
+    dei bin Doppler n_doppler (i range bins di un'antenna), altrimenti lo spettro la troncherebbe.
+    """
+    if feature not in FEATURES:
+        raise ValueError(f"Unknown feature '{feature}', expected one of {FEATURES}")
+    if feature == "doppler":
+        if doppler_window < 2:
+            raise ValueError(f"Invalid Doppler window of {doppler_window} frames, expected at least 2")
+        if n_doppler is not None and doppler_window > n_doppler:
+            raise ValueError(f"Doppler window of {doppler_window} frames does not fit in {n_doppler} Doppler bins "
+                             f"(the range bins of one antenna)")
+    return feature
+
+
+@lru_cache(maxsize=16)
+def _dft_basis(window_length, n_doppler, dtype):
+    """
+    Base della DFT a n_doppler punti con la finestra di Hann già applicata, (window_length, colonne):
+    il prodotto segmenti @ base è lo STFT, senza moltiplicare ogni segmento per la finestra.
+    Restituisce (base, ordine): ordine porta le colonne dello spettro nell'ordine dell'immagine
+    (frequenza zero al centro, come fftshift).
+    Per segnali reali (dtype float) lo spettro è simmetrico: la base contiene solo le frequenze
+    0..n_doppler // 2, con parte reale e immaginaria alternate (un solo prodotto reale, il cui
+    risultato si legge come numeri complessi senza copie).
+    """
+    basis = np.fft.fft(np.diag(np.hanning(window_length)), n=n_doppler, axis=-1)
+    order = np.fft.fftshift(np.arange(n_doppler))
+    if np.issubdtype(dtype, np.complexfloating):
+        basis = basis.astype(dtype)
+    else:
+        half = basis[:, :n_doppler // 2 + 1]
+        basis = np.stack([half.real, half.imag], axis=-1).reshape(window_length, -1).astype(dtype)
+        order = np.minimum(order, n_doppler - order)
+    basis.flags.writeable = False
+    order.flags.writeable = False
+    return basis, order
+
+
+def static_free_signal(selected, fusion="single", rows=None, out=None):
+    """
+    Segnale (frames, bins) di una fetta di select_capture_slice senza la componente statica:
+    la media di ogni bin su tutta l'acquisizione (riflessi fermi = Doppler zero) viene sottratta.
+    Le fette 3D (frames, canali, bins) sono mediate sui canali prima della magnitudine ("coherent").
+    rows: solo le prime righe (la media resta quella dell'acquisizione intera).
+    """
+    if selected.ndim == 3:
+        if fusion != "coherent":
+            raise ValueError(f"Channel fusion '{fusion}' is not available for Doppler features, "
+                             f"expected one of {DOPPLER_FUSIONS}")
+        signal = np.add.reduce(selected, axis=1)
+        signal /= selected.shape[1]
+    else:
+        signal = selected
+    rows = signal.shape[0] if rows is None else min(rows, signal.shape[0])
+    return np.subtract(signal[:rows], signal.mean(axis=0), out=out)
+
+
+def doppler_spectrogram(signal, window_length=DEFAULT_DOPPLER_WINDOW, n_doppler=None, rows=None, out=None):
+    """
+    Spettrogrammi micro-Doppler di segnali (..., frames, bins) senza componente statica
+    (vedi static_free_signal), con un solo STFT vettoriale per tutte le dimensioni iniziali
+    (es. gruppi e antenne): riga t = modulo dello spettro della finestra di window_length frame
+    centrata sul frame t (zeri oltre i bordi), sommato sui bins; frequenza zero al centro.
+    n_doppler: colonne (predefinito: bins); rows: righe da calcolare, le prime (predefinito: frames).
+    out: matrice (..., rows, n_doppler) anche non contigua in cui scrivere il risultato.
+    Con un passo di un frame lo STFT è un prodotto matriciale con la base di _dft_basis:
+    per trasformate così corte è circa 5 volte più rapido di np.fft.fft sui segmenti.
+    """
+    *lead, frames, n_bins = signal.shape
+    n_doppler = n_doppler or n_bins
+    rows = frames if rows is None else rows
+    half = window_length // 2
+    # Segnale con zeri prima e dopo: la finestra del frame t è padded[t:t + window_length]
+    padded = np.zeros((*lead, rows + window_length - 1, n_bins), dtype=np.result_type(signal.dtype, np.float32))
+    used = min(frames, rows + window_length - 1 - half)
+    padded[..., half:half + used, :] = signal[..., :used, :]
+    basis, order = _dft_basis(window_length, n_doppler, padded.dtype)
+    # (..., rows, bins, window_length): vista senza copie dei segmenti
+    segments = sliding_window_view(padded, window_length, axis=-2)
+    spectrum = segments @ basis
+    if not np.iscomplexobj(spectrum):
+        spectrum = spectrum.view(np.result_type(spectrum.dtype, np.complex64))
+    summed = np.abs(spectrum).sum(axis=-2)
+    if out is None:
+        return summed[..., order]
+    out[...] = summed[..., order]
+    return out
+
+
+def load_capture_signal(file_path, bin_range, channel, fusion="single"):
+    """Vista in memory-map della fetta usata di un'acquisizione (valori complessi o reali, non magnitudine)."""
+    with get_recorder().stage("load"):
+        data = open_capture(file_path)
+        try:
+            return select_capture_slice(data, bin_range, fusion_channel(fusion, channel))
+        except ValueError as e:
+            raise ValueError(f"{os.path.basename(file_path)}: {e}") from None
+
+
+def antenna_spectrograms(selected, window_length=DEFAULT_DOPPLER_WINDOW, fusion="single"):
+    """
+    Spettrogrammi (frames, bins) delle antenne di un gruppo {rx: fetta di select_capture_slice},
+    calcolati con un solo STFT su tutte le antenne. Antenne di altezza diversa sono calcolate
+    separatamente: il controllo delle altezze resta a build_group_images.
+    """
+    recorder = get_recorder()
+    result = {}
+    shapes = {}
+    for rx_key, capture_slice in selected.items():
+        shapes.setdefault((capture_slice.shape[0], capture_slice.shape[-1]), []).append(rx_key)
+    with recorder.stage("doppler"):
+        for (frames, n_bins), rx_keys in shapes.items():
+            dtype = np.result_type(selected[rx_keys[0]].dtype, np.float32)
+            signal = np.empty((len(rx_keys), frames, n_bins), dtype=dtype)
+            for antenna, rx_key in enumerate(rx_keys):
+                static_free_signal(selected[rx_key], fusion, out=signal[antenna])
+            spectrograms = doppler_spectrogram(signal, window_length)
+            result.update(zip(rx_keys, spectrograms))
+    return result
@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+from collections import Counter
+from functools import partial
+
+import numpy as np
+
+from .cli import add_config_arguments, config_from_args
+from .dataset import LABEL_MAPPING, group_dataset_files, parse_acquisition_name
+from .image_io import encode_gray_png, quantize_to_gray
+from .parallel import add_workers_argument
+from .pipeline import PipelineConfig, clean_output_folder, image_file_name, iter_group_images
+
+# --- FORMATO DEL DATASET IMPACCHETTATO ---
+# Una cartella con:
+# - images_00000.npy, images_00001.npy, ...: shard (campioni, righe, colonne) leggibili con mmap
+# - labels.npy: indice della classe di ogni campione (int16), parallelo agli shard
+# - index.json: classi, shard e, per ogni campione, acquisizione, soggetto, data/ora, parte e altezza
+PACKED_VERSION = 1
+INDEX_FILE = "index.json"
+LABELS_FILE = "labels.npy"
+SHARD_PATTERN = "images_{:05d}.npy"
+# uint8: gli stessi livelli di grigio dei PNG (conversione in PNG esatta);
+# float16: i valori dopo la normalizzazione, per l'addestramento diretto
+PACKED_DTYPES = ("uint8", "float16")
+DEFAULT_SHARD_SIZE = 4096
+# Classi nell'ordine di LABEL_MAPPING: labels.npy contiene l'indice in questa lista
+CLASSES = list(LABEL_MAPPING.values())
+
+_SAMPLE_FIELDS = ("base_name", "subject", "timestamp", "label", "part", "height")
+
+
+def packed_pixels(image, dtype="uint8"):
+    """Immagine della pipeline nel dtype del dataset impacchettato: livelli di grigio o float16."""
+    if dtype == "uint8":
+        return quantize_to_gray(image)
+    return np.asarray(image, dtype=np.float16)
+
+
+class PackedWriter:
+    """
+    Scrive le immagini in shard contigui di al massimo shard_size campioni.
+    Le immagini di uno shard sono tenute in memoria finché lo shard non è completo:
+    ogni shard ha l'altezza della sua immagine più alta (le più basse sono completate con zeri,
+    l'altezza reale è nell'indice).
+    """
+
+    def __init__(self, output_path, dtype="uint8", shard_size=DEFAULT_SHARD_SIZE, params=None, output_tag=""):
+        if dtype not in PACKED_DTYPES:
+            raise ValueError(f"Unknown packed dtype '{dtype}', expected one of {PACKED_DTYPES}")
+        if shard_size < 1:
+            raise ValueError(f"Invalid shard size: {shard_size}")
+        self.output_path = output_path
+        self.dtype = dtype
+        self.shard_size = shard_size
+        self.params = params or {}
+        self.output_tag = output_tag
+        self.shards = []
+        self.samples = {name: [] for name in _SAMPLE_FIELDS}
+        self._pending = []
+        os.makedirs(output_path, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    def add(self, image, base_name, label, part=1):
+        """Aggiunge un'immagine (righe x colonne) con i dati dell'acquisizione da cui proviene."""
+        self.add_pixels(packed_pixels(image, self.dtype), base_name, label, part)
+
+    def add_pixels(self, pixels, base_name, label, part=1):
+        """Come add, per un'immagine già convertita con packed_pixels nel dtype del dataset."""
+        if self._pending and pixels.shape[1] != self._pending[0].shape[1]:
+            raise ValueError(f"Image width {pixels.shape[1]} differs from {self._pending[0].shape[1]} in the same shard")
+        self._pending.append(pixels)
+
+        subject, _, timestamp = parse_acquisition_name(base_name)
+        for name, value in zip(_SAMPLE_FIELDS, (base_name, subject, timestamp, label, part, pixels.shape[0])):
+            self.samples[name].append(value)
+        if len(self._pending) == self.shard_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        height = max(pixels.shape[0] for pixels in self._pending)
+        width = self._pending[0].shape[1]
+        file_name = SHARD_PATTERN.format(len(self.shards))
+        # Il file .npy viene creato già della dimensione finale (pieno di zeri) e riempito in place
+        shard = np.lib.format.open_memmap(
+            os.path.join(self.output_path, file_name), mode="w+",
+            dtype=self.dtype, shape=(len(self._pending), height, width),
+        )
+        for row, pixels in enumerate(self._pending):
+            shard[row, :pixels.shape[0]] = pixels
+        shard.flush()
+        del shard
+        self.shards.append({"file": file_name, "count": len(self._pending), "height": height, "width": width})
+        self._pending = []
+
+    def close(self):
+        """Scrive l'ultimo shard, labels.npy e index.json."""
+        self._flush()
+        labels = np.array([CLASSES.index(label) for label in self.samples["label"]], dtype=np.int16)
+        np.save(os.path.join(self.output_path, LABELS_FILE), labels)
+
+        index_path = os.path.join(self.output_path, INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": PACKED_VERSION,
+                "dtype": self.dtype,
+                "params": self.params,
+                "output_tag": self.output_tag,
+                "classes": CLASSES,
+                "shards": self.shards,
+                "samples": self.samples,
+            }, f)
+        os.replace(tmp_path, index_path)
+
+
+class PackedDataset:
+    """
+    Lettura di un dataset impacchettato: gli shard sono aperti in memory-map,
+    quindi dataset[i] non decodifica nessun file e non copia i dati.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != PACKED_VERSION:
+            raise ValueError(f"Unsupported packed dataset version {index.get('version')} in {path}")
+        self.dtype = index["dtype"]
+        self.params = index["params"]
+        self.output_tag = index["output_tag"]
+        self.classes = index["classes"]
+        self.samples = index["samples"]
+        self.labels = np.load(os.path.join(path, LABELS_FILE), mmap_mode="r")
+        self.shards = [np.load(os.path.join(path, shard["file"]), mmap_mode="r") for shard in index["shards"]]
+        self._offsets = np.cumsum([0] + [shard["count"] for shard in index["shards"]])
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def locate(self, index):
+        """(shard, riga nello shard) del campione index."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"Sample {index} out of range for {len(self)} samples")
+        shard = int(np.searchsorted(self._offsets, index, side="right")) - 1
+        return shard, index - int(self._offsets[shard])
+
+    def __getitem__(self, index):
+        """Immagine del campione index (vista sullo shard, senza le righe di riempimento)."""
+        shard, row = self.locate(index)
+        return self.shards[shard][row, :self.samples["height"][index]]
+
+    def sample_info(self, index):
+        """Acquisizione di origine del campione: base_name, soggetto, data/ora, etichetta, parte, altezza."""
+        return {name: self.samples[name][index] for name in _SAMPLE_FIELDS}
+
+    def png_name(self, index):
+        """Nome del PNG per Edge Impulse, lo stesso prodotto dalla pipeline."""
+        samples = self.samples
+        return image_file_name(samples["base_name"][index], samples["label"][index], self.output_tag,
+                               samples["part"][index])
+
+
+def pack_dataset(config, dataset_path, output_path, dtype="uint8", shard_size=DEFAULT_SHARD_SIZE, workers=1,
+                 chunksize=None):
+    """
+    Genera le immagini di una variante del dataset (stesse operazioni della pipeline PNG)
+    e le scrive in formato impacchettato. Restituisce il conteggio degli esiti dei gruppi.
+    """
+    file_groups = group_dataset_files(dataset_path)
+    print(f"Found {len(file_groups)} unique acquisition groups to potentially process.")
+    clean_output_folder(output_path)
+
+    group_counts = Counter()
+    writer = PackedWriter(output_path, dtype, shard_size, config.build_params(), config.sensor_spec.output_tag)
+    with writer:
+        # Le immagini sono convertite nel dtype del dataset dove sono calcolate (anche nei processi del pool)
+        for base_name, label, status, parts, _ in iter_group_images(
+                config, dataset_path, file_groups, partial(packed_pixels, dtype=dtype), workers=workers,
+                chunksize=chunksize):
+            group_counts[status] += 1
+            for part, pixels in enumerate(parts, start=1):
+                writer.add_pixels(pixels, base_name, label, part)
+    print(f"Packed {len(writer.samples['label'])} images into {len(writer.shards)} shard(s) in {output_path}")
+    return group_counts
+
+
+def unpack_to_png(packed_path, output_path):
+    """
+    Riconverte un dataset impacchettato nei PNG per Edge Impulse (stessi nomi della pipeline).
+    Con dtype uint8 i PNG sono identici a quelli generati direttamente; con float16 i livelli
+    di grigio sono ricalcolati dai valori a mezza precisione.
+    """
+    dataset = PackedDataset(packed_path)
+    clean_output_folder(output_path)
+    for index in range(len(dataset)):
+        image = dataset[index]
+        pixels = image if dataset.dtype == "uint8" else quantize_to_gray(image)
+        with open(os.path.join(output_path, dataset.png_name(index)), "wb") as f:
+            f.write(encode_gray_png(np.ascontiguousarray(pixels)))
+    print(f"Wrote {len(dataset)} PNG images to {output_path}")
+    return len(dataset)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack preprocessed radar images into memory-mappable shards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pack = commands.add_parser("pack", help="Preprocess a dataset into packed shards.")
+    pack.add_argument("--dataset", required=True, help="Folder with the .npy captures.")
+    pack.add_argument("--output", required=True, help="Output folder for the packed dataset (wiped).")
+    pack.add_argument("--dtype", choices=PACKED_DTYPES, default="uint8",
+                      help="uint8 gray levels (exact PNG round trip) or float16 normalized values.")
+    pack.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Images per shard.")
+    add_workers_argument(pack)
+    add_config_arguments(pack, PipelineConfig())
+
+    unpack = commands.add_parser("unpack", help="Write the PNG images of a packed dataset for Edge Impulse.")
+    unpack.add_argument("packed", help="Packed dataset folder.")
+    unpack.add_argument("--output", required=True, help="Output folder for the PNG images (wiped).")
+
+    args = parser.parse_args(argv)
+    if args.command == "unpack":
+        return unpack_to_png(args.packed, args.output)
+
+    try:
+        config = config_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    return pack_dataset(config, args.dataset, args.output, args.dtype, args.shard_size, args.workers, args.chunksize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+import argparse
+import json
+import os
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from .alignment import aligned_height, merge_aligned
+from .cli import add_config_arguments, config_from_args
+from .dataset import group_dataset_files
+from .image_io import GRAY_LEVELS, GRAY_LUT, encode_gray_png
+from .parallel import GROUP_ERROR, GROUP_GENERATED, GROUP_SKIPPED, add_workers_argument
+from .pipeline import GroupError, PipelineConfig, clean_output_folder, group_output_path, iter_group_images
+from .windowing import iter_windows
+
+# --- PRE-PROCESSING IN VIRGOLA FISSA (RIFERIMENTO PER IL FIRMWARE) ---
+# Stesse immagini di normalize_and_log_transform + affiancamento delle antenne + quantize_to_gray,
+# calcolate solo con interi, come sul microcontrollore (STM32, Arduino Nano 33 BLE Sense):
+# 1. magnitudine -> codice uint32 Q32.frac_bits (arrotondato, saturato)
+# 2. "log": L = log2(2**frac_bits + codice) in Q.log_frac_bits, con l'esponente dato dalla
+#    posizione del bit più alto e la mantissa da una tabella di 2**lut_bits voci.
+#    log2(2**frac_bits + q) = log2(1 + m) + frac_bits = log1p(m) / ln(2) + costante: la
+#    normalizzazione min/max elimina costante e fattore di scala, l'immagine è la stessa di log1p
+# 3. affiancamento delle antenne (RX0 | RX1 | RX2), troncamento o finestre come la pipeline
+# 4. indice di grigio intero ((L - min) * 256) // (max - min), al massimo 255, poi GRAY_LUT
+#    (la stessa tabella dei PNG): byte identici a quelli che vede la rete sul dispositivo
+MAGNITUDE_BITS = 32
+MAX_MAGNITUDE_CODE = (1 << MAGNITUDE_BITS) - 1
+
+
+@dataclass(frozen=True)
+class FixedPointSpec:
+    """
+    Formato dei numeri in virgola fissa:
+    - frac_bits: bit frazionari dei codici di magnitudine: i campioni di Infineon sono interi,
+      le magnitudini di SR250Mate (I/Q interi) no, e l'arrotondamento dei valori piccoli pesa
+      dopo il logaritmo; con 4 bit il massimo di SR250Mate (circa 27000) usa 19 bit
+    - lut_bits: bit della mantissa usati come indice della tabella del logaritmo
+    - log_frac_bits: bit frazionari di L; L < 33 * 2**log_frac_bits e (L - min) * 256 restano in int32
+    """
+    frac_bits: int = 4
+    lut_bits: int = 10
+    log_frac_bits: int = 11
+
+    def __post_init__(self):
+        if not 0 <= self.frac_bits <= 16:
+            raise ValueError(f"Invalid frac_bits {self.frac_bits}, expected 0-16")
+        if not 1 <= self.lut_bits <= 12:
+            raise ValueError(f"Invalid lut_bits {self.lut_bits}, expected 1-12")
+        if not 0 <= self.log_frac_bits <= 16:
+            raise ValueError(f"Invalid log_frac_bits {self.log_frac_bits}, expected 0-16")
+
+    @property
+    def log_table(self):
+        return log2_table(self.lut_bits, self.log_frac_bits)
+
+
+@lru_cache(maxsize=8)
+def log2_table(lut_bits, log_frac_bits):
+    """Tabella uint32 di round(log2(1 + i / 2**lut_bits) * 2**log_frac_bits), i = 0 .. 2**lut_bits - 1."""
+    fractions = np.arange(1 << lut_bits, dtype=np.float64) / (1 << lut_bits)
+    table = np.rint(np.log2(1.0 + fractions) * (1 << log_frac_bits)).astype(np.uint32)
+    table.flags.writeable = False
+    return table
+
+
+def quantize_magnitude(magnitude, frac_bits=FixedPointSpec.frac_bits):
+    """
+    Codici uint32 della magnitudine (Q32.frac_bits): floor(m * 2**frac_bits + 0.5), saturati.
+    È il confine tra la parte in virgola mobile (sensore) e quella intera.
+    Restituisce (codici, numero di valori saturati).
+    """
+    scaled = np.multiply(magnitude, float(1 << frac_bits), dtype=np.float64)
+    scaled += 0.5
+    np.floor(scaled, out=scaled)
+    saturated = int(np.count_nonzero(scaled > MAX_MAGNITUDE_CODE))
+    np.clip(scaled, 0, MAX_MAGNITUDE_CODE, out=scaled)
+    return scaled.astype(np.uint32), saturated
+
+
+def log_codes(codes, spec=FixedPointSpec()):
+    """L = log2(2**frac_bits + codice) in Q.log_frac_bits (uint32), vettoriale."""
+    values = codes.astype(np.int64) + (1 << spec.frac_bits)
+    # frexp è esatto per gli interi: values = mantissa * 2**e con mantissa in [0.5, 1)
+    exponent = np.frexp(values)[1] - 1
+    index = ((values << spec.lut_bits) >> exponent) - (1 << spec.lut_bits)
+    return ((exponent << spec.log_frac_bits) + spec.log_table[index]).astype(np.uint32)
+
+
+def scale_to_gray(values):
+    """
+    Livelli di grigio uint8 di una matrice di interi con minimo e massimo interi:
+    indice = ((v - min) * 256) // (max - min), al massimo 255, poi GRAY_LUT.
+    Immagine costante = nera, come quantize_to_gray.
+    """
+    low = int(values.min())
+    high = int(values.max())
+    if high == low:
+        return np.zeros(values.shape, dtype=np.uint8)
+    index = ((values.astype(np.int64) - low) * GRAY_LEVELS) // (high - low)
+    np.minimum(index, GRAY_LEVELS - 1, out=index)
+    return GRAY_LUT[index]
+
+
+def check_fixed_point_config(config):
+    """Il percorso intero copre magnitudine, log, affiancamento e min/max: niente clutter né Doppler."""
+    if config.feature != "range_time":
+        raise ValueError("The fixed-point path supports range-time images only")
+    if config.clutter != "none":
+        raise ValueError("The fixed-point path does not support clutter removal")
+
+
+def fixed_point_images(config, antenna_codes, spec=FixedPointSpec()):
+    """
+    Immagini uint8 di un gruppo dai codici di magnitudine delle antenne, con le stesse regole di
+    build_group_images (altezze, troncamento a max_height o finestre, riempimento).
+    Generatore, come build_group_images: un'immagine per parte.
+    """
+    heights = [codes.shape[0] for codes in antenna_codes]
+    rows = aligned_height(heights, config.alignment)
+    if rows is None:
+        raise GroupError(f"Inconsistent heights {sorted(set(heights))}")
+    if config.max_height is not None and not config.split_height:
+        rows = min(rows, config.max_height)
+    values = [codes[:rows] for codes in antenna_codes]
+    # Con alignment="pad" le righe mancanti di un'antenna sono codici zero (magnitudine nulla), prima del log
+    merged = merge_aligned(values, rows) if min(heights) < rows else np.concatenate(values, axis=1)
+    if config.normalization == "log":
+        merged = log_codes(merged, spec)
+
+    if config.split_height:
+        parts = iter_windows(merged, config.max_height, config.hop, "keep" if config.tail == "pad" else config.tail)
+    else:
+        parts = [merged]
+    pad_height = config.pad_height or (config.split_height and config.tail == "pad")
+    for part in parts:
+        padding = config.max_height - part.shape[0] if pad_height and part.shape[0] < config.max_height else 0
+        if padding and config.normalization == "none":
+            # Gli zeri aggiunti partecipano al minimo, come nella pipeline
+            part = np.concatenate([part, np.zeros((padding, part.shape[1]), dtype=part.dtype)])
+            padding = 0
+        gray = scale_to_gray(part)
+        if padding:
+            # Dopo la normalizzazione le righe aggiunte valgono 0: livello di grigio 0
+            gray = np.concatenate([gray, np.zeros((padding, gray.shape[1]), dtype=np.uint8)])
+        yield gray
+
+
+def reference_gray_image(antenna_codes, normalization="log", spec=FixedPointSpec(), height=None):
+    """
+    Riferimento scalare dell'immagine senza finestre, scritto come il codice del firmware:
+    solo interi Python, un pixel alla volta (lento). antenna_codes: liste di righe di codici
+    delle antenne; height: altezza fissa (righe a 0 in fondo, come pad_height).
+    """
+    table = spec.log_table.tolist()
+    gray_table = GRAY_LUT.tolist()
+    one = 1 << spec.frac_bits
+    image = []
+    for row_index in range(len(antenna_codes[0])):
+        row = []
+        for codes in antenna_codes:
+            for code in codes[row_index]:
+                if normalization == "log":
+                    value = int(code) + one
+                    exponent = value.bit_length() - 1
+                    index = ((value << spec.lut_bits) >> exponent) - (1 << spec.lut_bits)
+                    row.append((exponent << spec.log_frac_bits) + table[index])
+                else:
+                    row.append(int(code))
+        image.append(row)
+    width = len(image[0]) if image else 0
+    height = height or len(image)
+    if normalization == "none":
+        image += [[0] * width for _ in range(height - len(image))]
+    low = min(min(row) for row in image)
+    high = max(max(row) for row in image)
+    gray = []
+    for row in image:
+        if high == low:
+            gray.append([0] * width)
+        else:
+            gray.append([gray_table[min(((value - low) * GRAY_LEVELS) // (high - low), GRAY_LEVELS - 1)]
+                         for value in row])
+    gray += [[0] * width for _ in range(height - len(gray))]
+    return np.array(gray, dtype=np.uint8).reshape(height, width)
+
+
+class ErrorReport:
+    """Differenze tra i livelli di grigio in virgola fissa e quelli della pipeline float, su tutto il dataset."""
+
+    def __init__(self):
+        self.images = 0
+        self.pixels = 0
+        self.abs_error_sum = 0
+        self.max_error = 0
+        self.histogram = Counter()
+        self.saturated = 0
+        self.worst = []
+        self.verified = 0
+        self.reference_mismatches = 0
+
+    def add(self, name, fixed, reference):
+        errors = np.abs(fixed.astype(np.int16) - reference.astype(np.int16))
+        self.images += 1
+        self.pixels += errors.size
+        self.abs_error_sum += int(errors.sum())
+        self.max_error = max(self.max_error, int(errors.max(initial=0)))
+        self.histogram.update({int(error): int(count) for error, count in zip(*np.unique(errors, return_counts=True))})
+        self.worst.append((int(errors.max(initial=0)), float(errors.mean()) if errors.size else 0.0, name))
+        self.worst = sorted(self.worst, reverse=True)[:5]
+
+    def summary(self):
+        exact = self.histogram.get(0, 0)
+        return {
+            "images": self.images,
+            "pixels": self.pixels,
+            "exact_pixels": exact / self.pixels if self.pixels else None,
+            "mean_abs_error": self.abs_error_sum / self.pixels if self.pixels else None,
+            "max_abs_error": self.max_error,
+            "error_histogram": {str(error): count for error, count in sorted(self.histogram.items())},
+            "saturated_magnitudes": self.saturated,
+            "reference_checked_images": self.verified,
+            "reference_mismatches": self.reference_mismatches,
+            "worst_images": [{"max_abs_error": error, "mean_abs_error": mean, "image": name}
+                             for error, mean, name in self.worst],
+        }
+
+    def format_summary(self):
+        summary = self.summary()
+        if not self.pixels:
+            return "No images compared."
+        lines = [
+            f"Compared {summary['images']} images ({summary['pixels']} pixels) with the float pipeline:",
+            f"  identical pixels: {100 * summary['exact_pixels']:.3f}%",
+            f"  mean abs error: {summary['mean_abs_error']:.5f} gray levels, max: {summary['max_abs_error']}",
+            "  error histogram: " + ", ".join(f"{e}: {n}" for e, n in summary["error_histogram"].items()),
+            f"  saturated magnitudes: {summary['saturated_magnitudes']}",
+            f"  bit-exact with the scalar reference: {summary['reference_checked_images'] - summary['reference_mismatches']}"
+            f" of {summary['reference_checked_images']} images",
+        ]
+        return "\n".join(lines)
+
+
+def compare_dataset(config, dataset_path, spec=FixedPointSpec(), output_path=None, verify=10, workers=1,
+                    chunksize=None):
+    """
+    Genera le immagini in virgola fissa di tutto il dataset e le confronta con quelle della pipeline
+    float (stessi gruppi, stesse parti). Le prime verify immagini sono ricalcolate anche con
+    reference_gray_image, che deve dare gli stessi byte. Con output_path le immagini in virgola
+    fissa sono salvate come PNG con i nomi della pipeline (immagini di training = input sul dispositivo).
+    Restituisce (ErrorReport, conteggio degli esiti dei gruppi).
+    """
+    check_fixed_point_config(config)
+    file_groups = group_dataset_files(dataset_path)
+    print(f"Found {len(file_groups)} unique acquisition groups to potentially process.")
+    if output_path:
+        clean_output_folder(output_path)
+    report = ErrorReport()
+    group_counts = Counter()
+    # Immagini float della pipeline (riferimenti) e magnitudini delle antenne da cui ricalcolarle in virgola fissa
+    for base_name, label, status, references, antenna_data in iter_group_images(
+            config, dataset_path, file_groups, keep_data=True, workers=workers, chunksize=chunksize):
+        group_counts[status] += 1
+        if status != GROUP_GENERATED:
+            continue
+        antenna_codes = []
+        for data in antenna_data:
+            codes, saturated = quantize_magnitude(data, spec.frac_bits)
+            report.saturated += saturated
+            antenna_codes.append(codes)
+        images = list(fixed_point_images(config, antenna_codes, spec))
+        for part, (image, reference) in enumerate(zip(images, references), start=1):
+            file_path = group_output_path(config, output_path or "", base_name, label, part)
+            report.add(os.path.basename(file_path), image, reference)
+            if output_path:
+                with open(file_path, "wb") as f:
+                    f.write(encode_gray_png(image))
+        if report.verified < verify and images:
+            # Solo la prima parte (le prime max_height righe): il riferimento non divide in finestre
+            rows = aligned_height([len(codes) for codes in antenna_codes], config.alignment)
+            if config.max_height is not None:
+                rows = min(rows, config.max_height)
+            padded = config.pad_height or (config.split_height and config.tail == "pad")
+            # Antenne allineate come nel firmware: le righe mancanti (alignment="pad") sono codici zero
+            aligned_codes = [codes[:rows].tolist() + [[0] * codes.shape[1]] * (rows - min(rows, len(codes)))
+                             for codes in antenna_codes]
+            expected = reference_gray_image(aligned_codes, config.normalization, spec,
+                                            images[0].shape[0] if padded else None)
+            report.verified += 1
+            report.reference_mismatches += not np.array_equal(expected, images[0])
+    return report, group_counts
+
+
+def c_header(spec=FixedPointSpec()):
+    """Costanti e tabelle per il firmware (C99), generate dagli stessi valori del riferimento Python."""
+    def array(name, ctype, values):
+        body = ",".join(("\n    " if i % 16 == 0 else " ") + str(v) for i, v in enumerate(values))
+        return f"static const {ctype} {name}[{len(values)}] = {{{body}\n}};"
+
+    return "\n".join([
+        "/* Generated by smart_physio.fixed_point: do not edit. */",
+        "#include <stdint.h>",
+        f"#define SP_MAGNITUDE_FRAC_BITS {spec.frac_bits}",
+        f"#define SP_LOG_LUT_BITS {spec.lut_bits}",
+        f"#define SP_LOG_FRAC_BITS {spec.log_frac_bits}",
+        array("SP_LOG2_LUT", "uint16_t" if spec.log_table.max() <= 0xFFFF else "uint32_t", spec.log_table.tolist()),
+        array("SP_GRAY_LUT", "uint8_t", GRAY_LUT.tolist()),
+        "",
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Integer (fixed-point) reference of the log + min/max preprocessing for the MCU firmware, "
+                    "with the error against the float pipeline over a dataset.")
+    parser.add_argument("--dataset", required=True, help="Folder with the .npy captures.")
+    parser.add_argument("--output", help="Also write the fixed-point PNG images to this folder (wiped).")
+    parser.add_argument("--frac-bits", type=int, default=FixedPointSpec.frac_bits,
+                        help=f"Fractional bits of the uint32 magnitude codes (default: {FixedPointSpec.frac_bits}).")
+    parser.add_argument("--lut-bits", type=int, default=FixedPointSpec.lut_bits,
+                        help=f"Mantissa bits indexing the log2 lookup table (default: {FixedPointSpec.lut_bits}).")
+    parser.add_argument("--log-frac-bits", type=int, default=FixedPointSpec.log_frac_bits,
+                        help="Fractional bits of the log2 values (default: 11).")
+    parser.add_argument("--verify", type=int, default=10,
+                        help="Images also computed with the scalar reference, which must match bit for bit (default: 10).")
+    parser.add_argument("--report", metavar="PATH", help="Write the error report as JSON.")
+    parser.add_argument("--c-header", metavar="PATH", help="Write the lookup tables and constants as a C header.")
+    add_workers_argument(parser)
+    add_config_arguments(parser, PipelineConfig(normalization="log"))
+    args = parser.parse_args(argv)
+    try:
+        config = config_from_args(args)
+        check_fixed_point_config(config)
+        spec = FixedPointSpec(args.frac_bits, args.lut_bits, args.log_frac_bits)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.c_header:
+        with open(args.c_header, "w", encoding="utf-8") as f:
+            f.write(c_header(spec))
+        print(f"C header written to {args.c_header}")
+    report, group_counts = compare_dataset(config, args.dataset, spec, args.output, args.verify, args.workers,
+                                           args.chunksize)
+    print(report.format_summary())
+    print(f"Groups: {group_counts[GROUP_GENERATED]} compared, {group_counts[GROUP_SKIPPED]} skipped, "
+          f"{group_counts[GROUP_ERROR]} with errors")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"params": config.build_params(), "fixed_point": vars(spec), **report.summary()}, f, indent=1)
+        print(f"Report written to {args.report}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
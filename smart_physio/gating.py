@@ -0,0 +1,192 @@
+import json
+import os
+
+import numpy as np
+
+from .capture_io import fused_magnitude, fusion_channel, open_capture, select_capture_slice
+from .dataset import RX_KEYS, group_dataset_files, parse_acquisition_name
+
+# Scelta dei range bins di ogni immagine (range gating):
+# - "fixed":   sempre bin_range (es. 0:40, soggetto a circa 1 metro), come gli script originali
+# - "capture": finestra centrata sui bins con più movimento della singola acquisizione
+# - "session": finestra comune a tutte le acquisizioni della sessione (soggetto + giorno),
+#              più stabile: il soggetto non cambia distanza tra un esercizio e l'altro
+RANGE_GATES = ("fixed", "capture", "session")
+
+# Bins sommati per trovare il picco di energia: un singolo bin rumoroso non sposta la finestra
+GATE_SMOOTHING_BINS = 5
+
+# Profili di energia salvati accanto alla cartella (es. Dataset.gates.json), per sessione
+GATES_VERSION = 1
+GATES_SUFFIX = ".gates.json"
+
+
+def session_key(acquisition_base_name):
+    """
+    Sessione di un'acquisizione, soggetto + giorno:
+    "Alberto_Right arm up_Fisio_20250528-145949" -> "Alberto_20250528".
+    Senza data/ora nel nome ogni acquisizione è una sessione a sé.
+    """
+    subject, _, timestamp = parse_acquisition_name(acquisition_base_name)
+    if timestamp is None:
+        return acquisition_base_name
+    return f"{subject}_{timestamp[:8]}"
+
+
+def motion_energy(magnitude):
+    """
+    Energia del movimento per range bin: varianza nel tempo della magnitudine (frames, bins).
+    Gli oggetti fermi (pareti, mobili) hanno varianza quasi nulla, il soggetto che si muove no.
+    """
+    return magnitude.var(axis=0, dtype=np.float64)
+
+
+def capture_energy_profile(file_path, channel, fusion="single"):
+    """Energia del movimento su tutti i range bins di un file (lettura in memory-map)."""
+    data = open_capture(file_path)
+    selected = select_capture_slice(data, (0, data.shape[-1]), fusion_channel(fusion, channel))
+    return motion_energy(fused_magnitude(selected, fusion))
+
+
+def gate_windows(profiles, width):
+    """
+    Inizio della finestra di width bins centrata sul picco di energia di ogni profilo.
+    profiles: (bins,) o (n, bins), es. un profilo per acquisizione; il calcolo è vettoriale.
+    La finestra resta dentro i bins disponibili.
+    """
+    profiles = np.asarray(profiles, dtype=np.float64)
+    n_bins = profiles.shape[-1]
+    if width > n_bins:
+        raise ValueError(f"Range gate of {width} bins does not fit in {n_bins} range bins")
+    # Somme mobili su GATE_SMOOTHING_BINS bins con una sola cumsum lungo l'ultimo asse
+    smoothing = min(GATE_SMOOTHING_BINS, n_bins)
+    sums = np.cumsum(profiles, axis=-1)
+    sums[..., smoothing:] = sums[..., smoothing:] - sums[..., :-smoothing]
+    peak = np.argmax(sums[..., smoothing - 1:], axis=-1) + smoothing // 2
+    return np.clip(peak - width // 2, 0, n_bins - width)
+
+
+class RangeGateCache:
+    """
+    Profili di energia dei file, raggruppati per sessione e salvati in <dataset>.gates.json.
+    Un profilo viene ricalcolato solo se il file cambia (dimensione o mtime) o se cambiano
+    il canale o la combinazione dei canali: con la cache la scelta delle finestre non rilegge
+    il dataset.
+    """
+
+    def __init__(self, dataset_path):
+        self.dataset_path = dataset_path
+        self.path = os.path.normpath(dataset_path) + GATES_SUFFIX
+        self.sessions = {}
+        self.changed = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("version") == GATES_VERSION:
+                self.sessions = stored["sessions"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def profile(self, base_name, file_name, channel, fusion="single"):
+        """Profilo di energia di un file della cartella, dalla cache se ancora valido."""
+        stat = os.stat(os.path.join(self.dataset_path, file_name))
+        signature = [stat.st_size, stat.st_mtime_ns, channel, fusion]
+        session = self.sessions.setdefault(session_key(base_name), {})
+        entry = session.get(file_name)
+        if entry is not None and entry["signature"] == signature:
+            return np.array(entry["profile"])
+        profile = capture_energy_profile(os.path.join(self.dataset_path, file_name), channel, fusion)
+        session[file_name] = {"signature": signature, "profile": profile.tolist()}
+        self.changed = True
+        return profile
+
+    def save(self):
+        """Scrive la cache se è cambiata; se la cartella non è scrivibile la cache resta in memoria."""
+        if not self.changed:
+            return
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": GATES_VERSION, "sessions": self.sessions}, f)
+            os.replace(tmp_path, self.path)
+            self.changed = False
+        except OSError:
+            pass
+
+
+def group_energy_profile(cache, base_name, files_info, antennas, channel, fusion="single"):
+    """Somma dei profili delle antenne di un gruppo, None se un file manca o non si può leggere."""
+    total = None
+    for rx_key in antennas:
+        file_name = files_info.get(rx_key)
+        if not file_name:
+            return None
+        try:
+            profile = cache.profile(base_name, file_name, channel, fusion)
+        except (OSError, ValueError) as e:
+            print(f"Range gating: cannot read {file_name}: {e}")
+            return None
+        if total is not None and total.shape != profile.shape:
+            return None
+        total = profile if total is None else total + profile
+    return total
+
+
+def resolve_range_gates(dataset_path, file_groups, mode, width, antennas, channel, cache=None, fusion="single"):
+    """
+    Range bins di ogni gruppo con il range gating mode ("capture" o "session"):
+    restituisce {base_name: (start, stop)} con finestre di width bins. I gruppi di cui
+    non si può calcolare il profilo (file mancanti o illeggibili) non compaiono.
+    In modalità "session" la finestra usa tutte le acquisizioni della sessione presenti
+    nella cartella, anche quelle escluse da file_groups (es. da --query): così il
+    risultato non dipende dal sottoinsieme elaborato.
+    """
+    if mode not in RANGE_GATES or mode == "fixed":
+        raise ValueError(f"Unknown range gate '{mode}', expected one of {RANGE_GATES[1:]}")
+    own_cache = cache is None
+    if own_cache:
+        cache = RangeGateCache(dataset_path)
+    antennas = [rx_key for rx_key in RX_KEYS if rx_key in antennas]
+
+    if mode == "capture":
+        names, profiles = [], []
+        for base_name, files_info in file_groups.items():
+            profile = group_energy_profile(cache, base_name, files_info, antennas, channel, fusion)
+            if profile is not None:
+                names.append(base_name)
+                profiles.append(profile)
+        gates = {}
+        # Profili della stessa lunghezza impilati: una sola chiamata vettoriale per tutti
+        for n_bins in {len(profile) for profile in profiles}:
+            members = [i for i, profile in enumerate(profiles) if len(profile) == n_bins]
+            starts = gate_windows(np.stack([profiles[i] for i in members]), width)
+            gates.update((names[i], (int(start), int(start) + width)) for i, start in zip(members, starts))
+    else:
+        wanted = {session_key(base_name) for base_name in file_groups}
+        session_profiles = {}
+        for base_name, files_info in group_dataset_files(dataset_path).items():
+            session = session_key(base_name)
+            if session not in wanted:
+                continue
+            profile = group_energy_profile(cache, base_name, files_info, antennas, channel, fusion)
+            if profile is None:
+                continue
+            current = session_profiles.get(session)
+            if current is None:
+                session_profiles[session] = profile
+            elif current.shape == profile.shape:
+                session_profiles[session] = current + profile
+        windows = {}
+        for session, profile in sorted(session_profiles.items()):
+            start = int(gate_windows(profile, width))
+            windows[session] = (start, start + width)
+            print(f"Range gate for session {session}: bins {start}-{start + width}")
+        gates = {
+            base_name: windows[session_key(base_name)]
+            for base_name in file_groups
+            if session_key(base_name) in windows
+        }
+
+    if own_cache:
+        cache.save()
+    return gates
@@ -0,0 +1,92 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from .instrumentation import get_recorder
+
+# --- MAPPATURA IN SCALA DI GRIGI ---
+# Stessa tabella che matplotlib costruisce per cmap='gray' (256 livelli):
+# il valore normalizzato x in [0, 1] diventa l'indice min(int(x * 256), 255)
+# e l'indice viene convertito in byte con troncamento, esattamente come in savefig.
+GRAY_LEVELS = 256
+GRAY_LUT = (np.linspace(0.0, 1.0, GRAY_LEVELS) * 255).astype(np.uint8)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def quantize_to_gray(data):
+    """
+    Converte una matrice 2D in livelli di grigio uint8 con la stessa mappatura
+    di plt.imshow(data, cmap='gray') seguito da plt.savefig.
+    Il minimo dei dati diventa nero e il massimo bianco.
+    """
+    data = np.asarray(data)
+    if data.ndim != 2:
+        raise ValueError(f"Expected a 2D matrix, got shape {data.shape}")
+
+    data_min = data.min()
+    data_max = data.max()
+    if data_max == data_min:
+        # matplotlib normalizza a 0 quando vmin == vmax: immagine nera
+        return np.zeros(data.shape, dtype=np.uint8)
+
+    # Normalizzazione tra 0 e 1 con gli stessi arrotondamenti di matplotlib.colors.Normalize:
+    # ogni passaggio è calcolato in float64 e riportato al tipo float dei dati (float32 per i .npy)
+    work_dtype = data.dtype if data.dtype.kind == "f" else np.dtype(np.float64)
+    data_min = np.float64(data_min)
+    data_max = np.float64(data_max)
+    scaled = np.subtract(data, data_min, dtype=np.float64).astype(work_dtype)
+    scaled = np.divide(scaled, data_max - data_min, dtype=np.float64).astype(work_dtype)
+
+    # Indice nella tabella dei grigi (il valore 1.0 finisce nell'ultimo livello)
+    indices = (scaled * work_dtype.type(GRAY_LEVELS)).astype(np.intp)
+    np.clip(indices, 0, GRAY_LEVELS - 1, out=indices)
+    return GRAY_LUT[indices]
+
+
+def _png_chunk(chunk_type, payload):
+    """Costruisce un chunk PNG: lunghezza, tipo, dati e CRC32."""
+    crc = zlib.crc32(payload, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+    return struct.pack(">I", len(payload)) + chunk_type + payload + struct.pack(">I", crc)
+
+
+def encode_gray_png(pixels, compress_level=6):
+    """
+    Codifica una matrice uint8 (righe x colonne) come PNG in scala di grigi a 8 bit.
+    Nessuna figura né backend grafico: solo l'header IHDR, i dati compressi e IEND.
+    """
+    pixels = np.asarray(pixels)
+    if pixels.ndim != 2 or pixels.dtype != np.uint8:
+        raise ValueError(f"Expected a 2D uint8 matrix, got {pixels.dtype} with shape {pixels.shape}")
+
+    height, width = pixels.shape
+    # Ogni riga PNG è preceduta dal byte del filtro (0 = nessun filtro)
+    raw = np.zeros((height, width + 1), dtype=np.uint8)
+    raw[:, 1:] = pixels
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"".join((
+        PNG_SIGNATURE,
+        _png_chunk(b"IHDR", header),
+        _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), compress_level)),
+        _png_chunk(b"IEND", b""),
+    ))
+
+
+def save_grayscale_png(data, file_path):
+    """
+    Salva la matrice come immagine PNG in scala di grigi, un pixel per elemento.
+    Sostituisce la sequenza plt.figure / imshow(cmap='gray') / savefig(bbox_inches='tight')
+    producendo le stesse dimensioni e gli stessi livelli di grigio.
+    """
+    recorder = get_recorder()
+    with recorder.stage("encode"):
+        png_bytes = encode_gray_png(quantize_to_gray(data))
+    with recorder.stage("write"):
+        with open(file_path, "wb") as f:
+            f.write(png_bytes)
+    recorder.count("bytes_written", len(png_bytes))
+    recorder.count("images")
+    return len(png_bytes)
@@ -0,0 +1,498 @@
+import argparse
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .catalog import select_file_groups
+from .cli import add_config_arguments, config_from_args
+from .dataset import LABEL_MAPPING
+from .export import PackedDataset
+from .image_io import quantize_to_gray
+from .parallel import add_workers_argument
+from .pipeline import PipelineConfig, iter_group_images
+
+# --- INFERENZA LOCALE (SENZA EDGE IMPULSE) ---
+# Motori, scelti dall'estensione del modello:
+# - ".npz":    NumpyCNN, CNN sequenziale in NumPy (nessuna dipendenza)
+# - ".tflite": modello esportato da Edge Impulse, con tflite-runtime o tensorflow
+# - ".onnx":   modello ONNX, con onnxruntime
+# Le immagini sono quelle dei PNG (livelli di grigio / 255, come il blocco Image di Edge Impulse),
+# calcolate in memoria dalle funzioni di pre-processing, senza scrivere né leggere PNG.
+MODEL_ENGINES = {".npz": "numpy", ".tflite": "tflite", ".onnx": "onnx"}
+
+# Classi nell'ordine di Edge Impulse (alfabetico): indice dell'uscita del modello -> etichetta
+DEFAULT_LABELS = tuple(sorted(LABEL_MAPPING.values()))
+
+DEFAULT_BATCH_SIZE = 64
+
+
+# --- CNN IN NUMPY ---
+def conv2d(x, kernel, bias, padding="same"):
+    """
+    Convoluzione 2D di un batch (campioni, righe, colonne, canali) con kernel (kh, kw, canali, filtri),
+    passo 1, come Keras Conv2D: le finestre di tutti i campioni diventano un unico prodotto matriciale.
+    """
+    kh, kw = kernel.shape[:2]
+    if padding == "same":
+        x = np.pad(x, ((0, 0), ((kh - 1) // 2, kh // 2), ((kw - 1) // 2, kw // 2), (0, 0)))
+    # (campioni, righe, colonne, canali, kh, kw) -> righe della matrice (kh, kw, canali) come il kernel
+    patches = sliding_window_view(x, (kh, kw), axis=(1, 2)).transpose(0, 1, 2, 4, 5, 3)
+    out = patches.reshape(-1, kh * kw * x.shape[3]) @ kernel.reshape(-1, kernel.shape[3])
+    out += bias
+    return out.reshape(*patches.shape[:3], kernel.shape[3])
+
+
+def max_pool2d(x, size=2):
+    """Max pooling size x size con passo size (Keras MaxPooling2D, padding "valid")."""
+    n, rows, columns, channels = x.shape
+    rows, columns = rows // size * size, columns // size * size
+    blocks = x[:, :rows, :columns].reshape(n, rows // size, size, columns // size, size, channels)
+    return blocks.max(axis=(2, 4))
+
+
+def softmax(x):
+    x = x - x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+def _keras_weights(layer):
+    """(kernel, bias) di un layer Keras; bias a zero se il layer non lo usa (use_bias=False)."""
+    weights = layer.get_weights()
+    kernel = weights[0]
+    bias = weights[1] if len(weights) > 1 else np.zeros(kernel.shape[-1], dtype=kernel.dtype)
+    return kernel, bias
+
+
+class NumpyCNN:
+    """
+    CNN sequenziale in NumPy, vettoriale su tutti i campioni di un batch.
+    layers: lista di dizionari {"type": ...} con type tra "conv2d" (kernel, bias, padding), "relu",
+    "maxpool" (size), "flatten", "dense" (kernel, bias) e "softmax"; i pesi hanno il formato di Keras.
+    Il file .npz contiene "architecture" (JSON: input_shape, labels, layers senza pesi) e i pesi
+    come "<indice>.kernel" / "<indice>.bias".
+    """
+
+    def __init__(self, input_shape, layers, labels=DEFAULT_LABELS):
+        self.input_shape = tuple(input_shape)
+        self.layers = layers
+        self.labels = tuple(labels)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            architecture = json.loads(str(data["architecture"]))
+            layers = []
+            for index, layer in enumerate(architecture["layers"]):
+                layer = dict(layer)
+                for name in ("kernel", "bias"):
+                    if f"{index}.{name}" in data:
+                        layer[name] = data[f"{index}.{name}"].astype(np.float32)
+                layers.append(layer)
+        return cls(architecture["input_shape"], layers, architecture.get("labels", DEFAULT_LABELS))
+
+    def save(self, path):
+        arrays = {}
+        plain = []
+        for index, layer in enumerate(self.layers):
+            plain.append({key: value for key, value in layer.items() if key not in ("kernel", "bias")})
+            for name in ("kernel", "bias"):
+                if name in layer:
+                    arrays[f"{index}.{name}"] = layer[name]
+        architecture = {"input_shape": list(self.input_shape), "labels": list(self.labels), "layers": plain}
+        np.savez(path, architecture=json.dumps(architecture), **arrays)
+
+    @classmethod
+    def from_keras(cls, model, labels=DEFAULT_LABELS):
+        """
+        Converte un modello Keras sequenziale (es. quello scaricabile da Edge Impulse) già caricato:
+        Conv2D, MaxPooling2D, Flatten, Dense e le attivazioni relu/softmax; Reshape, Dropout e
+        InputLayer non cambiano il calcolo in inferenza. Nessun import di TensorFlow qui.
+        Solo ciò che conv2d e max_pool2d calcolano: convoluzioni a passo 1 senza dilatazione, pooling
+        quadrato "valid" con passo uguale alla finestra; il resto è rifiutato invece di convertirlo male.
+        """
+        layers = []
+        for layer in model.layers:
+            kind = type(layer).__name__
+            config = layer.get_config()
+            if kind in ("InputLayer", "Dropout", "Reshape"):
+                continue
+            if config.get("data_format", "channels_last") != "channels_last":
+                raise ValueError(f"Unsupported data format {config['data_format']} in layer {layer.name}")
+            if kind == "Conv2D":
+                if tuple(config.get("strides", (1, 1))) != (1, 1) or tuple(config.get("dilation_rate", (1, 1))) != (1, 1):
+                    raise ValueError(f"Unsupported strides {config.get('strides')} or dilation rate "
+                                     f"{config.get('dilation_rate')} in layer {layer.name}, expected (1, 1)")
+                if config.get("groups", 1) != 1:
+                    raise ValueError(f"Unsupported grouped convolution in layer {layer.name}")
+                kernel, bias = _keras_weights(layer)
+                layers.append({"type": "conv2d", "kernel": kernel, "bias": bias, "padding": config["padding"]})
+            elif kind == "MaxPooling2D":
+                size = tuple(config["pool_size"])
+                strides = tuple(config.get("strides") or size)
+                if size[0] != size[1] or strides != size or config.get("padding", "valid") != "valid":
+                    raise ValueError(f"Unsupported pooling in layer {layer.name} (pool size {size}, strides {strides}, "
+                                     f"padding {config.get('padding')}): expected square, valid, strides = pool size")
+                layers.append({"type": "maxpool", "size": size[0]})
+            elif kind == "Flatten":
+                layers.append({"type": "flatten"})
+            elif kind == "Dense":
+                kernel, bias = _keras_weights(layer)
+                layers.append({"type": "dense", "kernel": kernel, "bias": bias})
+            else:
+                raise ValueError(f"Unsupported Keras layer {kind}")
+            activation = config.get("activation", "linear")
+            if activation in ("relu", "softmax"):
+                layers.append({"type": activation})
+            elif activation != "linear":
+                raise ValueError(f"Unsupported activation {activation} in layer {layer.name}")
+        return cls(model.input_shape[1:], layers, labels)
+
+    @classmethod
+    def random(cls, input_shape, labels=DEFAULT_LABELS, filters=(8, 16), seed=0):
+        """
+        Rete con l'architettura della CNN 2D predefinita di Edge Impulse e pesi casuali:
+        per misurare la velocità (l'accuratezza non ha significato).
+        """
+        rng = np.random.default_rng(seed)
+        shape = tuple(input_shape)
+        layers = []
+        for count in filters:
+            rows, columns, channels = shape
+            layers.append({"type": "conv2d", "padding": "same",
+                           "kernel": rng.normal(0, 0.3, (3, 3, channels, count)).astype(np.float32),
+                           "bias": np.zeros(count, dtype=np.float32)})
+            layers += [{"type": "relu"}, {"type": "maxpool", "size": 2}]
+            shape = (rows // 2, columns // 2, count)
+        features = int(np.prod(shape))
+        layers += [{"type": "flatten"},
+                   {"type": "dense", "kernel": rng.normal(0, 0.1, (features, len(labels))).astype(np.float32),
+                    "bias": np.zeros(len(labels), dtype=np.float32)},
+                   {"type": "softmax"}]
+        return cls(input_shape, layers, labels)
+
+    @property
+    def output_width(self):
+        """Classi in uscita: colonne del kernel dell'ultimo layer denso (None senza layer densi)."""
+        dense = [layer for layer in self.layers if layer["type"] == "dense"]
+        return int(dense[-1]["kernel"].shape[1]) if dense else None
+
+    def predict(self, batch):
+        """Probabilità (campioni, classi) di un batch (campioni, *input_shape) float32."""
+        x = batch
+        for layer in self.layers:
+            kind = layer["type"]
+            if kind == "conv2d":
+                x = conv2d(x, layer["kernel"], layer["bias"], layer.get("padding", "same"))
+            elif kind == "relu":
+                x = np.maximum(x, 0, out=x if x is not batch else None)
+            elif kind == "maxpool":
+                x = max_pool2d(x, layer.get("size", 2))
+            elif kind == "flatten":
+                x = x.reshape(x.shape[0], -1)
+            elif kind == "dense":
+                x = x @ layer["kernel"] + layer["bias"]
+            elif kind == "softmax":
+                x = softmax(x)
+            else:
+                raise ValueError(f"Unknown layer type '{kind}'")
+        return x
+
+
+# --- MODELLI ESPORTATI (TFLITE, ONNX) ---
+def _quantize_input(batch, dtype, scale, zero_point):
+    """Ingressi int8/uint8 dei modelli quantizzati: round(x / scale) + zero_point."""
+    if not np.issubdtype(dtype, np.integer):
+        return batch.astype(dtype, copy=False)
+    info = np.iinfo(dtype)
+    return np.clip(np.rint(batch / scale) + zero_point, info.min, info.max).astype(dtype)
+
+
+class TFLiteModel:
+    """Modello .tflite (es. il deployment "TensorFlow Lite" di Edge Impulse), float o int8."""
+
+    def __init__(self, path, labels=DEFAULT_LABELS, threads=None):
+        # Importati solo se serve: tflite-runtime (leggero) o, in mancanza, tensorflow
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError:
+                raise ValueError("Running .tflite models requires the tflite-runtime or tensorflow package") from None
+        self.interpreter = Interpreter(model_path=path, num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.input_shape = tuple(int(size) for size in self.input["shape"][1:])
+        self.output_width = int(self.output["shape"][-1])
+        self.labels = tuple(labels)
+        self._batch = 1
+
+    def _resize(self, size):
+        if size == self._batch:
+            return True
+        try:
+            self.interpreter.resize_tensor_input(self.input["index"], (size,) + self.input_shape)
+            self.interpreter.allocate_tensors()
+        except (RuntimeError, ValueError):
+            return False
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self._batch = size
+        return True
+
+    def _run(self, batch):
+        scale, zero_point = self.input["quantization"]
+        self.interpreter.set_tensor(self.input["index"], _quantize_input(batch, self.input["dtype"], scale, zero_point))
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self.output["index"])
+        scale, zero_point = self.output["quantization"]
+        if np.issubdtype(output.dtype, np.integer) and scale:
+            return (output.astype(np.float32) - zero_point) * scale
+        return output.astype(np.float32)
+
+    def predict(self, batch):
+        # Tutto il batch in una chiamata se il modello accetta la nuova dimensione, altrimenti un campione alla volta
+        if self._resize(batch.shape[0]):
+            return self._run(batch)
+        self._resize(1)
+        return np.concatenate([self._run(batch[i:i + 1]) for i in range(batch.shape[0])])
+
+
+class OnnxModel:
+    """Modello .onnx eseguito con onnxruntime sulla CPU; ingressi NHWC o NCHW."""
+
+    def __init__(self, path, labels=DEFAULT_LABELS, threads=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ValueError("Running .onnx models requires the onnxruntime package") from None
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        shape = [size if isinstance(size, int) else None for size in model_input.shape]
+        # Batch variabile (nome simbolico o None): tutto il batch in una chiamata
+        self.dynamic_batch = shape[0] is None
+        self.channels_first = len(shape) == 4 and shape[1] in (1, 3) and shape[3] not in (1, 3)
+        self.input_shape = tuple(shape[2:] + shape[1:2] if self.channels_first else shape[1:])
+        output_width = self.session.get_outputs()[0].shape[-1]
+        self.output_width = output_width if isinstance(output_width, int) else None
+        self.labels = tuple(labels)
+
+    def predict(self, batch):
+        if self.channels_first:
+            batch = batch.transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if self.dynamic_batch:
+            return self.session.run(None, {self.input_name: batch})[0]
+        return np.concatenate([self.session.run(None, {self.input_name: batch[i:i + 1]})[0]
+                               for i in range(batch.shape[0])])
+
+
+def load_model(path, labels=None, threads=None):
+    """
+    Carica un modello scegliendo il motore dall'estensione (vedi MODEL_ENGINES) e verifica che le
+    etichette siano una per uscita del modello.
+    """
+    engine = MODEL_ENGINES.get(os.path.splitext(path)[1].lower())
+    if engine is None:
+        raise ValueError(f"Unknown model format '{path}', expected one of {sorted(MODEL_ENGINES)}")
+    if engine == "numpy":
+        model = NumpyCNN.load(path)
+        if labels:
+            model.labels = tuple(labels)
+    else:
+        model_class = TFLiteModel if engine == "tflite" else OnnxModel
+        model = model_class(path, labels or DEFAULT_LABELS, threads)
+    if model.output_width is not None and model.output_width != len(model.labels):
+        raise ValueError(f"{len(model.labels)} labels ({','.join(model.labels)}) for a model with "
+                         f"{model.output_width} outputs")
+    return model
+
+
+# --- CAMPIONI E VALUTAZIONE ---
+def fit_batch(images, input_shape):
+    """
+    Batch float32 (campioni, *input_shape) da immagini uint8 (righe, colonne) di altezza anche diversa:
+    livelli di grigio / 255; righe mancanti a 0 (come pad_height), righe in eccesso tagliate.
+    Un ingresso piatto (caratteristiche,), come quello dei modelli Edge Impulse con Reshape, riceve
+    l'immagine riga per riga.
+    """
+    columns = images[0].shape[1]
+    if len(input_shape) == 1:
+        if input_shape[0] % columns:
+            raise ValueError(f"Model input of {input_shape[0]} features does not fit images {columns} pixels wide")
+        rows = input_shape[0] // columns
+    else:
+        rows = input_shape[0]
+        if input_shape[1] != columns:
+            raise ValueError(f"Model input shape {input_shape} does not fit images {columns} pixels wide")
+    batch = np.zeros((len(images), rows, columns), dtype=np.float32)
+    for sample, image in zip(batch, images):
+        height = min(rows, image.shape[0])
+        sample[:height] = image[:height]
+    batch *= np.float32(1 / 255)
+    return batch.reshape((len(images),) + tuple(input_shape))
+
+
+def iter_preprocessed(config, dataset_path, file_groups=None, workers=1, chunksize=None):
+    """
+    Immagini uint8 (stessi livelli di grigio dei PNG) di tutti i gruppi, calcolate in memoria con le
+    funzioni della pipeline: genera (livelli di grigio, etichetta, nome dell'acquisizione, parte).
+    """
+    for base_name, label, _, parts, _ in iter_group_images(config, dataset_path, file_groups, workers=workers,
+                                                           chunksize=chunksize):
+        for part, pixels in enumerate(parts, start=1):
+            yield pixels, label, base_name, part
+
+
+def iter_packed(packed_path):
+    """Immagini di un dataset impacchettato (export.py pack): stessi campi di iter_preprocessed."""
+    dataset = PackedDataset(packed_path)
+    for index in range(len(dataset)):
+        image = dataset[index]
+        info = dataset.sample_info(index)
+        pixels = np.asarray(image) if dataset.dtype == "uint8" else quantize_to_gray(image)
+        yield pixels, info["label"], info["base_name"], info["part"]
+
+
+class ScoreReport:
+    """Accuratezza per classe, matrice di confusione e velocità di una valutazione."""
+
+    def __init__(self, labels):
+        self.labels = tuple(labels)
+        self.confusion = np.zeros((len(labels), len(labels)), dtype=np.int64)
+        self.unknown = 0
+        self.prepare_s = 0.0
+        self.inference_s = 0.0
+
+    def add(self, true_labels, probabilities):
+        predicted = probabilities.argmax(axis=1)
+        for label, guess in zip(true_labels, predicted):
+            if label in self.labels:
+                self.confusion[self.labels.index(label), guess] += 1
+            else:
+                self.unknown += 1
+
+    @property
+    def samples(self):
+        return int(self.confusion.sum())
+
+    def summary(self):
+        totals = self.confusion.sum(axis=1)
+        correct = np.diag(self.confusion)
+        samples = self.samples
+        return {
+            "samples": samples,
+            "accuracy": float(correct.sum() / samples) if samples else None,
+            "per_class": {
+                label: {"samples": int(total), "accuracy": float(hit / total) if total else None}
+                for label, total, hit in zip(self.labels, totals, correct)
+            },
+            "confusion": {"labels": list(self.labels), "matrix": self.confusion.tolist()},
+            "unknown_labels": self.unknown,
+            "prepare_s": self.prepare_s,
+            "inference_s": self.inference_s,
+            "samples_per_s": samples / self.inference_s if self.inference_s else None,
+        }
+
+    def format_summary(self):
+        summary = self.summary()
+        if not summary["samples"]:
+            return "No samples scored."
+        lines = [f"{'class':<16} {'samples':>8} {'accuracy':>9}"]
+        for label, values in summary["per_class"].items():
+            accuracy = "-" if values["accuracy"] is None else f"{100 * values['accuracy']:.1f}%"
+            lines.append(f"{label:<16} {values['samples']:>8} {accuracy:>9}")
+        lines.append(f"{'all':<16} {summary['samples']:>8} {100 * summary['accuracy']:>8.1f}%")
+        lines.append("confusion (rows = true, columns = predicted):")
+        lines += ["  " + " ".join(f"{count:>5}" for count in row) for row in self.confusion]
+        if self.unknown:
+            lines.append(f"samples with labels unknown to the model: {self.unknown}")
+        lines.append(f"preprocessing: {self.prepare_s:.3f} s, inference: {self.inference_s:.3f} s "
+                     f"({summary['samples_per_s']:.0f} samples/s)")
+        return "\n".join(lines)
+
+
+def score(model, samples, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Valuta il modello su (immagine uint8, etichetta, ...) a batch di batch_size campioni:
+    ogni batch è una sola chiamata al modello. Il tempo di preparazione (pre-processing
+    compreso, se samples lo calcola al volo) e quello di inferenza sono misurati separatamente.
+    """
+    report = ScoreReport(model.labels)
+    samples = iter(samples)
+    while True:
+        start = time.perf_counter()
+        chunk = [sample for _, sample in zip(range(batch_size), samples)]
+        if not chunk:
+            break
+        batch = fit_batch([sample[0] for sample in chunk], model.input_shape)
+        prepared = time.perf_counter()
+        probabilities = model.predict(batch)
+        report.inference_s += time.perf_counter() - prepared
+        report.prepare_s += prepared - start
+        report.add([sample[1] for sample in chunk], probabilities)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Score preprocessed radar images with a local TFLite, ONNX or NumPy model (no PNG step).")
+    parser.add_argument("--model", required=True,
+                        help=f"Model file: {', '.join(f'{ext} ({engine})' for ext, engine in MODEL_ENGINES.items())}.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dataset", help="Folder with the .npy captures, preprocessed in memory with the options below.")
+    source.add_argument("--packed", help="Packed dataset folder written by 'python -m smart_physio.export pack'.")
+    parser.add_argument("--query", metavar="EXPR", help="With --dataset, score only the captures matching a catalog query.")
+    parser.add_argument("--labels", help="Comma-separated class order of the model outputs "
+                                         f"(default: {','.join(DEFAULT_LABELS)}).")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Samples per model call.")
+    parser.add_argument("--threads", type=int, default=None, help="Inference threads for TFLite/ONNX.")
+    parser.add_argument("--report", metavar="PATH", help="Write the scores as JSON.")
+    add_workers_argument(parser)
+    add_config_arguments(parser, PipelineConfig(normalization="log"))
+    args = parser.parse_args(argv)
+    try:
+        if args.batch_size < 1:
+            raise ValueError(f"Invalid batch size: {args.batch_size}")
+        config = config_from_args(args)
+        model = load_model(args.model, args.labels.split(",") if args.labels else None, args.threads)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+
+    if args.packed:
+        samples = iter_packed(args.packed)
+    else:
+        file_groups = select_file_groups(args.dataset, args.query) if args.query is not None else None
+        samples = iter_preprocessed(config, args.dataset, file_groups, args.workers, args.chunksize)
+    # La larghezza delle immagini dipende da feature, bins o dal dataset impacchettato: si verifica
+    # una volta sola, sul primo campione, prima di valutare
+    first = next(samples, None)
+    if first is not None:
+        try:
+            fit_batch([first[0]], model.input_shape)
+        except ValueError as e:
+            parser.error(str(e))
+        samples = itertools.chain([first], samples)
+    report = score(model, samples, args.batch_size)
+    print(report.format_summary())
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "params": None if args.packed else config.build_params(),
+                       **report.summary()}, f, indent=1)
+        print(f"Report written to {args.report}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,609 @@
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import struct
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+from .alignment import DEFAULT_MAX_SKEW, AntennaAligner
+from .cli import add_config_arguments, config_from_args
+from .dataset import split_capture_file_name
+from .image_io import quantize_to_gray
+from .pipeline import SENSORS, PipelineConfig
+from .replay import ReplaySource, VirtualSensor, latency_percentiles
+from .streaming import FRAME_RATE_HZ, StreamingPreprocessor
+from .synthetic import CAPTURE_FORMATS
+
+# --- SERVIZIO DI ACQUISIZIONE MULTI-SENSORE (ASYNCIO) ---
+# Molti radar inviano i loro frame su connessioni TCP o Unix socket; un solo event loop:
+# - legge gli stream di tutte le connessioni (un task per connessione);
+# - instrada i frame di ogni sensore al suo stato di pre-processing (StreamingPreprocessor:
+#   selezione delle antenne, buffer circolare, normalizzazione), in un task per sensore;
+# - raccoglie le finestre pronte di tutti i sensori in batch per il classificatore, eseguito in un
+#   thread per non bloccare la lettura delle connessioni.
+# Tutte le code sono limitate: se il classificatore o un sensore rallentano, le code si riempiono,
+# il task della connessione smette di leggere e il controllo di flusso di TCP rallenta il sensore
+# (backpressure) invece di far crescere la memoria.
+#
+# Protocollo (little-endian):
+# - il sensore invia una riga JSON {"sensor_id": "letto-03", "sensor": "infineon", "antennas": ["rx0", ...]}
+#   e riceve una riga JSON {"ok": true} oppure {"error": "..."} (e la connessione viene chiusa);
+# - poi un record per frame: numero di sequenza (uint64), istante di acquisizione (float64, secondi
+#   time.time()) e il frame di ogni antenna nell'ordine di "antennas", nel formato delle acquisizioni
+#   (Infineon: float32 (4, 128), SR250Mate: complex64 (120,)).
+# - con "per_antenna": true nella presentazione, un record per frame di ogni antenna: numero di
+#   sequenza, istante, posizione dell'antenna in "antennas" (uint32) e il suo frame. I frame delle
+#   antenne, anche sfasati, sono riallineati per numero di sequenza (alignment.AntennaAligner).
+RECORD_HEADER = struct.Struct("<Qd")
+ANTENNA_RECORD_HEADER = struct.Struct("<QdI")
+
+DEFAULT_BATCH_SIZE = 16
+# Attesa massima di un batch incompleto prima di inviarlo al classificatore
+DEFAULT_MAX_WAIT_S = 0.05
+# Frame in attesa per sensore e finestre in attesa del classificatore
+DEFAULT_SENSOR_QUEUE = 32
+DEFAULT_WINDOW_QUEUE = 256
+
+# Fine di uno stream o del servizio (le code contengono solo tuple)
+_STOP = object()
+
+
+def record_layout(sensor, n_antennas, per_antenna=False):
+    """(forma di un frame, dtype, byte di un record) per un sensore con n_antennas antenne."""
+    shape, dtype = CAPTURE_FORMATS[sensor]
+    frame_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if per_antenna:
+        return shape, np.dtype(dtype).newbyteorder("<"), ANTENNA_RECORD_HEADER.size + frame_bytes
+    return shape, np.dtype(dtype).newbyteorder("<"), RECORD_HEADER.size + n_antennas * frame_bytes
+
+
+def encode_record(sequence, timestamp, frames, dtype):
+    """Record di un frame: intestazione + frame delle antenne (lato sensore)."""
+    return RECORD_HEADER.pack(sequence, timestamp) + b"".join(
+        np.ascontiguousarray(frame, dtype=dtype).tobytes() for frame in frames)
+
+
+def encode_antenna_record(sequence, timestamp, position, frame, dtype):
+    """Record del frame di una sola antenna (presentazione con "per_antenna": true)."""
+    return ANTENNA_RECORD_HEADER.pack(sequence, timestamp, position) + np.ascontiguousarray(frame, dtype=dtype).tobytes()
+
+
+def parse_address(text):
+    """"unix:PATH" o "HOST:PORT" -> ("unix", PATH) o ("tcp", HOST, PORT)."""
+    if text.startswith("unix:"):
+        return ("unix", text[len("unix:"):])
+    host, separator, port = text.rpartition(":")
+    if not separator or not port.isdigit():
+        raise ValueError(f"Invalid address '{text}', expected HOST:PORT or unix:PATH")
+    return ("tcp", host or "127.0.0.1", int(port))
+
+
+def open_connection(address):
+    if address[0] == "unix":
+        return asyncio.open_unix_connection(address[1])
+    return asyncio.open_connection(address[1], address[2])
+
+
+def dataset_sensor(dataset_path):
+    """Sensore di un dataset dal suffisso dei nomi dei file (es. ..._sr250_rx0.npy -> "sr250mate")."""
+    tags = {spec.output_tag: name for name, spec in SENSORS.items()}
+    for file_name in sorted(os.listdir(dataset_path)):
+        parts = split_capture_file_name(file_name)
+        if parts is not None and parts[1] in tags:
+            return tags[parts[1]]
+    raise ValueError(f"No Infineon or SR250Mate captures in {dataset_path}")
+
+
+# --- STATO DEI SENSORI E MISURE ---
+class SensorStream:
+    """Stato di pre-processing di un sensore connesso e coda limitata dei suoi frame."""
+
+    def __init__(self, sensor_id, sensor, preprocessor, antenna_indices, queue_size, aligner=None):
+        self.sensor_id = sensor_id
+        self.sensor = sensor
+        self.preprocessor = preprocessor
+        # Posizione nel record (o in "antennas" della presentazione) delle antenne usate dal pre-processing
+        self.antenna_indices = antenna_indices
+        # Con record separati per antenna: AntennaAligner sulle antenne del pre-processing
+        self.aligner = aligner
+        self.frames = asyncio.Queue(maxsize=queue_size)
+        self.last_sequence = None
+        self.frames_received = 0
+        self.windows = 0
+        self.gaps = 0
+
+
+class IngestStats:
+    """Connessioni, frame, finestre, batch, attese per backpressure e latenze del servizio."""
+
+    def __init__(self):
+        self.connections = 0
+        self.rejected = 0
+        self.frames = 0
+        self.windows = 0
+        self.gaps = 0
+        self.antenna_frames_dropped = 0
+        self.antenna_frames_padded = 0
+        self.antenna_frames_late = 0
+        self.batches = 0
+        self.batch_sizes = []
+        self.latencies = []
+        self.backpressure_s = 0.0
+        self.predictions = Counter()
+        self.errors = []
+
+    def summary(self):
+        return {
+            "connections": self.connections,
+            "rejected": self.rejected,
+            "frames": self.frames,
+            "sequence_gaps": self.gaps,
+            "antenna_frames_dropped": self.antenna_frames_dropped,
+            "antenna_frames_padded": self.antenna_frames_padded,
+            "antenna_frames_late": self.antenna_frames_late,
+            "windows": self.windows,
+            "batches": self.batches,
+            "mean_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else None,
+            "window_latency_ms": latency_percentiles(self.latencies),
+            "backpressure_s": self.backpressure_s,
+            "predictions": dict(self.predictions),
+            "errors": self.errors,
+        }
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = [
+            f"connections: {summary['connections']} (rejected: {summary['rejected']}), frames: {summary['frames']}, "
+            f"sequence gaps: {summary['sequence_gaps']}",
+            f"antenna alignment: {summary['antenna_frames_dropped']} frames dropped, "
+            f"{summary['antenna_frames_padded']} padded, {summary['antenna_frames_late']} late",
+            f"windows: {summary['windows']}, batches: {summary['batches']}"
+            + (f" (mean size {summary['mean_batch_size']:.1f})" if summary["batches"] else ""),
+        ]
+        stats = summary["window_latency_ms"]
+        if stats is not None:
+            lines.append("window latency (last frame -> classified): "
+                         + ", ".join(f"{key}={value:.3f} ms" for key, value in stats.items()))
+        lines.append(f"time spent waiting on full queues (backpressure): {summary['backpressure_s']:.3f} s")
+        if summary["predictions"]:
+            lines.append("predictions: " + ", ".join(f"{label}={n}" for label, n in sorted(summary["predictions"].items())))
+        lines += [f"error: {error}" for error in summary["errors"]]
+        return "\n".join(lines)
+
+
+def model_classifier(model):
+    """
+    Classificatore per IngestService da un modello di inference.load_model: le finestre diventano
+    le stesse immagini dei PNG (livelli di grigio / 255) e sono valutate in una sola chiamata.
+    """
+    # Importato solo se serve un modello
+    from .inference import fit_batch
+
+    def classify(sensor, windows):
+        batch = fit_batch([quantize_to_gray(window) for window in windows], model.input_shape)
+        return [model.labels[index] for index in model.predict(batch).argmax(axis=1)]
+    return classify
+
+
+# --- SERVIZIO ---
+class IngestService:
+    """
+    Servizio di acquisizione: handle_connection() per ogni sensore connesso, un task di
+    pre-processing per sensore e un task che forma i batch per classify.
+    classify(sensor, finestre (N, righe, colonne)) -> etichette (o None), chiamata in un thread;
+    i batch contengono finestre di un solo tipo di sensore. Le finestre sono emesse ogni
+    config.hop frame (predefinito: config.max_height, senza sovrapposizione), come in replay.py.
+    Gli stream con un record per antenna sono riallineati con config.alignment ("pad", o "trim"
+    anche con "strict": i frame arrivano uno alla volta) aspettando al massimo max_skew frame.
+    """
+
+    def __init__(self, config, classify=None, batch_size=DEFAULT_BATCH_SIZE, max_wait_s=DEFAULT_MAX_WAIT_S,
+                 sensor_queue=DEFAULT_SENSOR_QUEUE, window_queue=DEFAULT_WINDOW_QUEUE, max_skew=DEFAULT_MAX_SKEW):
+        if batch_size < 1 or sensor_queue < 1 or window_queue < 1 or max_wait_s < 0 or max_skew < 0:
+            raise ValueError("batch size and queue sizes must be positive, max wait and max skew non-negative")
+        # Verifica subito che la configurazione sia utilizzabile in streaming
+        StreamingPreprocessor.from_config(config, config.hop)
+        self.config = config
+        self.classify = classify
+        self.batch_size = batch_size
+        self.max_wait_s = max_wait_s
+        self.sensor_queue = sensor_queue
+        self.max_skew = max_skew
+        self.windows = asyncio.Queue(maxsize=window_queue)
+        self.streams = {}
+        self.stats = IngestStats()
+        # Task delle connessioni: tutti, e quelli che stanno ancora leggendo (interrotti da close())
+        self._tasks = set()
+        self._reading = set()
+        self._batcher = None
+        self._servers = []
+
+    async def start(self, address):
+        """Accetta connessioni su address (vedi parse_address); il batcher parte alla prima chiamata."""
+        if self._batcher is None:
+            self._batcher = asyncio.create_task(self._batch_windows())
+        if address[0] == "unix":
+            server = await asyncio.start_unix_server(self.handle_connection, address[1])
+        else:
+            server = await asyncio.start_server(self.handle_connection, address[1], address[2])
+        self._servers.append(server)
+        return server
+
+    async def close(self, timeout=0.0):
+        """
+        Smette di accettare connessioni, chiude quelle aperte ed elabora i frame e le finestre rimasti.
+        timeout: secondi concessi alle connessioni aperte per terminare da sole (None = senza limite).
+        """
+        for server in self._servers:
+            server.close()
+        if self._reading and timeout != 0:
+            await asyncio.wait(list(self._reading), timeout=timeout)
+        for task in list(self._reading):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._batcher is not None:
+            await self.windows.put(_STOP)
+            await self._batcher
+
+    async def _put(self, target, item):
+        """put() su una coda limitata, misurando l'attesa quando è piena (backpressure)."""
+        if target.full():
+            start = time.perf_counter()
+            await target.put(item)
+            self.stats.backpressure_s += time.perf_counter() - start
+        else:
+            target.put_nowait(item)
+
+    def _open_stream(self, hello):
+        sensor_id = str(hello.get("sensor_id", ""))
+        sensor = hello.get("sensor", self.config.sensor)
+        antennas = list(hello.get("antennas", self.config.antennas))
+        if not sensor_id:
+            raise ValueError("Missing sensor_id")
+        if sensor_id in self.streams:
+            raise ValueError(f"Sensor '{sensor_id}' is already connected")
+        if sensor not in CAPTURE_FORMATS:
+            raise ValueError(f"Unknown sensor '{sensor}', expected one of {sorted(CAPTURE_FORMATS)}")
+        missing = [rx_key for rx_key in self.config.antennas if rx_key not in antennas]
+        if missing:
+            raise ValueError(f"Sensor '{sensor_id}' does not send antennas {missing}")
+        config = dataclasses.replace(self.config, sensor=sensor)
+        preprocessor = StreamingPreprocessor.from_config(config, config.hop)
+        indices = [antennas.index(rx_key) for rx_key in self.config.antennas]
+        per_antenna = bool(hello.get("per_antenna", False))
+        aligner = None
+        if per_antenna:
+            mode = "pad" if self.config.alignment == "pad" else "trim"
+            aligner = AntennaAligner(self.config.antennas, mode, self.max_skew)
+        stream = SensorStream(sensor_id, sensor, preprocessor, indices, self.sensor_queue, aligner)
+        self.streams[sensor_id] = stream
+        return stream, record_layout(sensor, len(antennas), per_antenna)
+
+    async def handle_connection(self, reader, writer):
+        """Task di una connessione: presentazione, poi un record per frame fino alla chiusura."""
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        self._reading.add(task)
+        stream = worker = None
+        try:
+            try:
+                hello = json.loads(await reader.readuntil(b"\n"))
+                stream, (shape, dtype, record_size) = self._open_stream(hello)
+            except (ValueError, TypeError, AttributeError, asyncio.LimitOverrunError, asyncio.IncompleteReadError) as e:
+                self.stats.rejected += 1
+                writer.write(json.dumps({"error": str(e) or type(e).__name__}).encode() + b"\n")
+                await writer.drain()
+                return
+            self.stats.connections += 1
+            writer.write(b'{"ok": true}\n')
+            await writer.drain()
+            worker = asyncio.create_task(self._process_stream(stream))
+            frame_shape = (-1,) + shape
+            n_antennas = len(hello.get("antennas", self.config.antennas))
+            while True:
+                try:
+                    record = await reader.readexactly(record_size)
+                except asyncio.IncompleteReadError:
+                    break
+                if stream.aligner is None:
+                    sequence, timestamp = RECORD_HEADER.unpack_from(record)
+                    # Frame delle antenne come viste sul record ricevuto, senza copie
+                    frames = np.frombuffer(record, dtype=dtype, offset=RECORD_HEADER.size).reshape(frame_shape)
+                    await self._put(stream.frames, (sequence, timestamp, frames))
+                    continue
+                sequence, timestamp, position = ANTENNA_RECORD_HEADER.unpack_from(record)
+                if position >= n_antennas:
+                    self.stats.errors.append(f"sensor '{stream.sensor_id}' sent antenna {position}, "
+                                             f"expected fewer than {n_antennas}: connection closed")
+                    break
+                frame = np.frombuffer(record, dtype=dtype, offset=ANTENNA_RECORD_HEADER.size).reshape(shape)
+                await self._put(stream.frames, (sequence, timestamp, position, frame))
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            # I frame già ricevuti sono elaborati anche alla chiusura del servizio
+            self._reading.discard(task)
+            if worker is not None:
+                await stream.frames.put(_STOP)
+                await worker
+            if stream is not None:
+                del self.streams[stream.sensor_id]
+            writer.close()
+            self._tasks.discard(task)
+
+    async def _process_stream(self, stream):
+        """Task di un sensore: pre-processing in streaming dei suoi frame, finestre pronte al batcher."""
+        aligner = stream.aligner
+        timestamp = time.time()
+        while True:
+            item = await stream.frames.get()
+            if item is _STOP:
+                break
+            if aligner is None:
+                sequence, timestamp, frames = item
+                await self._push_frame(stream, sequence, timestamp, [frames[index] for index in stream.antenna_indices])
+                continue
+            sequence, timestamp, position, frame = item
+            # Le antenne inviate ma non usate dal pre-processing sono ignorate
+            if position in stream.antenna_indices:
+                for index, frames in aligner.push(stream.antenna_indices.index(position), frame, index=sequence):
+                    await self._push_frame(stream, index, timestamp, frames)
+        if aligner is not None:
+            for index, frames in aligner.flush():
+                await self._push_frame(stream, index, timestamp, frames)
+            self.stats.antenna_frames_dropped += aligner.dropped
+            self.stats.antenna_frames_padded += aligner.padded
+            self.stats.antenna_frames_late += aligner.late
+
+    async def _push_frame(self, stream, sequence, timestamp, frames):
+        """Un frame allineato (uno per antenna del pre-processing) nel preprocessore del sensore."""
+        preprocessor = stream.preprocessor
+        if stream.last_sequence is not None and sequence != stream.last_sequence + 1:
+            # Frame persi a monte: la finestra non sarebbe continua, si ricomincia
+            stream.gaps += 1
+            self.stats.gaps += 1
+            preprocessor.reset()
+        stream.last_sequence = sequence
+        stream.frames_received += 1
+        self.stats.frames += 1
+        window = preprocessor.push(frames)
+        if window is not None:
+            stream.windows += 1
+            self.stats.windows += 1
+            # Il buffer di uscita del preprocessore è riscritto alla finestra successiva
+            await self._put(self.windows, (stream.sensor, stream.sensor_id, timestamp, window.copy()))
+
+    async def _batch_windows(self):
+        """Task batcher: batch di batch_size finestre per tipo di sensore, o dopo max_wait_s dalla prima."""
+        loop = asyncio.get_running_loop()
+        # {sensor: (istante della prima finestra, finestre)}
+        pending = {}
+        while True:
+            timeout = None
+            if pending:
+                first = min(started for started, _ in pending.values())
+                timeout = max(0.0, first + self.max_wait_s - loop.time())
+            try:
+                item = await asyncio.wait_for(self.windows.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+            if item is _STOP:
+                for sensor, (_, items) in pending.items():
+                    await self._run_batch(sensor, items)
+                return
+            if item is not None:
+                _, items = pending.setdefault(item[0], (loop.time(), []))
+                items.append(item)
+                if len(items) == self.batch_size:
+                    del pending[item[0]]
+                    await self._run_batch(item[0], items)
+            now = loop.time()
+            for sensor, (started, items) in list(pending.items()):
+                if now - started >= self.max_wait_s:
+                    del pending[sensor]
+                    await self._run_batch(sensor, items)
+
+    async def _run_batch(self, sensor, items):
+        windows = np.stack([item[3] for item in items])
+        labels = None
+        if self.classify is not None:
+            try:
+                labels = await asyncio.get_running_loop().run_in_executor(None, self.classify, sensor, windows)
+            except Exception as e:
+                self.stats.errors.append(f"classifier failed on a batch of {len(items)} {sensor} windows: {e}")
+        done = time.time()
+        self.stats.batches += 1
+        self.stats.batch_sizes.append(len(items))
+        self.stats.latencies += [(done - item[2]) * 1e9 for item in items]
+        if labels is not None:
+            self.stats.predictions.update(labels)
+
+
+# --- SENSORI SIMULATI ---
+async def send_stream(address, sensor_id, sensor, antennas, source, n_frames, rate=FRAME_RATE_HZ,
+                      per_antenna=False, skew=0):
+    """
+    Sensore simulato: si presenta e invia n_frames frame di source (VirtualSensor) a rate frame/s
+    (0 = senza pause). Restituisce il ritardo massimo (s) rispetto al ritmo previsto, dovuto anche
+    alla backpressure del servizio (drain() attende che il servizio legga).
+    Con per_antenna invia un record per antenna, e il frame della k-esima antenna k * skew frame
+    dopo quello della prima (antenne sfasate, da riallineare nel servizio).
+    """
+    reader, writer = await open_connection(address)
+    try:
+        hello = {"sensor_id": sensor_id, "sensor": sensor, "antennas": list(antennas)}
+        if per_antenna:
+            hello["per_antenna"] = True
+        writer.write(json.dumps(hello).encode() + b"\n")
+        await writer.drain()
+        reply = json.loads(await reader.readline() or b"{}")
+        if not reply.get("ok"):
+            raise ValueError(f"Sensor '{sensor_id}' rejected: {reply.get('error', 'connection closed')}")
+        _, dtype, _ = record_layout(sensor, len(antennas))
+        last = len(antennas) - 1
+        pending = {}
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        lag = 0.0
+        for step in range(n_frames + (last * skew if per_antenna else 0)):
+            if rate:
+                delay = start + step / rate - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    lag = max(lag, -delay)
+            if not per_antenna:
+                _, frames = source.next_frame()
+                writer.write(encode_record(step, time.time(), frames, dtype))
+            else:
+                if step < n_frames:
+                    pending[step] = (time.time(), source.next_frame()[1])
+                for position in range(last + 1):
+                    sequence = step - position * skew
+                    if sequence in pending:
+                        timestamp, frames = pending[sequence]
+                        writer.write(encode_antenna_record(sequence, timestamp, position, frames[position], dtype))
+                pending.pop(step - last * skew, None)
+            await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return lag
+
+
+async def simulate_sensors(address, dataset_paths, n_sensors, n_frames, rate=FRAME_RATE_HZ, antennas=("rx0", "rx1", "rx2"),
+                           seed=0, per_antenna=False, skew=0):
+    """
+    n_sensors sensori simulati che riproducono le acquisizioni dei dataset (a turno, es. uno
+    Infineon e uno SR250Mate). Restituisce il ritardo massimo dei sensori rispetto al ritmo previsto.
+    """
+    sources = [(dataset_sensor(path), ReplaySource(path, antennas))
+               for path in dataset_paths]
+    streams = []
+    for sensor_id in range(n_sensors):
+        sensor, source = sources[sensor_id % len(sources)]
+        streams.append(send_stream(address, f"{sensor}-{sensor_id:03d}", sensor, antennas,
+                                   VirtualSensor(sensor_id, source, seed), n_frames, rate, per_antenna, skew))
+    return max(await asyncio.gather(*streams))
+
+
+# --- RIGA DI COMANDO ---
+def add_service_arguments(parser):
+    """Opzioni del servizio di acquisizione (batch, code, modello)."""
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Windows per classifier call.")
+    parser.add_argument("--max-wait", type=float, default=DEFAULT_MAX_WAIT_S,
+                        help="Seconds an incomplete batch waits for more windows.")
+    parser.add_argument("--sensor-queue", type=int, default=DEFAULT_SENSOR_QUEUE,
+                        help="Frames buffered per sensor before the connection stops being read (backpressure).")
+    parser.add_argument("--window-queue", type=int, default=DEFAULT_WINDOW_QUEUE,
+                        help="Windows waiting for the classifier before the sensors are slowed down.")
+    parser.add_argument("--max-skew", type=int, default=DEFAULT_MAX_SKEW,
+                        help="Frames a per-antenna stream waits for a late antenna before trimming or padding.")
+    parser.add_argument("--model", help="Classify the windows with a .tflite, .onnx or .npz model (see inference.py).")
+    add_config_arguments(parser, PipelineConfig(normalization="log"))
+
+
+def add_simulation_arguments(parser):
+    """Opzioni dei sensori simulati."""
+    parser.add_argument("--dataset", nargs="+", required=True,
+                        help="Dataset folders replayed by the simulated sensors (Infineon and/or SR250Mate).")
+    parser.add_argument("--sensors", type=int, default=8, help="Simulated sensors.")
+    parser.add_argument("--frames", type=int, default=500, help="Frames sent by each sensor.")
+    parser.add_argument("--rate", type=float, default=FRAME_RATE_HZ,
+                        help="Frames per second of each sensor (0 = as fast as the service accepts them).")
+    parser.add_argument("--per-antenna", action="store_true", help="Send one record per antenna frame.")
+    parser.add_argument("--skew", type=int, default=0,
+                        help="With --per-antenna, frames by which each antenna lags the previous one.")
+
+
+def _service_from_args(args):
+    config = config_from_args(args)
+    classify = None
+    if args.model:
+        # Importato solo se serve un modello
+        from .inference import load_model
+        classify = model_classifier(load_model(args.model))
+    return IngestService(config, classify, args.batch_size, args.max_wait, args.sensor_queue, args.window_queue,
+                         args.max_skew)
+
+
+async def _serve(service, address, duration):
+    server = await service.start(address)
+    print(f"Listening on {':'.join(str(part) for part in address[1:]) if address[0] == 'tcp' else address[1]}")
+    try:
+        if duration:
+            await asyncio.sleep(duration)
+        else:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+async def _demo(service, args):
+    with tempfile.TemporaryDirectory() as folder:
+        address = ("unix", os.path.join(folder, "ingest.sock"))
+        await service.start(address)
+        start = time.perf_counter()
+        try:
+            lag = await simulate_sensors(address, args.dataset, args.sensors, args.frames, args.rate,
+                                         per_antenna=args.per_antenna, skew=args.skew)
+        finally:
+            # I sensori hanno chiuso le connessioni: il servizio legge i frame rimasti
+            await service.close(timeout=None)
+        elapsed = time.perf_counter() - start
+    print(f"{args.sensors} sensors x {args.frames} frames in {elapsed:.3f} s "
+          f"({args.sensors * args.frames / elapsed:.0f} frames/s), max sensor lag: {1e3 * lag:.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Asyncio ingestion service: frame streams from many radars over TCP or Unix sockets, "
+                    "per-sensor streaming preprocessing and batched classification with bounded queues.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Accept sensor connections and preprocess their streams.")
+    serve.add_argument("--listen", default="127.0.0.1:8765", help="HOST:PORT or unix:PATH.")
+    serve.add_argument("--duration", type=float, default=None, help="Stop after this many seconds.")
+    serve.add_argument("--report", metavar="PATH", help="Write the service statistics as JSON.")
+    add_service_arguments(serve)
+
+    send = commands.add_parser("send", help="Stand-in sensors replaying recorded captures to a running service.")
+    send.add_argument("--connect", default="127.0.0.1:8765", help="HOST:PORT or unix:PATH.")
+    add_simulation_arguments(send)
+
+    demo = commands.add_parser("demo", help="Service and stand-in sensors in one process, on a temporary Unix socket.")
+    demo.add_argument("--report", metavar="PATH", help="Write the service statistics as JSON.")
+    add_simulation_arguments(demo)
+    add_service_arguments(demo)
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "send":
+            lag = asyncio.run(simulate_sensors(parse_address(args.connect), args.dataset, args.sensors, args.frames,
+                                               args.rate, per_antenna=args.per_antenna, skew=args.skew))
+            print(f"Sent {args.sensors} x {args.frames} frames, max sensor lag: {1e3 * lag:.3f} ms")
+            return lag
+        service = _service_from_args(args)
+        address = parse_address(args.listen) if args.command == "serve" else None
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+
+    try:
+        asyncio.run(_serve(service, address, args.duration) if address else _demo(service, args))
+    except KeyboardInterrupt:
+        pass
+    print(service.stats.format_summary())
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"params": service.config.build_params(), **service.stats.summary()}, f, indent=1)
+        print(f"Report written to {args.report}")
+    return service.stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+SUMMARY_VERSION = 1
+
+# --- FASI MISURATE ---
+# scan: indice della cartella; gate: scelta dei range bins (range gating, vedi gating.py);
+# manifest: preparazione della cartella di output e firme dei sorgenti; load: np.load in
+# memory-map e selezione della fetta; magnitude: np.abs (include la lettura dal disco delle
+# pagine del memory-map); clutter: rimozione del clutter; doppler: spettrogrammi micro-Doppler
+# (STFT, vedi doppler.py); merge, normalize, pad; encode: livelli di grigio + PNG; write: scrittura del file
+STAGES = (
+    "scan", "gate", "manifest", "load", "magnitude", "clutter", "doppler", "merge", "normalize", "pad", "encode",
+    "write",
+)
+
+# --- MOTIVI PER CUI UN GRUPPO NON PRODUCE IMMAGINI ---
+SKIP_NO_LABEL = "no_label"
+SKIP_MISSING_RX = "missing_rx"
+SKIP_HEIGHT_MISMATCH = "height_mismatch"
+SKIP_WIDTH_MISMATCH = "width_mismatch"
+SKIP_LOAD_ERROR = "load_error"
+SKIP_UNHANDLED = "unhandled_error"
+
+
+def add_instrumentation_arguments(parser):
+    """Aggiunge al parser le opzioni di misura delle prestazioni."""
+    parser.add_argument(
+        "--stats", nargs="?", const="", default=None, metavar="PATH",
+        help="Record per-stage wall/CPU time, bytes read and written and skip reasons, and print them at the end; "
+             "with PATH also write the summary as JSON ('-' = standard output).",
+    )
+    parser.add_argument(
+        "--profile", nargs="?", const="", default=None, metavar="PATH",
+        help="Run under cProfile and print the slowest functions; with PATH also save the pstats file "
+             "(main process only).",
+    )
+
+
+class _StageTimer:
+    """Misura tempo reale e tempo di CPU di un blocco with e li aggiunge alla fase."""
+    __slots__ = ("recorder", "name", "wall", "cpu")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self.recorder.add_stage(self.name, wall, cpu)
+
+
+class StageRecorder:
+    """
+    Registro delle misure di un'esecuzione:
+    - per fase: numero di chiamate, tempo reale e tempo di CPU (vedi STAGES)
+    - contatori: bytes_read (dimensione dei file .npy aperti), bytes_written (PNG), images...
+    - skipped: gruppi (per testa) senza immagini, per motivo (SKIP_*)
+    trace, se indicato, è chiamato alla fine di ogni fase con (nome, secondi reali, secondi di CPU).
+    """
+    enabled = True
+
+    def __init__(self, trace=None):
+        self.trace = trace
+        self.stages = {}
+        self.counters = Counter()
+        self.skipped = Counter()
+        self.started = time.perf_counter()
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+    def add_stage(self, name, wall, cpu, calls=1):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = [0, 0.0, 0.0]
+        entry[0] += calls
+        entry[1] += wall
+        entry[2] += cpu
+        if self.trace is not None:
+            self.trace(name, wall, cpu)
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def skip(self, reason):
+        self.skipped[reason] += 1
+
+    def snapshot(self):
+        """Misure in forma serializzabile, da restituire da un processo del pool."""
+        return {"stages": self.stages, "counters": dict(self.counters), "skipped": dict(self.skipped)}
+
+    def merge(self, snapshot):
+        """Aggiunge le misure di un altro registro (es. di un processo del pool)."""
+        for name, (calls, wall, cpu) in snapshot["stages"].items():
+            entry = self.stages.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += calls
+            entry[1] += wall
+            entry[2] += cpu
+        self.counters.update(snapshot["counters"])
+        self.skipped.update(snapshot["skipped"])
+
+    def summary(self):
+        """Riepilogo leggibile da programmi (JSON): fasi nell'ordine della pipeline."""
+        order = [name for name in STAGES if name in self.stages] + sorted(set(self.stages) - set(STAGES))
+        return {
+            "version": SUMMARY_VERSION,
+            "wall_s": time.perf_counter() - self.started,
+            "stages": {
+                name: {"calls": self.stages[name][0], "wall_s": self.stages[name][1], "cpu_s": self.stages[name][2]}
+                for name in order
+            },
+            "counters": dict(self.counters),
+            "skipped": dict(self.skipped),
+        }
+
+    def format_summary(self):
+        """Tabella delle fasi e dei contatori per la console."""
+        summary = self.summary()
+        lines = [f"{'stage':<10} {'calls':>8} {'wall s':>9} {'cpu s':>9} {'wall %':>7}"]
+        total = summary["wall_s"] or 1.0
+        for name, values in summary["stages"].items():
+            lines.append(f"{name:<10} {values['calls']:>8} {values['wall_s']:>9.3f} {values['cpu_s']:>9.3f} "
+                         f"{100 * values['wall_s'] / total:>6.1f}%")
+        lines.append(f"total wall time: {summary['wall_s']:.3f} s")
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(f"{name}: {value}")
+        if summary["skipped"]:
+            lines.append("skipped: " + ", ".join(f"{reason}={n}" for reason, n in sorted(summary["skipped"].items())))
+        return "\n".join(lines)
+
+
+class NullRecorder:
+    """
+    Registro disattivato (predefinito): ogni misura è una chiamata che non fa nulla,
+    stage() restituisce sempre lo stesso contesto vuoto. Nessun orologio viene letto.
+    """
+    enabled = False
+    _context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+    def count(self, name, value=1):
+        pass
+
+    def skip(self, reason):
+        pass
+
+
+NULL_RECORDER = NullRecorder()
+_current = NULL_RECORDER
+
+
+def get_recorder():
+    """Registro attivo nel processo (NULL_RECORDER se la strumentazione è disattivata)."""
+    return _current
+
+
+@contextmanager
+def recording(recorder):
+    """Attiva recorder per la durata del blocco with e poi ripristina il precedente."""
+    global _current
+    previous = _current
+    _current = recorder
+    try:
+        yield recorder
+    finally:
+        _current = previous
+
+
+@contextmanager
+def profiling(output_path=None, top=20):
+    """
+    Esegue il blocco sotto cProfile. Con output_path le statistiche sono salvate
+    (leggibili con pstats o snakeviz); le top funzioni per tempo cumulativo sono stampate.
+    Con più processi viene profilato solo il processo principale.
+    """
+    # Importati solo quando si profila, per non rallentare l'avvio delle esecuzioni normali
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if output_path:
+            profiler.dump_stats(output_path)
+            print(f"Profile written to {output_path}")
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(top)
+        print(stream.getvalue())
+
+
+def write_summary(summary, output_path):
+    """Scrive il riepilogo JSON ("-" = standard output)."""
+    text = json.dumps(summary, indent=1)
+    if output_path == "-":
+        print(text)
+        return
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    print(f"Run summary written to {output_path}")
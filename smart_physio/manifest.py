@@ -0,0 +1,191 @@
+import json
+import os
+
+MANIFEST_VERSION = 1
+# Il manifest sta accanto alla cartella di output (es. Photos.manifest.json),
+# così la cartella delle immagini da caricare su Edge Impulse resta pulita
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def add_incremental_arguments(parser):
+    """Aggiunge al parser le opzioni della ricostruzione incrementale."""
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Rebuild only groups whose source files or parameters changed instead of wiping the output folder.",
+    )
+    parser.add_argument(
+        "--hash-sources", action="store_true",
+        help="With --incremental, compare source files by content hash instead of size and mtime.",
+    )
+
+
+def manifest_path_for(output_path):
+    """Percorso del manifest associato a una cartella di output."""
+    output_path = os.path.normpath(output_path)
+    return output_path + MANIFEST_SUFFIX
+
+
+def file_signature(file_path, use_hash=False):
+    """
+    Firma di un file sorgente: [dimensione, mtime in ns] oppure [dimensione, sha1 del contenuto].
+    """
+    stat = os.stat(file_path)
+    if not use_hash:
+        return [stat.st_size, stat.st_mtime_ns]
+    import hashlib  # solo con --hash-sources
+
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return [stat.st_size, digest.hexdigest()]
+
+
+class BuildManifest:
+    """
+    Registro delle immagini già generate in una cartella di output.
+    Per ogni gruppo di acquisizione memorizza la firma dei file sorgente e i file prodotti;
+    per l'intera cartella memorizza i parametri della pipeline (altezza, larghezza, bins,
+    normalizzazione...). Un gruppo va ricostruito solo se cambia uno dei due.
+    """
+
+    def __init__(self, output_path, params, use_hash=False):
+        self.output_path = output_path
+        self.path = manifest_path_for(output_path)
+        self.params = params
+        self.use_hash = use_hash
+        self.groups = {}
+
+    @classmethod
+    def load(cls, output_path, params, use_hash=False):
+        """
+        Legge il manifest esistente. Se manca, è illeggibile o i parametri sono cambiati,
+        il registro parte vuoto e tutti i gruppi verranno ricostruiti.
+        """
+        manifest = cls(output_path, params, use_hash)
+        try:
+            with open(manifest.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+
+        if (stored.get("version") == MANIFEST_VERSION
+                and stored.get("params") == params
+                and stored.get("use_hash", False) == use_hash):
+            manifest.groups = stored.get("groups", {})
+        else:
+            # Parametri diversi: le vecchie immagini restano registrate solo per poterle rimuovere
+            manifest.groups = {
+                name: {"sources": None, "outputs": entry.get("outputs", [])}
+                for name, entry in stored.get("groups", {}).items()
+            }
+        return manifest
+
+    def group_signature(self, base_path, files_info, rx_keys, cache=None):
+        """
+        Firma dei file sorgente di un gruppo per le antenne usate dallo script.
+        cache ({nome file: firma}) evita di ricalcolare la firma di un file condiviso da più manifest.
+        """
+        signature = {}
+        for rx_key in rx_keys:
+            file_name = files_info.get(rx_key)
+            if file_name:
+                if cache is None or file_name not in cache:
+                    file_sig = file_signature(os.path.join(base_path, file_name), self.use_hash)
+                    if cache is not None:
+                        cache[file_name] = file_sig
+                else:
+                    file_sig = cache[file_name]
+                signature[rx_key] = [file_name] + file_sig
+            else:
+                signature[rx_key] = None
+        return signature
+
+    def group_signatures(self, base_path, file_groups, rx_keys, cache=None, bin_ranges=None):
+        """
+        Firme di tutti i gruppi: {base_name: firma}.
+        bin_ranges ({base_name: (start, stop)}, dal range gating) entra nella firma:
+        se la finestra di un gruppo si sposta, le sue immagini vengono rigenerate.
+        """
+        signatures = {
+            base_name: self.group_signature(base_path, files_info, rx_keys, cache)
+            for base_name, files_info in file_groups.items()
+        }
+        if bin_ranges is not None:
+            for base_name, signature in signatures.items():
+                bins = bin_ranges.get(base_name)
+                signature["bins"] = list(bins) if bins else None
+        return signatures
+
+    def is_up_to_date(self, base_name, signature):
+        """Vero se il gruppo è già stato generato con questi sorgenti e le sue immagini esistono."""
+        entry = self.groups.get(base_name)
+        if entry is None or entry.get("sources") != signature:
+            return False
+        return all(os.path.exists(os.path.join(self.output_path, name)) for name in entry["outputs"])
+
+    def _remove_outputs(self, base_name):
+        entry = self.groups.pop(base_name, None)
+        if not entry:
+            return 0
+        removed = 0
+        for name in entry.get("outputs", []):
+            output_file = os.path.join(self.output_path, name)
+            if os.path.exists(output_file):
+                os.remove(output_file)
+                removed += 1
+        return removed
+
+    def invalidate(self, base_names):
+        """Rimuove le immagini dei gruppi da ricostruire, così un errore non lascia file obsoleti."""
+        return sum(self._remove_outputs(base_name) for base_name in base_names)
+
+    def prune(self, current_base_names):
+        """Rimuove le immagini dei gruppi che non esistono più nel dataset."""
+        current_base_names = set(current_base_names)
+        stale = [name for name in self.groups if name not in current_base_names]
+        return sum(self._remove_outputs(name) for name in stale)
+
+    def record(self, base_name, signature, output_files, skipped=False):
+        """
+        Registra un gruppo generato con successo o, con skipped, scartato perché incompleto
+        (antenna o etichetta mancante): finché i sorgenti non cambiano non viene riesaminato.
+        """
+        entry = {
+            "sources": signature,
+            "outputs": [os.path.basename(path) for path in output_files],
+        }
+        if skipped:
+            entry["status"] = "skipped"
+        self.groups[base_name] = entry
+
+    def save(self):
+        """Scrive il manifest in modo atomico (file temporaneo + os.replace)."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "params": self.params,
+                "use_hash": self.use_hash,
+                "groups": self.groups,
+            }, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def plan_incremental_build(manifest, base_path, file_groups, rx_keys, cache=None, bin_ranges=None):
+    """
+    Confronta il dataset con il manifest: rimuove le immagini dei gruppi eliminati e di quelli
+    da ricostruire, e restituisce (firme di tutti i gruppi, gruppi da ricostruire).
+    """
+    signatures = manifest.group_signatures(base_path, file_groups, rx_keys, cache, bin_ranges)
+    pruned = manifest.prune(signatures)
+    if pruned:
+        print(f"Removed {pruned} stale images of deleted acquisitions.")
+
+    groups_to_build = {
+        base_name: files_info
+        for base_name, files_info in file_groups.items()
+        if not manifest.is_up_to_date(base_name, signatures[base_name])
+    }
+    manifest.invalidate(groups_to_build)
+    return signatures, groups_to_build
@@ -0,0 +1,57 @@
+import os
+
+# Esiti possibili dell'elaborazione di un gruppo di acquisizione
+GROUP_GENERATED = "generated"  # immagine salvata
+GROUP_SKIPPED = "skipped"      # gruppo incompleto (RX mancante o etichetta assente)
+GROUP_ERROR = "error"          # errore di caricamento, altezze o larghezza non coerenti
+
+# Numero di blocchi per processo: abbastanza piccoli da bilanciare il carico,
+# abbastanza grandi da ammortizzare il costo dell'invio dei task al pool
+CHUNKS_PER_WORKER = 4
+
+
+def add_workers_argument(parser):
+    """Aggiunge al parser le opzioni --workers e --chunksize condivise da tutti gli script."""
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Number of worker processes (1 = serial, 0 = one per CPU core).",
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=None,
+        help="Groups sent to a worker per task (default: groups / (workers * 4)).",
+    )
+
+
+def resolve_workers(workers):
+    """Converte il valore di --workers nel numero effettivo di processi (0 = tutti i core)."""
+    if workers is None or workers < 0:
+        raise ValueError(f"Invalid number of workers: {workers}")
+    if workers == 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def map_groups(process_group, groups, workers=1, chunksize=None):
+    """
+    Applica process_group a ogni gruppo e restituisce (gruppo, esito) nell'ordine dei gruppi.
+    Con workers > 1 i gruppi sono distribuiti su un pool di processi a blocchi di chunksize:
+    process_group deve essere una funzione definita a livello di modulo (serializzabile)
+    e lo script deve avviare l'elaborazione solo sotto if __name__ == "__main__".
+    """
+    groups = list(groups)
+    workers = resolve_workers(workers)
+
+    if workers == 1 or len(groups) <= 1:
+        for group in groups:
+            yield group, process_group(group)
+        return
+
+    if chunksize is None:
+        chunksize = max(1, len(groups) // (workers * CHUNKS_PER_WORKER))
+
+    # Importato solo quando serve: concurrent.futures e multiprocessing rallentano l'avvio
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from zip(groups, pool.map(process_group, groups, chunksize=chunksize))
+
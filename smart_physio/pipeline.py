@@ -0,0 +1,815 @@
+import os
+import shutil
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Optional
+
+import numpy as np
+
+from .alignment import aligned_height, check_alignment, merge_aligned
+from .batch import apply_normalization_batch, load_capture_batch
+from .capture_io import DEFAULT_BIN_RANGE, DEFAULT_CHANNEL, check_channel_fusion, load_capture_magnitude
+from .clutter import DEFAULT_CLUTTER_ALPHA, check_clutter
+from .dataset import RX_KEYS, group_dataset_files
+from .doppler import DEFAULT_DOPPLER_WINDOW, DOPPLER_FUSIONS, antenna_spectrograms, check_feature, load_capture_signal
+from .gating import RANGE_GATES, RangeGateCache, resolve_range_gates
+from .image_io import quantize_to_gray, save_grayscale_png
+from .instrumentation import (
+    SKIP_HEIGHT_MISMATCH, SKIP_LOAD_ERROR, SKIP_MISSING_RX, SKIP_NO_LABEL, SKIP_UNHANDLED, SKIP_WIDTH_MISMATCH,
+    StageRecorder, get_recorder, recording,
+)
+from .manifest import BuildManifest, plan_incremental_build
+from .parallel import GROUP_ERROR, GROUP_GENERATED, GROUP_SKIPPED, map_groups, resolve_workers
+from .transforms import (
+    NORMALIZATIONS, TransformWorkspace, apply_normalization, apply_normalization_in_place, check_backend,
+    merge_antennas, pad_to_height,
+)
+from .windowing import TAIL_POLICIES, check_window, iter_windows
+
+# Altezza MASSIMA delle immagini in righe (corrisponde a 5 secondi di dati)
+MAX_IMAGE_HEIGHT = 125
+
+
+@dataclass(frozen=True)
+class SensorSpec:
+    """Caratteristiche di un sensore radar rilevanti per il pre-processing."""
+    name: str
+    # Suffisso nei nomi delle immagini per Edge Impulse (es. ..._Infineon_part1.png)
+    output_tag: str
+    # Canale interno usato quando le acquisizioni sono 3D (frames, canali, range_bins)
+    channel: int = DEFAULT_CHANNEL
+
+
+SENSORS = {
+    # Infineon: float32 (frames, 4, 128)
+    "infineon": SensorSpec("infineon", "Infineon"),
+    # SR250Mate: complex64 (frames, 120)
+    "sr250mate": SensorSpec("sr250mate", "sr250"),
+}
+
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    """
+    Parametri di una variante del dataset di immagini:
+    - sensor: "infineon" o "sr250mate"
+    - antennas: antenne affiancate da sinistra a destra, es. ("rx0", "rx1") -> 80 colonne
+    - bin_range: range bins usati per ogni antenna, (0, 40) = soggetto a circa 1 metro
+    - range_gate: "fixed" usa sempre bin_range; "capture" o "session" centrano una finestra
+      larga quanto bin_range sui bins con più movimento (vedi gating.RANGE_GATES)
+    - channel_fusion: "single" usa solo il canale interno del sensore; "coherent", "incoherent"
+      o "max" combinano tutti i canali delle acquisizioni 3D (vedi capture_io.CHANNEL_FUSIONS)
+    - clutter, clutter_alpha: rimozione dei riflessi statici tra magnitudine e normalizzazione
+      (vedi clutter.CLUTTER_REMOVALS)
+    - feature: "range_time" (magnitudine) o "doppler" (spettrogramma micro-Doppler con una
+      finestra STFT di doppler_window frame, vedi doppler.FEATURES); stessa dimensione delle immagini
+    - alignment: antenne con un numero di frame diverso: "strict" scarta il gruppo, "trim" usa i
+      frame comuni, "pad" completa le più corte con zeri (vedi alignment.ALIGNMENTS)
+    - max_height: righe massime per immagine (None = tutta l'acquisizione)
+    - normalization: "none" (magnitudine) o "log" (log1p + normalizzazione 0-1)
+    - pad_height: completa con righe di zeri fino a max_height
+    - split_height: divide l'acquisizione in finestre di max_height righe invece di troncarla
+    - hop: con split_height, righe tra l'inizio di due finestre (None = finestre disgiunte)
+    - tail: con split_height, gestione delle righe finali (vedi windowing.TAIL_POLICIES)
+    - backend: implementazione della normalizzazione sul posto (vedi transforms.BACKENDS)
+    """
+    sensor: str = "infineon"
+    antennas: tuple = ("rx0", "rx1")
+    bin_range: tuple = DEFAULT_BIN_RANGE
+    max_height: Optional[int] = MAX_IMAGE_HEIGHT
+    normalization: str = "none"
+    pad_height: bool = False
+    split_height: bool = False
+    hop: Optional[int] = None
+    tail: str = "keep"
+    backend: str = "numpy"
+    range_gate: str = "fixed"
+    channel_fusion: str = "single"
+    clutter: str = "none"
+    clutter_alpha: float = DEFAULT_CLUTTER_ALPHA
+    feature: str = "range_time"
+    doppler_window: int = DEFAULT_DOPPLER_WINDOW
+    alignment: str = "strict"
+
+    def __post_init__(self):
+        # Tuple anche se la configurazione arriva da liste (CLI, JSON)
+        object.__setattr__(self, "antennas", tuple(self.antennas))
+        object.__setattr__(self, "bin_range", tuple(self.bin_range))
+
+        if self.sensor not in SENSORS:
+            raise ValueError(f"Unknown sensor '{self.sensor}', expected one of {sorted(SENSORS)}")
+        if not self.antennas or any(rx not in RX_KEYS for rx in self.antennas):
+            raise ValueError(f"Invalid antennas {self.antennas}, expected a subset of {RX_KEYS}")
+        start, stop = self.bin_range
+        if not 0 <= start < stop:
+            raise ValueError(f"Invalid bin range {self.bin_range}")
+        if self.normalization not in NORMALIZATIONS:
+            raise ValueError(f"Unknown normalization '{self.normalization}', expected one of {NORMALIZATIONS}")
+        if (self.pad_height or self.split_height) and not self.max_height:
+            raise ValueError("pad_height and split_height require max_height")
+        if self.tail not in TAIL_POLICIES:
+            raise ValueError(f"Unknown tail policy '{self.tail}', expected one of {TAIL_POLICIES}")
+        if self.split_height:
+            check_window(self.max_height, self.hop, self.tail)
+        check_backend(self.backend)
+        if self.range_gate not in RANGE_GATES:
+            raise ValueError(f"Unknown range gate '{self.range_gate}', expected one of {RANGE_GATES}")
+        check_channel_fusion(self.channel_fusion)
+        check_clutter(self.clutter, self.clutter_alpha)
+        check_feature(self.feature, self.doppler_window, stop - start)
+        check_alignment(self.alignment)
+        if self.feature == "doppler":
+            if self.channel_fusion not in DOPPLER_FUSIONS:
+                raise ValueError(f"Channel fusion '{self.channel_fusion}' is not available for Doppler features, "
+                                 f"expected one of {DOPPLER_FUSIONS}")
+            if self.clutter != "none":
+                raise ValueError("Clutter removal applies to range-time images; "
+                                 "Doppler features already remove the static component")
+
+    @property
+    def sensor_spec(self):
+        return SENSORS[self.sensor]
+
+    @property
+    def stft_window(self):
+        """Frame della finestra dello STFT con feature="doppler", None per le immagini range-tempo."""
+        return self.doppler_window if self.feature == "doppler" else None
+
+    @property
+    def image_width(self):
+        """Larghezza delle immagini: bins per antenna x numero di antenne."""
+        start, stop = self.bin_range
+        return (stop - start) * len(self.antennas)
+
+    def build_params(self):
+        """Parametri registrati nel manifest della build incrementale (serializzabili in JSON)."""
+        params = {
+            "sensor": self.sensor,
+            "antennas": list(self.antennas),
+            "bin_range": list(self.bin_range),
+            "channel": self.sensor_spec.channel,
+            "max_height": self.max_height,
+            "width": self.image_width,
+            "normalization": self.normalization,
+            "pad_height": self.pad_height,
+            "split_height": self.split_height,
+            "hop": self.hop,
+            "tail": self.tail,
+        }
+        # Registrato solo se diverso da "numpy", così i manifest esistenti restano validi
+        if self.backend != "numpy":
+            params["backend"] = self.backend
+        if self.range_gate != "fixed":
+            params["range_gate"] = self.range_gate
+        if self.channel_fusion != "single":
+            params["channel_fusion"] = self.channel_fusion
+        if self.clutter != "none":
+            params["clutter"] = self.clutter
+            params["clutter_alpha"] = self.clutter_alpha
+        if self.feature != "range_time":
+            params["feature"] = self.feature
+            params["doppler_window"] = self.doppler_window
+        if self.alignment != "strict":
+            params["alignment"] = self.alignment
+        return params
+
+    def capture_options(self):
+        """
+        Opzioni di load_capture_magnitude che cambiano la magnitudine caricata (canali e clutter):
+        teste con le stesse opzioni condividono la lettura di ogni antenna.
+        """
+        return {"fusion": self.channel_fusion, "clutter": self.clutter, "clutter_alpha": self.clutter_alpha}
+
+
+class GroupError(Exception):
+    """
+    Errore che impedisce di generare le immagini di un gruppo di acquisizione.
+    reason è il motivo registrato dalla strumentazione (instrumentation.SKIP_*).
+    """
+
+    def __init__(self, message, reason=SKIP_LOAD_ERROR):
+        super().__init__(message)
+        self.reason = reason
+
+
+@dataclass
+class PipelineResult:
+    """Esito di un'esecuzione: conteggio degli esiti dei gruppi e immagini generate."""
+    group_counts: Counter = field(default_factory=Counter)
+    generated_images: int = 0
+    groups_found: int = 0
+
+
+# --- FUNZIONE PER PULIRE LA CARTELLA DI OUTPUT ---
+def clean_output_folder(folder_path):
+    """
+    Rimuove il contenuto della cartella specificata e la ricrea.
+    ATTENZIONE: Questo cancellerà PERMANENTEMENTE il contenuto!
+    """
+    if os.path.exists(folder_path):
+        print(f"Cleaning existing output folder: {folder_path}")
+        shutil.rmtree(folder_path)
+    os.makedirs(folder_path, exist_ok=True) # Ricrea la cartella vuota
+
+
+def image_file_name(base_name, label, output_tag, part=1):
+    """
+    Nome di un'immagine per Edge Impulse, con la classe prima del punto:
+    es. right_arm_up.Alberto_Right_arm_up_Fisio_20250528-145949_Infineon_part1.png
+    """
+    output_file_name_clean = base_name.replace(' ', '_')
+    return f"{label}.{output_file_name_clean}_{output_tag}_part{part}.png"
+
+
+def group_output_path(config, output_path, base_name, label, part=1):
+    """Percorso di un'immagine di un gruppo nella cartella di output (vedi image_file_name)."""
+    return os.path.join(output_path, image_file_name(base_name, label, config.sensor_spec.output_tag, part))
+
+
+@dataclass(frozen=True)
+class OutputHead:
+    """Una variante del dataset (configurazione) e la cartella in cui salvarne le immagini."""
+    config: PipelineConfig
+    output_path: str
+    # Con il range gating: {base_name: (start, stop)} scelti per ogni gruppo (vedi gate_heads);
+    # i gruppi assenti usano config.bin_range
+    bin_ranges: Optional[dict] = None
+
+    def group_bin_range(self, base_name):
+        """Range bins usati per le immagini di un gruppo."""
+        if self.bin_ranges is None:
+            return self.config.bin_range
+        return self.bin_ranges.get(base_name, self.config.bin_range)
+
+
+def check_heads(heads):
+    """Verifica che le teste possano condividere la lettura dello stesso dataset."""
+    if not heads:
+        raise ValueError("At least one output head is required")
+    sensors = {head.config.sensor for head in heads}
+    if len(sensors) > 1:
+        raise ValueError(f"All output heads must use the same sensor, got {sorted(sensors)}")
+    output_paths = [os.path.normcase(os.path.abspath(head.output_path)) for head in heads]
+    if len(set(output_paths)) != len(output_paths):
+        raise ValueError("Each output head needs its own output folder")
+
+
+def covering_bin_range(configs):
+    """Il più piccolo intervallo di range bins che contiene quelli di tutte le configurazioni."""
+    return min(c.bin_range[0] for c in configs), max(c.bin_range[1] for c in configs)
+
+
+def gate_heads(heads, dataset_path, file_groups):
+    """
+    Sceglie i range bins di ogni gruppo per le teste con range gating ("capture" o "session")
+    e restituisce le teste con bin_ranges assegnato. I profili di energia sono letti dalla
+    cache <dataset>.gates.json (condivisa da tutte le teste) o calcolati e aggiunti a essa.
+    """
+    if all(head.config.range_gate == "fixed" for head in heads):
+        return heads
+    recorder = get_recorder()
+    cache = RangeGateCache(dataset_path)
+    gated = []
+    with recorder.stage("gate"):
+        for head in heads:
+            config = head.config
+            if config.range_gate != "fixed":
+                start, stop = config.bin_range
+                head = replace(head, bin_ranges=resolve_range_gates(
+                    dataset_path, file_groups, config.range_gate, stop - start, config.antennas,
+                    config.sensor_spec.channel, cache, config.channel_fusion,
+                ))
+            gated.append(head)
+        cache.save()
+    return gated
+
+
+def load_group(sensor_spec, dataset_path, base_name, files_info, antennas, bin_range, workspace=None,
+               capture_options=None, stft_window=None):
+    """
+    Carica una sola volta la fetta usata (magnitudine, range bins bin_range) di ogni antenna.
+    Restituisce {rx: matrice (frames, bins)}; un'antenna che non si riesce a caricare
+    è associata al suo GroupError, così solo le teste che la usano vengono scartate.
+    Con workspace (TransformWorkspace) la magnitudine è scritta nei suoi buffer: le matrici
+    restano valide fino al caricamento del gruppo successivo.
+    capture_options: combinazione dei canali e rimozione del clutter (PipelineConfig.capture_options()).
+    stft_window: al posto della magnitudine, spettrogrammi micro-Doppler con finestre di stft_window
+    frame (PipelineConfig.stft_window), calcolati con un solo STFT per tutte le antenne.
+    """
+    capture_options = capture_options or {}
+    if stft_window is not None:
+        return _load_group_spectrograms(sensor_spec, dataset_path, base_name, files_info, antennas, bin_range,
+                                        stft_window, capture_options.get("fusion", "single"))
+    # Un buffer per antenna e opzioni: teste con opzioni diverse non si sovrascrivono i dati
+    options_key = tuple(sorted(capture_options.items()))
+    loaded = {}
+    for rx_key in antennas:
+        file_path = os.path.join(dataset_path, files_info[rx_key])
+        allocate = None if workspace is None else partial(workspace.buffer, (rx_key, options_key))
+        try:
+            loaded[rx_key] = load_capture_magnitude(file_path, bin_range, sensor_spec.channel, allocate,
+                                                    **capture_options)
+        except Exception as e:
+            loaded[rx_key] = GroupError(f"Skipping group '{base_name}' due to processing error for {rx_key.upper()}: {e}")
+    return loaded
+
+
+def _load_group_spectrograms(sensor_spec, dataset_path, base_name, files_info, antennas, bin_range, stft_window,
+                             fusion):
+    loaded, selected = {}, {}
+    for rx_key in antennas:
+        try:
+            selected[rx_key] = load_capture_signal(os.path.join(dataset_path, files_info[rx_key]), bin_range,
+                                                   sensor_spec.channel, fusion)
+        except Exception as e:
+            loaded[rx_key] = GroupError(f"Skipping group '{base_name}' due to processing error for {rx_key.upper()}: {e}")
+    if selected:
+        try:
+            loaded.update(antenna_spectrograms(selected, stft_window, fusion))
+        except Exception as e:
+            loaded.update((rx_key, GroupError(f"Skipping group '{base_name}' due to processing error: {e}"))
+                          for rx_key in selected)
+    return loaded
+
+
+def select_head_data(config, loaded, bin_range, head_range=None):
+    """
+    Estrae (senza copie) le antenne e i range bins di una testa dai dati caricati con bin_range.
+    head_range: range bins della testa per questo gruppo (None = config.bin_range).
+    """
+    head_range = head_range or config.bin_range
+    offset = head_range[0] - bin_range[0]
+    n_bins = head_range[1] - head_range[0]
+    antenna_data = []
+    for rx_key in config.antennas:
+        data = loaded[rx_key]
+        if isinstance(data, GroupError):
+            raise data
+        antenna_data.append(data[:, offset:offset + n_bins])
+    return antenna_data
+
+
+def build_group_images(config, base_name, antenna_data, workspace=None):
+    """
+    Dalle matrici delle antenne costruisce le immagini del gruppo:
+    allineamento delle altezze (config.alignment), concatenazione, troncamento o divisione in finestre,
+    normalizzazione e riempimento fino all'altezza fissa.
+    Le immagini sono prodotte una alla volta (generatore): ogni finestra viene
+    materializzata solo quando viene salvata.
+    Con workspace (TransformWorkspace) concatenazione, normalizzazione e riempimento
+    sono scritti nei suoi buffer senza allocare memoria: ogni immagine va usata
+    (salvata o copiata) prima di chiedere la successiva.
+    """
+    recorder = get_recorder()
+    heights = [data.shape[0] for data in antenna_data]
+    # **VERIFICA ALTEZZA DEI DATI PRIMA DI CONCATENARE**
+    aligned_rows = aligned_height(heights, config.alignment)
+    if aligned_rows is None:
+        detail = ", ".join(f"{rx.upper()} ({h})" for rx, h in zip(config.antennas, heights))
+        raise GroupError(f"ERROR: Inconsistent heights for {detail} in group '{base_name}'. Skipping.",
+                         SKIP_HEIGHT_MISMATCH)
+    merged_width = sum(data.shape[1] for data in antenna_data)
+    if merged_width != config.image_width:
+        raise GroupError(
+            f"ERROR: Merged data width is {merged_width}, but expected {config.image_width} for group '{base_name}'. Skipping.",
+            SKIP_WIDTH_MISMATCH,
+        )
+
+    # Senza divisione in finestre servono solo le prime max_height righe
+    rows = aligned_rows
+    if config.max_height is not None and not config.split_height:
+        rows = min(rows, config.max_height)
+    # Concatena i dati delle antenne orizzontalmente (con "trim" le righe comuni sono viste,
+    # con "pad" le righe mancanti diventano zeri nella stessa copia)
+    with recorder.stage("merge"):
+        out = None
+        if workspace is not None:
+            out = workspace.buffer("merged", (rows, merged_width), np.result_type(*antenna_data))
+        if min(heights) < rows:
+            merged_data = merge_aligned(antenna_data, rows, out)
+        elif out is None:
+            merged_data = merge_antennas([data[:rows] for data in antenna_data])
+        else:
+            merged_data = merge_antennas([data[:rows] for data in antenna_data], out=out)
+
+    if config.split_height:
+        # Finestre di max_height righe ogni hop righe: viste di merged_data, senza copie.
+        # La coda con tail="pad" viene completata più sotto, come con pad_height
+        tail = "keep" if config.tail == "pad" else config.tail
+        parts = iter_windows(merged_data, config.max_height, config.hop, tail)
+    else:
+        parts = [merged_data]
+
+    pad_height = config.pad_height or (config.split_height and config.tail == "pad")
+    # Le misure non includono il tempo tra un yield e il successivo (salvataggio)
+    for part in parts:
+        if pad_height and config.normalization == "none":
+            # Gli zeri aggiunti partecipano alla scala di grigi come nelle immagini originali
+            with recorder.stage("pad"):
+                image = pad_to_height(part, config.max_height, _padded_buffer(workspace, config, part))
+        else:
+            with recorder.stage("normalize"):
+                if workspace is None:
+                    image = apply_normalization(part, config.normalization)
+                else:
+                    if config.split_height and config.normalization != "none":
+                        # Le finestre possono sovrapporsi: si normalizza una copia, non merged_data
+                        window = workspace.buffer("window", part.shape, part.dtype)
+                        np.copyto(window, part)
+                        part = window
+                    image = apply_normalization_in_place(part, config.normalization, config.backend)
+            if pad_height:
+                with recorder.stage("pad"):
+                    image = pad_to_height(image, config.max_height, _padded_buffer(workspace, config, image))
+        yield image
+
+
+def _padded_buffer(workspace, config, data):
+    """Buffer float64 per pad_to_height, o None senza workspace."""
+    if workspace is None:
+        return None
+    return workspace.buffer("padded", (max(config.max_height, data.shape[0]), data.shape[1]), np.float64)
+
+
+def save_group_images(config, output_path, base_name, label, images):
+    """Salva le immagini di un gruppo e restituisce i percorsi dei file scritti."""
+    output_files = []
+    for part, image in enumerate(images, start=1):
+        output_file_full_path = group_output_path(config, output_path, base_name, label, part)
+        print(f"Saving: {output_file_full_path}")
+        save_grayscale_png(image, output_file_full_path)
+        output_files.append(output_file_full_path)
+    return output_files
+
+
+def process_head(head, base_name, label, loaded, bin_range, workspace=None):
+    """Genera e salva le immagini di una testa a partire dai dati già caricati del gruppo."""
+    try:
+        antenna_data = select_head_data(head.config, loaded, bin_range, head.group_bin_range(base_name))
+        images = build_group_images(head.config, base_name, antenna_data, workspace)
+        return GROUP_GENERATED, save_group_images(head.config, head.output_path, base_name, label, images)
+    except GroupError as e:
+        print(e)
+        get_recorder().skip(e.reason)
+    except Exception as e:
+        print(f"Unhandled error during processing of group '{base_name}': {e}. Skipping this group.")
+        get_recorder().skip(SKIP_UNHANDLED)
+    return GROUP_ERROR, []
+
+
+# Buffer riutilizzati da tutti i gruppi elaborati in questo processo (uno per processo del pool)
+_workspace = None
+
+
+def process_workspace():
+    """TransformWorkspace del processo corrente, creato al primo uso."""
+    global _workspace
+    if _workspace is None:
+        _workspace = TransformWorkspace()
+    return _workspace
+
+
+# --- ELABORAZIONE DI UN GRUPPO DI ACQUISIZIONE ---
+def process_heads(heads, dataset_path, task):
+    """
+    Elabora un gruppo per più teste: task = (base_name, files_info, indici delle teste).
+    Ogni antenna richiesta da almeno una testa viene letta e convertita in magnitudine
+    una sola volta (per opzioni di caricamento, vedi PipelineConfig.capture_options),
+    sull'intervallo di range bins che copre tutte le teste. Le colonne degli spettrogrammi
+    Doppler non sono range bins: le teste Doppler caricano solo i propri.
+    Restituisce un (esito, immagini salvate) per ogni testa indicata: ogni gruppo è
+    indipendente, quindi può essere eseguito anche in un processo separato.
+    """
+    base_name, files_info, head_indices = task
+    recorder = get_recorder()
+    selected = [heads[index] for index in head_indices]
+    label = files_info.get('label')
+    if not label:
+        for _ in selected:
+            recorder.skip(SKIP_NO_LABEL)
+        return [(GROUP_SKIPPED, [])] * len(selected)
+
+    results = [None] * len(selected)
+    ready = []
+    for position, head in enumerate(selected):
+        missing = [rx_key.upper() for rx_key in head.config.antennas if not files_info.get(rx_key)]
+        if missing:
+            print(f"Skipping group '{base_name}': Missing required {', '.join(missing)} file.")
+            recorder.skip(SKIP_MISSING_RX)
+            results[position] = (GROUP_SKIPPED, [])
+        else:
+            ready.append(position)
+    if not ready:
+        return results
+
+    configs = [selected[position].config for position in ready]
+    antennas = [rx_key for rx_key in RX_KEYS if any(rx_key in config.antennas for config in configs)]
+    head_ranges = [selected[position].group_bin_range(base_name) for position in ready]
+    bin_range = min(start for start, _ in head_ranges), max(stop for _, stop in head_ranges)
+    # Magnitudine, concatenazione e normalizzazione scritte in buffer riutilizzati: a regime
+    # un gruppo non alloca memoria prima della conversione in PNG
+    workspace = process_workspace()
+    loaded = {}
+    for position in ready:
+        head = selected[position]
+        config = head.config
+        load_range = bin_range if config.stft_window is None else head.group_bin_range(base_name)
+        key = (tuple(sorted(config.capture_options().items())), config.stft_window, load_range)
+        if key not in loaded:
+            loaded[key] = load_group(config.sensor_spec, dataset_path, base_name, files_info, antennas, load_range,
+                                     workspace, config.capture_options(), config.stft_window)
+        results[position] = process_head(head, base_name, label, loaded[key], load_range, workspace)
+    return results
+
+
+def process_heads_recorded(heads, dataset_path, task):
+    """
+    process_heads per un processo del pool con la strumentazione attiva: le misure sono raccolte
+    in un registro locale e restituite insieme agli esiti, (esiti, misure), per essere sommate
+    a quelle del processo principale.
+    """
+    return run_recorded(partial(process_heads, heads, dataset_path), task)
+
+
+def run_recorded(function, task):
+    """function(task) con un registro locale della strumentazione: restituisce (risultato, misure)."""
+    recorder = StageRecorder()
+    with recording(recorder):
+        result = function(task)
+    return result, recorder.snapshot()
+
+
+def process_group(config, dataset_path, output_path, group):
+    """
+    Elabora un gruppo (base_name, files_info) per una sola configurazione e salva le sue immagini.
+    Restituisce (esito, immagini salvate).
+    """
+    base_name, files_info = group
+    return process_heads([OutputHead(config, output_path)], dataset_path, (base_name, files_info, (0,)))[0]
+
+
+# --- IMMAGINI IN MEMORIA (SENZA PNG) ---
+def group_images(config, head, dataset_path, convert, keep_data, group):
+    """
+    Immagini di un gruppo (base_name, files_info) per una sola configurazione, senza salvarle.
+    Le immagini sono viste sui buffer del workspace: ogni parte passa per convert (es.
+    quantize_to_gray) prima che sia calcolata la successiva. Stessi controlli, messaggi e motivi
+    di scarto di process_heads. Restituisce (esito, parti convertite, dati delle antenne se
+    keep_data, altrimenti None).
+    """
+    base_name, files_info = group
+    recorder = get_recorder()
+    if not files_info.get('label'):
+        recorder.skip(SKIP_NO_LABEL)
+        return GROUP_SKIPPED, [], None
+    missing = [rx_key.upper() for rx_key in config.antennas if not files_info.get(rx_key)]
+    if missing:
+        print(f"Skipping group '{base_name}': Missing required {', '.join(missing)} file.")
+        recorder.skip(SKIP_MISSING_RX)
+        return GROUP_SKIPPED, [], None
+    workspace = process_workspace()
+    try:
+        bin_range = head.group_bin_range(base_name)
+        loaded = load_group(config.sensor_spec, dataset_path, base_name, files_info, config.antennas, bin_range,
+                            workspace, config.capture_options(), config.stft_window)
+        antenna_data = select_head_data(config, loaded, bin_range, bin_range)
+        parts = [convert(image) for image in build_group_images(config, base_name, antenna_data, workspace)]
+    except GroupError as e:
+        print(e)
+        recorder.skip(e.reason)
+        return GROUP_ERROR, [], None
+    return GROUP_GENERATED, parts, antenna_data if keep_data else None
+
+
+def iter_group_images(config, dataset_path, file_groups=None, convert=quantize_to_gray, keep_data=False, workers=1,
+                      chunksize=None):
+    """
+    Immagini di tutti i gruppi calcolate in memoria con le funzioni della pipeline (es. per
+    l'esportazione, l'inferenza o il confronto in virgola fissa): genera, nell'ordine dei gruppi,
+    (base_name, etichetta, esito, parti convertite, dati delle antenne o None).
+    Con workers > 1 i gruppi sono elaborati in un pool di processi, come in run_heads: convert
+    deve allora essere serializzabile, e i dati delle antenne sono copie invece che viste valide
+    fino al gruppo successivo.
+    """
+    recorder = get_recorder()
+    if file_groups is None:
+        with recorder.stage("scan"):
+            file_groups = group_dataset_files(dataset_path)
+    head = gate_heads([OutputHead(config, "")], dataset_path, file_groups)[0]
+    process = partial(group_images, config, head, dataset_path, convert, keep_data)
+    if recorder.enabled and resolve_workers(workers) > 1:
+        outcomes = _merge_worker_measures(recorder, map_groups(
+            partial(run_recorded, process), file_groups.items(), workers, chunksize,
+        ))
+    else:
+        outcomes = map_groups(process, file_groups.items(), workers, chunksize)
+    for (base_name, files_info), (status, parts, antenna_data) in outcomes:
+        yield base_name, files_info.get('label'), status, parts, antenna_data
+
+
+def check_batch_heads(heads):
+    """La modalità batch produce un'immagine per gruppo: la divisione in finestre non è supportata."""
+    for head in heads:
+        if head.config.split_height:
+            raise ValueError(f"Batch mode does not support split_height (output {head.output_path})")
+        if head.config.range_gate != "fixed":
+            raise ValueError(f"Batch mode does not support range gating (output {head.output_path})")
+    options = {
+        tuple(sorted(head.config.capture_options().items())) + (head.config.stft_window, head.config.alignment)
+        for head in heads
+    }
+    if len(options) > 1:
+        raise ValueError("Batch mode needs the same channel fusion, clutter removal, feature and antenna alignment "
+                         "for all output heads")
+    if heads[0].config.stft_window is not None and len({head.config.bin_range for head in heads}) > 1:
+        raise ValueError("Batch mode needs the same bin range for all output heads with Doppler features")
+
+
+def process_heads_batch(heads, dataset_path, tasks):
+    """
+    Come process_heads, ma per tutti i task insieme: le acquisizioni sono impilate in un unico
+    tensore (load_capture_batch) e magnitudine, selezione dei bins, concatenazione delle antenne
+    e normalizzazione sono poche operazioni vettoriali lungo l'asse dei gruppi.
+    Restituisce, per ogni task, la lista (esito, immagini salvate) delle sue teste.
+    """
+    recorder = get_recorder()
+    results = []
+    # Gruppi da caricare, divisi per insieme di antenne richieste (di solito uno solo)
+    partitions = {}
+    for base_name, files_info, head_indices in tasks:
+        head_results = {}
+        ready = []
+        for index in head_indices:
+            missing = [rx_key.upper() for rx_key in heads[index].config.antennas if not files_info.get(rx_key)]
+            if not files_info.get('label'):
+                recorder.skip(SKIP_NO_LABEL)
+                head_results[index] = (GROUP_SKIPPED, [])
+            elif missing:
+                print(f"Skipping group '{base_name}': Missing required {', '.join(missing)} file.")
+                recorder.skip(SKIP_MISSING_RX)
+                head_results[index] = (GROUP_SKIPPED, [])
+            else:
+                ready.append(index)
+        if ready:
+            antennas = tuple(rx_key for rx_key in RX_KEYS if any(rx_key in heads[i].config.antennas for i in ready))
+            partitions.setdefault(antennas, {})[base_name] = (files_info, ready)
+        results.append(head_results)
+
+    configs = [head.config for head in heads]
+    bin_range = covering_bin_range(configs)
+    channel = configs[0].sensor_spec.channel
+    capture_options = configs[0].capture_options()
+    # Righe da caricare: la più grande altezza massima tra le teste (None = acquisizione intera)
+    max_height = None if any(c.max_height is None for c in configs) else max(c.max_height for c in configs)
+
+    by_name = {}
+    for antennas, groups in partitions.items():
+        batch, failed = load_capture_batch(
+            dataset_path, {name: files_info for name, (files_info, _) in groups.items()},
+            antennas, bin_range, channel, max_height, **capture_options, stft_window=configs[0].stft_window,
+            alignment=configs[0].alignment,
+        )
+        for base_name, (reason, message) in failed.items():
+            print(message)
+            for _ in groups[base_name][1]:
+                recorder.skip(reason)
+            by_name[base_name] = {index: (GROUP_ERROR, []) for index in groups[base_name][1]}
+        for index, head in enumerate(heads):
+            config = head.config
+            members = [i for i, name in enumerate(batch.base_names) if index in groups[name][1]]
+            if not members:
+                continue
+            lengths = batch.lengths[members]
+            if config.max_height is not None:
+                lengths = np.minimum(lengths, config.max_height)
+            height = config.max_height if config.pad_height else int(lengths.max())
+            # Immagini grezze con riempimento: gli zeri partecipano alla scala di grigi e,
+            # come la matrice np.zeros di pad_to_height, si lavora in float64
+            dtype = np.float64 if config.pad_height and config.normalization == "none" else None
+            with recorder.stage("merge"):
+                images = batch.select(config.antennas, config.bin_range, height, members, dtype)
+            with recorder.stage("normalize"):
+                apply_normalization_batch(
+                    images, config.normalization,
+                    None if config.pad_height and config.normalization == "none" else lengths,
+                )
+            for image, length, member in zip(images, lengths, members):
+                base_name = batch.base_names[member]
+                image = image if config.pad_height else image[:length]
+                output_files = save_group_images(config, head.output_path, base_name, batch.labels[member], [image])
+                by_name.setdefault(base_name, {})[index] = (GROUP_GENERATED, output_files)
+
+    for task, head_results in zip(tasks, results):
+        base_name, _, head_indices = task
+        head_results.update(by_name.get(base_name, {}))
+        yield task, [head_results[index] for index in head_indices]
+
+
+def prepare_head_build(head, dataset_path, file_groups, incremental, hash_sources, signature_cache):
+    """
+    Prepara la cartella e il manifest di una testa.
+    Restituisce (manifest, firme di tutti i gruppi, gruppi da generare).
+    """
+    config, output_path = head.config, head.output_path
+    if incremental:
+        os.makedirs(output_path, exist_ok=True)
+        manifest = BuildManifest.load(output_path, config.build_params(), use_hash=hash_sources)
+        signatures, groups_to_build = plan_incremental_build(
+            manifest, dataset_path, file_groups, config.antennas, signature_cache, head.bin_ranges
+        )
+        print(f"Incremental build of {output_path}: {len(groups_to_build)} of {len(file_groups)} groups need to be rebuilt.")
+    else:
+        # Pulisci la cartella prima di iniziare l'elaborazione
+        clean_output_folder(output_path)
+        # Il manifest viene comunque riscritto, così la prossima build incrementale riparte da qui
+        manifest = BuildManifest(output_path, config.build_params(), use_hash=hash_sources)
+        signatures = manifest.group_signatures(dataset_path, file_groups, config.antennas, signature_cache,
+                                               head.bin_ranges)
+        groups_to_build = file_groups
+    return manifest, signatures, groups_to_build
+
+
+def run_heads(heads, dataset_path, workers=1, chunksize=None, incremental=False, hash_sources=False, batch=False,
+              file_groups=None):
+    """
+    Genera più varianti del dataset (teste) con una sola lettura di ogni acquisizione.
+    Ogni testa ha la sua cartella di output e il suo manifest; restituisce un
+    PipelineResult per testa, nello stesso ordine di heads.
+    Con batch=True i gruppi sono elaborati tutti insieme in un unico tensore (un solo processo).
+    file_groups limita l'elaborazione a un sottoinsieme dei gruppi (es. scelto con catalog.py);
+    None = tutti i gruppi della cartella.
+    """
+    heads = list(heads)
+    check_heads(heads)
+    if batch:
+        check_batch_heads(heads)
+    recorder = get_recorder()
+    if file_groups is None:
+        with recorder.stage("scan"):
+            file_groups = group_dataset_files(dataset_path)
+    print(f"Found {len(file_groups)} unique acquisition groups to potentially process.")
+    heads = gate_heads(heads, dataset_path, file_groups)
+
+    results = [PipelineResult(groups_found=len(file_groups)) for _ in heads]
+    manifests, signatures = [], []
+    # Le firme dei file sorgente (eventualmente hash del contenuto) sono calcolate una volta sola
+    signature_cache = {}
+    heads_to_build = {}
+    for index, head in enumerate(heads):
+        with recorder.stage("manifest"):
+            manifest, head_signatures, groups_to_build = prepare_head_build(
+                head, dataset_path, file_groups, incremental, hash_sources, signature_cache
+            )
+        manifests.append(manifest)
+        signatures.append(head_signatures)
+        for base_name in groups_to_build:
+            heads_to_build.setdefault(base_name, []).append(index)
+
+    tasks = [
+        (base_name, files_info, tuple(heads_to_build[base_name]))
+        for base_name, files_info in file_groups.items()
+        if base_name in heads_to_build
+    ]
+
+    if batch:
+        outcomes = process_heads_batch(heads, dataset_path, tasks)
+    elif recorder.enabled and resolve_workers(workers) > 1:
+        # Ogni processo del pool ha il suo registro: le misure tornano insieme agli esiti
+        outcomes = _merge_worker_measures(recorder, map_groups(
+            partial(process_heads_recorded, heads, dataset_path), tasks, workers, chunksize,
+        ))
+    else:
+        # I gruppi sono indipendenti: con workers > 1 vengono distribuiti su più processi
+        outcomes = map_groups(partial(process_heads, heads, dataset_path), tasks, workers, chunksize)
+    for (base_name, _, head_indices), head_results in outcomes:
+        for index, (status, output_files) in zip(head_indices, head_results):
+            results[index].group_counts[status] += 1
+            results[index].generated_images += len(output_files)
+            # Anche i gruppi incompleti: una build incrementale senza modifiche non li riesamina
+            if status in (GROUP_GENERATED, GROUP_SKIPPED):
+                manifests[index].record(base_name, signatures[index][base_name], output_files,
+                                        skipped=status == GROUP_SKIPPED)
+    for manifest in manifests:
+        manifest.save()
+    return results
+
+
+def _merge_worker_measures(recorder, outcomes):
+    for task, (head_results, snapshot) in outcomes:
+        recorder.merge(snapshot)
+        yield task, head_results
+
+
+def run_pipeline(config, dataset_path, output_path, workers=1, chunksize=None, incremental=False, hash_sources=False,
+                 batch=False, file_groups=None):
+    """
+    Genera tutte le immagini di una variante del dataset.
+    Senza incremental la cartella di output viene svuotata e rigenerata; con incremental
+    si rigenerano solo i gruppi con sorgenti o parametri cambiati (vedi manifest.py).
+    """
+    return run_heads(
+        [OutputHead(config, output_path)], dataset_path,
+        workers=workers, chunksize=chunksize, incremental=incremental, hash_sources=hash_sources, batch=batch,
+        file_groups=file_groups,
+    )[0]
@@ -0,0 +1,362 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .capture_io import open_capture
+from .catalog import select_file_groups
+from .cli import add_config_arguments, config_from_args
+from .dataset import LABEL_MAPPING, group_dataset_files
+from .pipeline import SENSORS, PipelineConfig
+from .streaming import FRAME_RATE_HZ, StreamingPreprocessor
+
+# --- SIMULATORE DI CARICO: REPLAY DELLE ACQUISIZIONI ---
+# Le acquisizioni registrate (.npy) sono riprodotte come stream di frame temporizzati da N sensori
+# virtuali (letti o stanze), per provare il pre-processing in streaming con il carico di molti radar:
+# - un solo thread "orologio" emette a ogni periodo un frame per sensore, all'istante previsto;
+# - ogni frame va nella coda limitata del worker a cui è assegnato il sensore (sensore % workers):
+#   se la coda è piena il frame è perso (un radar non aspetta), come in produzione;
+# - ogni worker (thread) ha uno StreamingPreprocessor per ciascuno dei suoi sensori.
+# La latenza end-to-end va dall'istante previsto di acquisizione del frame alla fine del suo
+# pre-processing (per le finestre: del frame che le completa), ritardi dell'orologio compresi.
+# Con rate 0 i frame sono emessi il più rapidamente possibile e le code piene bloccano
+# l'orologio (nessun frame perso): misura il throughput massimo.
+
+DEFAULT_SENSORS = 8
+DEFAULT_FRAMES = 500
+DEFAULT_WORKERS = 2
+# Frame in attesa per sensore prima di perderne (8 frame = 0.32 s a 25 frame/s): la coda di un worker
+# ne contiene queue_size x i suoi sensori, perché a ogni periodo riceve un frame da ciascuno
+DEFAULT_QUEUE_SIZE = 8
+
+# Frame per acquisizione registrata: come quelle del dataset
+DEFAULT_RECORD_FRAMES = 100
+
+# Etichetta nel formato dei nomi dei file (es. "right_arm_up" -> "Right arm up")
+_RAW_LABELS = {label: raw.capitalize() for raw, label in LABEL_MAPPING.items()}
+_UNLABELED = "Unlabeled"
+
+_STOP = None
+
+
+class ReplaySource:
+    """
+    Acquisizioni del dataset da riprodurre, aperte in memory-map al primo uso. Le antenne di
+    un gruppo sono troncate al numero di frame comune, così ogni frame ha tutte le antenne.
+    """
+
+    def __init__(self, dataset_path, antennas, file_groups=None):
+        if file_groups is None:
+            file_groups = group_dataset_files(dataset_path)
+        self.dataset_path = dataset_path
+        self.antennas = tuple(antennas)
+        self.groups = [
+            (base_name, files_info['label'], files_info) for base_name, files_info in file_groups.items()
+            if files_info.get('label') and all(files_info.get(rx_key) for rx_key in self.antennas)
+        ]
+        if not self.groups:
+            raise ValueError(f"No labeled acquisition groups with antennas {self.antennas} in {dataset_path}")
+        self._captures = {}
+
+    def __len__(self):
+        return len(self.groups)
+
+    def capture(self, index):
+        """(etichetta, [matrice (frames, ...) per antenna]) del gruppo index, tutte con lo stesso numero di frame."""
+        cached = self._captures.get(index)
+        if cached is None:
+            _, label, files_info = self.groups[index]
+            data = [open_capture(os.path.join(self.dataset_path, files_info[rx_key])) for rx_key in self.antennas]
+            n_frames = min(len(antenna) for antenna in data)
+            cached = self._captures[index] = (label, [antenna[:n_frames] for antenna in data])
+        return cached
+
+
+class VirtualSensor:
+    """Un radar simulato: riproduce in ciclo le acquisizioni della sorgente, in un ordine proprio."""
+
+    def __init__(self, sensor_id, source, seed=0):
+        self.sensor_id = sensor_id
+        self.source = source
+        self._order = np.random.default_rng(seed + sensor_id).permutation(len(source))
+        self._position = 0
+        self._frame = 0
+
+    def next_frame(self):
+        """(etichetta, frame per antenna) del frame successivo: viste sulle acquisizioni, senza copie."""
+        label, captures = self.source.capture(self._order[self._position])
+        frames = [antenna[self._frame] for antenna in captures]
+        self._frame += 1
+        if self._frame == len(captures[0]):
+            self._frame = 0
+            self._position = (self._position + 1) % len(self._order)
+        return label, frames
+
+
+class CaptureRecorder:
+    """
+    Registra lo stream di un sensore in acquisizioni .npy nel formato del dataset (un file per
+    antenna, es. "Sensor003_Right arm up_Fisio_20250601-100004-0002_Infineon_rx0.npy"), utilizzabili
+    dalla pipeline offline. I frame sono copiati in buffer allocati alla prima acquisizione.
+    La data/ora nel nome è quella del primo frame (start + frame ricevuti x period_s), seguita dal
+    numero dell'acquisizione del sensore: acquisizioni più brevi di un secondo non si sovrascrivono.
+    Un cambio di etichetta chiude l'acquisizione in corso (un'acquisizione ha una sola etichetta).
+    """
+
+    def __init__(self, folder, sensor, antennas, subject, capture_frames=DEFAULT_RECORD_FRAMES, start=None,
+                 period_s=1.0 / FRAME_RATE_HZ):
+        if capture_frames < 1:
+            raise ValueError(f"Invalid frames per recorded capture: {capture_frames}")
+        self.folder = folder
+        self.tag = SENSORS[sensor].output_tag
+        self.antennas = tuple(antennas)
+        self.subject = subject
+        self.capture_frames = capture_frames
+        self.start = start or datetime.now().replace(microsecond=0)
+        self.period_s = period_s
+        self._buffers = None
+        self._filled = 0
+        self._label = None
+        self.captures = 0
+        self.frames_recorded = 0
+        self.written = []
+
+    def push(self, frames, label=None):
+        """Aggiunge un frame per antenna; un'etichetta diversa da quella dell'acquisizione in corso ne inizia una nuova."""
+        if self._filled and label != self._label:
+            self.flush()
+        if self._buffers is None:
+            self._buffers = [np.empty((self.capture_frames,) + np.shape(frame), dtype=np.asarray(frame).dtype)
+                             for frame in frames]
+        if self._filled == 0:
+            self._label = label
+        for buffer, frame in zip(self._buffers, frames):
+            buffer[self._filled] = frame
+        self._filled += 1
+        self.frames_recorded += 1
+        if self._filled == self.capture_frames:
+            self.flush()
+
+    def flush(self):
+        """Scrive l'acquisizione in corso (anche incompleta); restituisce i file scritti."""
+        if not self._filled:
+            return []
+        first_frame = self.frames_recorded - self._filled
+        timestamp = self.start + timedelta(seconds=first_frame * self.period_s)
+        base_name = (f"{self.subject}_{_RAW_LABELS.get(self._label, _UNLABELED)}_Fisio_"
+                     f"{timestamp:%Y%m%d-%H%M%S}-{self.captures:04d}")
+        os.makedirs(self.folder, exist_ok=True)
+        paths = []
+        for rx_key, buffer in zip(self.antennas, self._buffers):
+            path = os.path.join(self.folder, f"{base_name}_{self.tag}_{rx_key}.npy")
+            np.save(path, buffer[:self._filled])
+            paths.append(path)
+        self._filled = 0
+        self.captures += 1
+        self.written += paths
+        return paths
+
+
+def latency_percentiles(samples_ns):
+    """Percentili (ms) di una lista di latenze in ns; None se vuota."""
+    if not len(samples_ns):
+        return None
+    samples_ms = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    p50, p90, p99 = np.percentile(samples_ms, (50, 90, 99))
+    return {"p50": p50, "p90": p90, "p99": p99, "max": samples_ms.max()}
+
+
+class ReplayReport:
+    """Frame emessi, persi ed elaborati, latenze e throughput di una simulazione."""
+
+    def __init__(self, n_sensors):
+        self.emitted = np.zeros(n_sensors, dtype=np.int64)
+        self.dropped = np.zeros(n_sensors, dtype=np.int64)
+        self.processed = 0
+        self.windows = 0
+        self.frame_latencies = []
+        self.window_latencies = []
+        self.max_clock_lag_ns = 0
+        self.wall_s = 0.0
+
+    def summary(self):
+        emitted = int(self.emitted.sum())
+        dropped = int(self.dropped.sum())
+        return {
+            "sensors": len(self.emitted),
+            "frames_emitted": emitted,
+            "frames_dropped": dropped,
+            "drop_rate": dropped / emitted if emitted else 0.0,
+            "sensors_with_drops": int(np.count_nonzero(self.dropped)),
+            "frames_processed": self.processed,
+            "windows": self.windows,
+            "frame_latency_ms": latency_percentiles(self.frame_latencies),
+            "window_latency_ms": latency_percentiles(self.window_latencies),
+            "max_clock_lag_ms": self.max_clock_lag_ns / 1e6,
+            "wall_s": self.wall_s,
+            "frames_per_s": self.processed / self.wall_s if self.wall_s else None,
+        }
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = [
+            f"sensors: {summary['sensors']}, frames emitted: {summary['frames_emitted']}, "
+            f"processed: {summary['frames_processed']}, dropped: {summary['frames_dropped']} "
+            f"({100 * summary['drop_rate']:.2f}%, {summary['sensors_with_drops']} sensors)",
+            f"windows: {summary['windows']}",
+        ]
+        for name in ("frame", "window"):
+            stats = summary[f"{name}_latency_ms"]
+            if stats is not None:
+                lines.append(f"{name} latency: " + ", ".join(f"{key}={value:.3f} ms" for key, value in stats.items()))
+        lines.append(f"max clock lag: {summary['max_clock_lag_ms']:.3f} ms")
+        lines.append(f"wall time: {summary['wall_s']:.3f} s ({summary['frames_per_s']:.0f} frames/s)")
+        return "\n".join(lines)
+
+
+def _produce(sensors, queues, frames_per_sensor, rate, report):
+    """Thread orologio: un frame per sensore a ogni periodo, nella coda del worker del sensore."""
+    period_ns = int(1e9 / rate) if rate else 0
+    start = time.perf_counter_ns()
+    for tick in range(frames_per_sensor):
+        if period_ns:
+            scheduled = start + tick * period_ns
+            delay = scheduled - time.perf_counter_ns()
+            if delay > 0:
+                time.sleep(delay / 1e9)
+            else:
+                report.max_clock_lag_ns = max(report.max_clock_lag_ns, -delay)
+        else:
+            scheduled = time.perf_counter_ns()
+        for sensor in sensors:
+            label, frames = sensor.next_frame()
+            message = (sensor.sensor_id, scheduled, label, frames)
+            report.emitted[sensor.sensor_id] += 1
+            target = queues[sensor.sensor_id % len(queues)]
+            if period_ns:
+                try:
+                    target.put_nowait(message)
+                except queue.Full:
+                    report.dropped[sensor.sensor_id] += 1
+            else:
+                target.put(message)
+    for target in queues:
+        target.put(_STOP)
+
+
+def _consume(messages, preprocessors, recorders, counts, frame_latencies, window_latencies):
+    """Worker: pre-processing in streaming dei frame dei suoi sensori fino al segnale di fine."""
+    while True:
+        message = messages.get()
+        if message is _STOP:
+            return
+        sensor_id, scheduled, label, frames = message
+        window = preprocessors[sensor_id].push(frames)
+        if recorders is not None:
+            recorders[sensor_id].push(frames, label)
+        latency = time.perf_counter_ns() - scheduled
+        frame_latencies.append(latency)
+        counts[0] += 1
+        if window is not None:
+            window_latencies.append(latency)
+            counts[1] += 1
+
+
+def run_replay(config, source, n_sensors=DEFAULT_SENSORS, frames_per_sensor=DEFAULT_FRAMES, rate=FRAME_RATE_HZ,
+               workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, record_path=None,
+               record_frames=DEFAULT_RECORD_FRAMES, seed=0):
+    """
+    Riproduce la sorgente con n_sensors sensori virtuali a rate frame/s ciascuno (0 = senza pause)
+    per frames_per_sensor frame e restituisce il ReplayReport.
+    Con record_path lo stream ricevuto da ogni sensore è registrato in acquisizioni .npy di
+    record_frames frame (vedi CaptureRecorder).
+    """
+    if n_sensors < 1 or frames_per_sensor < 1 or workers < 1 or queue_size < 1 or rate < 0:
+        raise ValueError("sensors, frames, workers and queue size must be positive and rate non-negative")
+    sensors = [VirtualSensor(sensor_id, source, seed) for sensor_id in range(n_sensors)]
+    # Allocazione dei buffer di tutti i sensori prima di far partire l'orologio
+    preprocessors = [StreamingPreprocessor.from_config(config, hop=config.hop) for _ in sensors]
+    recorders = None
+    if record_path:
+        start = datetime.now().replace(microsecond=0)
+        recorders = [CaptureRecorder(record_path, config.sensor, source.antennas, f"Sensor{sensor_id:03d}",
+                                     record_frames, start, 1.0 / (rate or FRAME_RATE_HZ))
+                     for sensor_id in range(n_sensors)]
+    report = ReplayReport(n_sensors)
+    sensors_per_worker = -(-n_sensors // workers)
+    queues = [queue.Queue(maxsize=queue_size * sensors_per_worker) for _ in range(workers)]
+    worker_results = [([0, 0], [], []) for _ in range(workers)]
+    threads = [
+        threading.Thread(target=_consume, args=(messages, preprocessors, recorders, *results), daemon=True)
+        for messages, results in zip(queues, worker_results)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    _produce(sensors, queues, frames_per_sensor, rate, report)
+    for thread in threads:
+        thread.join()
+    report.wall_s = time.perf_counter() - start
+    for counts, frame_latencies, window_latencies in worker_results:
+        report.processed += counts[0]
+        report.windows += counts[1]
+        report.frame_latencies += frame_latencies
+        report.window_latencies += window_latencies
+    if recorders is not None:
+        for recorder in recorders:
+            recorder.flush()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay recorded captures as timed frame streams from many virtual sensors through the "
+                    "streaming preprocessor, reporting end-to-end latency percentiles and dropped frames.")
+    parser.add_argument("--dataset", required=True, help="Folder with the .npy captures to replay.")
+    parser.add_argument("--query", metavar="EXPR", help="Replay only the captures matching a catalog query.")
+    parser.add_argument("--sensors", type=int, default=DEFAULT_SENSORS, help="Concurrent virtual sensors.")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="Frames emitted by each sensor.")
+    parser.add_argument("--rate", type=float, default=FRAME_RATE_HZ,
+                        help="Frames per second of each sensor (0 = as fast as possible, no drops).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Preprocessing worker threads.")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Frames waiting per sensor before new frames are dropped.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the capture order of each sensor.")
+    parser.add_argument("--record", metavar="FOLDER",
+                        help="Record the frames received from each sensor as .npy captures in the dataset format.")
+    parser.add_argument("--record-frames", type=int, default=DEFAULT_RECORD_FRAMES,
+                        help="Frames per recorded capture.")
+    parser.add_argument("--report", metavar="PATH", help="Write the results as JSON.")
+    add_config_arguments(parser, PipelineConfig(normalization="log"))
+    args = parser.parse_args(argv)
+    try:
+        config = config_from_args(args)
+        StreamingPreprocessor.from_config(config)
+        file_groups = select_file_groups(args.dataset, args.query) if args.query is not None else None
+        source = ReplaySource(args.dataset, config.antennas, file_groups)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"Replaying {len(source)} captures with {args.sensors} sensors x {args.frames} frames "
+          f"at {args.rate:g} frames/s, {args.workers} workers")
+    try:
+        report = run_replay(config, source, args.sensors, args.frames, args.rate, args.workers, args.queue_size,
+                            args.record, args.record_frames, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    print(report.format_summary())
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"params": config.build_params(), "rate": args.rate, "workers": args.workers,
+                       "queue_size": args.queue_size, **report.summary()}, f, indent=1)
+        print(f"Report written to {args.report}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
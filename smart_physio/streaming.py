@@ -0,0 +1,155 @@
+import numpy as np
+
+from .capture_io import (
+    DEFAULT_BIN_RANGE, DEFAULT_CHANNEL, check_channel_fusion, fused_magnitude, fusion_channel, select_capture_slice,
+)
+from .clutter import DEFAULT_CLUTTER_ALPHA, ClutterFilter
+from .transforms import NORMALIZATIONS
+
+# 125 righe corrispondono a 5 secondi di dati: il radar produce 25 frame al secondo
+FRAME_RATE_HZ = 25
+FRAME_PERIOD_S = 1.0 / FRAME_RATE_HZ
+
+# Finestra predefinita: la stessa altezza massima delle immagini offline
+DEFAULT_WINDOW = 125
+
+
+class StreamingPreprocessor:
+    """
+    Pre-processing in tempo reale: riceve un frame alla volta per ogni antenna e, ogni
+    hop frame, restituisce la finestra degli ultimi window frame pronta per il modello
+    (stesse operazioni della pipeline offline: magnitudine, range bins, RX0 | RX1 | RX2,
+    normalize_and_log_transform).
+
+    Tutta la memoria è allocata nel costruttore:
+    - un buffer circolare "doppio" di 2 * window righe: ogni riga è scritta due volte
+      (posizione i e i + window), così la finestra corrente è sempre una vista contigua;
+    - il minimo e il massimo di ogni riga, per normalizzare la finestra senza ricalcolare
+      log1p e min/max su tutti i suoi elementi;
+    - la matrice di uscita, riscritta a ogni finestra (copiarla se serve conservarla).
+    """
+
+    def __init__(self, antennas=("rx0", "rx1"), bin_range=DEFAULT_BIN_RANGE, channel=DEFAULT_CHANNEL,
+                 window=DEFAULT_WINDOW, hop=DEFAULT_WINDOW, normalization="log", dtype=np.float32,
+                 channel_fusion="single", clutter="none", clutter_alpha=DEFAULT_CLUTTER_ALPHA):
+        if window < 1 or hop < 1:
+            raise ValueError(f"window and hop must be positive, got window={window}, hop={hop}")
+        if normalization not in NORMALIZATIONS:
+            raise ValueError(f"Unknown normalization '{normalization}', expected one of {NORMALIZATIONS}")
+        self.antennas = tuple(antennas)
+        self.bin_range = tuple(bin_range)
+        self.channel = channel
+        self.channel_fusion = check_channel_fusion(channel_fusion)
+        # Un filtro del clutter per antenna, con uno stato di O(bins) valori
+        self._clutter = [ClutterFilter(clutter, clutter_alpha) for _ in self.antennas] if clutter != "none" else None
+        self.window = window
+        self.hop = hop
+        self.normalization = normalization
+
+        n_bins = self.bin_range[1] - self.bin_range[0]
+        self.width = n_bins * len(self.antennas)
+        # Colonne di ogni antenna nella riga concatenata
+        self._columns = [slice(i * n_bins, (i + 1) * n_bins) for i in range(len(self.antennas))]
+
+        self._rows = np.zeros((2 * window, self.width), dtype=dtype)
+        self._row_min = np.zeros(window, dtype=dtype)
+        self._row_max = np.zeros(window, dtype=dtype)
+        self._row = np.zeros((1, self.width), dtype=dtype)
+        self._out = np.zeros((window, self.width), dtype=dtype)
+        self.frames_seen = 0
+
+    @classmethod
+    def from_config(cls, config, hop=None):
+        """Preprocessore con gli stessi parametri di una PipelineConfig (window = max_height)."""
+        if config.feature != "range_time":
+            raise ValueError(f"Streaming supports range-time images only, got feature '{config.feature}'")
+        window = config.max_height or DEFAULT_WINDOW
+        return cls(
+            antennas=config.antennas, bin_range=config.bin_range, channel=config.sensor_spec.channel,
+            window=window, hop=hop or window, normalization=config.normalization,
+            channel_fusion=config.channel_fusion, clutter=config.clutter, clutter_alpha=config.clutter_alpha,
+        )
+
+    def reset(self):
+        """Dimentica i frame ricevuti (es. cambio di paziente); la memoria resta allocata."""
+        self.frames_seen = 0
+        for clutter_filter in self._clutter or ():
+            clutter_filter.reset()
+
+    def _frame_list(self, frames):
+        if isinstance(frames, dict):
+            try:
+                return [frames[rx_key] for rx_key in self.antennas]
+            except KeyError as e:
+                raise ValueError(f"Missing frame for antenna {e.args[0]}") from None
+        frames = list(frames)
+        if len(frames) != len(self.antennas):
+            raise ValueError(f"Expected one frame per antenna {self.antennas}, got {len(frames)}")
+        return frames
+
+    def push(self, frames):
+        """
+        Aggiunge un frame per antenna: dict {"rx0": frame, ...} o sequenza nell'ordine di antennas.
+        Un frame ha la forma di una riga dell'acquisizione: (canali, range_bins) per Infineon,
+        (range_bins,) per SR250Mate.
+        Restituisce la finestra (window, width) quando è pronta, altrimenti None.
+        """
+        row = self._row
+        for frame, columns in zip(self._frame_list(frames), self._columns):
+            # Stessa selezione della pipeline offline, su un'acquisizione di un solo frame
+            selected = select_capture_slice(np.asarray(frame)[np.newaxis], self.bin_range,
+                                            fusion_channel(self.channel_fusion, self.channel))
+            fused_magnitude(selected, self.channel_fusion, out=row[:, columns])
+        if self._clutter is not None:
+            for clutter_filter, columns in zip(self._clutter, self._columns):
+                clutter_filter.apply(row[:, columns])
+        if self.normalization == "log":
+            np.log1p(row, out=row)
+
+        slot = self.frames_seen % self.window
+        self._rows[slot] = row[0]
+        self._rows[slot + self.window] = row[0]
+        self._row_min[slot] = row.min()
+        self._row_max[slot] = row.max()
+        self.frames_seen += 1
+
+        if self.frames_seen < self.window or (self.frames_seen - self.window) % self.hop:
+            return None
+        return self._emit()
+
+    def current_window(self):
+        """Vista (senza copie) degli ultimi window frame, dal più vecchio al più recente."""
+        if self.frames_seen < self.window:
+            raise ValueError(f"Only {self.frames_seen} of {self.window} frames received")
+        start = self.frames_seen % self.window
+        return self._rows[start:start + self.window]
+
+    def _emit(self):
+        window = self.current_window()
+        out = self._out
+        if self.normalization == "none":
+            np.copyto(out, window)
+            return out
+        # normalize_and_log_transform: log1p è già applicato riga per riga,
+        # il minimo e il massimo della finestra derivano da quelli delle righe
+        data_min = self._row_min.min()
+        data_max = self._row_max.max()
+        if data_max == data_min:
+            out.fill(0)
+            return out
+        np.subtract(window, data_min, out=out)
+        np.divide(out, data_max - data_min, out=out)
+        return out
+
+    def run(self, captures):
+        """
+        Simula lo streaming di un'acquisizione già registrata: captures contiene una matrice
+        (frames, ...) per antenna. Restituisce la lista (copiata) delle finestre emesse.
+        """
+        captures = self._frame_list(captures)
+        windows = []
+        for frames in zip(*captures):
+            image = self.push(frames)
+            if image is not None:
+                windows.append(image.copy())
+        return windows
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+
+from .dataset import RAW_VALID_LABELS, RX_KEYS
+from .pipeline import SENSORS
+
+# Formato delle acquisizioni reali: forma di un frame e dtype del file .npy
+# - Infineon: float32 (frames, 4, 128)
+# - SR250Mate: complex64 (frames, 120)
+CAPTURE_FORMATS = {
+    "infineon": ((4, 128), np.float32),
+    "sr250mate": ((120,), np.complex64),
+}
+
+SYNTHETIC_SUBJECTS = ("Alberto", "Etienne")
+
+
+def synthetic_capture(sensor, n_frames=100, rng=None):
+    """
+    Acquisizione casuale con la forma e il dtype del sensore: rumore gaussiano più
+    un'eco che si sposta lentamente tra i range bins (un soggetto in movimento).
+    """
+    shape, dtype = CAPTURE_FORMATS[sensor]
+    rng = rng or np.random.default_rng()
+    data = rng.standard_normal((n_frames,) + shape).astype(np.float32)
+    if dtype == np.complex64:
+        data = data + 1j * rng.standard_normal(data.shape).astype(np.float32)
+    n_bins = shape[-1]
+    echo_bins = (10 + 5 * np.sin(np.linspace(0, 2 * np.pi, n_frames))).astype(np.intp) % n_bins
+    data[np.arange(n_frames), ..., echo_bins] += 20
+    return data.astype(dtype)
+
+
+def synthetic_base_name(index):
+    """Nome di acquisizione nel formato reale, es. "Etienne_Right arm up_Fisio_20250501-000001"."""
+    subject = SYNTHETIC_SUBJECTS[index % len(SYNTHETIC_SUBJECTS)]
+    label = RAW_VALID_LABELS[(index // len(SYNTHETIC_SUBJECTS)) % len(RAW_VALID_LABELS)].capitalize()
+    hours, seconds = divmod(index, 3600)
+    day = 1 + hours // 24 % 28
+    return f"{subject}_{label}_Fisio_202505{day:02d}-{hours % 24:02d}{seconds // 60:02d}{seconds % 60:02d}"
+
+
+def write_synthetic_dataset(folder, sensor, n_captures, n_frames=100, antennas=RX_KEYS, seed=0):
+    """
+    Scrive n_captures acquisizioni sintetiche (un file .npy per antenna) con i nomi
+    del dataset reale, es. ..._Infineon_rx0.npy. Restituisce il numero di file scritti.
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    tag = SENSORS[sensor].output_tag
+    written = 0
+    for index in range(n_captures):
+        base_name = synthetic_base_name(index)
+        for rx_key in antennas:
+            np.save(os.path.join(folder, f"{base_name}_{tag}_{rx_key}.npy"), synthetic_capture(sensor, n_frames, rng))
+            written += 1
+    return written
@@ -0,0 +1,187 @@
+import numpy as np
+
+# Normalizzazioni disponibili per le immagini:
+# - "none": magnitudine grezza (la scala di grigi va dal minimo al massimo dell'immagine)
+# - "log":  log1p della magnitudine, poi normalizzazione tra 0 e 1
+NORMALIZATIONS = ("none", "log")
+
+# Implementazioni della normalizzazione sul posto (normalize_and_log_transform_in_place):
+# - "numpy":   ufunc con out=, risultato identico bit per bit a normalize_and_log_transform
+# - "numexpr": stesse operazioni valutate a blocchi (e su più thread) da numexpr, se installato
+# - "numba":   un unico ciclo compilato per log1p + min/max e uno per la scala, se numba è installato
+# numexpr e numba possono differire nell'ultima cifra di log1p: i livelli di grigio dei PNG
+# sono identici solo con "numpy", che resta il predefinito.
+BACKENDS = ("numpy", "numexpr", "numba")
+
+
+def normalize_and_log_transform(data):
+    """
+    Applica una trasformazione logaritmica e poi normalizza i dati tra 0 e 1.
+    Questo aiuta a rendere visibili i segnali deboli e a standardizzare l'input per la CNN.
+    """
+    # log(1 + x) è preferibile a log(x) per gestire gli zero;
+    # in questo contesto (magnitudine) i valori sono già >= 0
+    data = np.log1p(data)
+
+    # Assicurati che non ci sia divisione per zero se tutti i valori sono uguali (es. array di zeri)
+    data_min = data.min()
+    data_max = data.max()
+    if data_max == data_min:
+        return np.zeros_like(data) # Ritorna un'immagine nera se i dati sono tutti uguali
+    return (data - data_min) / (data_max - data_min)
+
+
+def _numexpr_log_normalize(data):
+    import numexpr
+
+    numexpr.evaluate("log1p(data)", out=data, casting="same_kind")
+    data_min = data.min()
+    data_max = data.max()
+    if data_max == data_min:
+        data.fill(0)
+        return data
+    # Gli scalari hanno il dtype dei dati: il calcolo resta in float32 come con NumPy
+    local_dict = {"data": data, "data_min": data.dtype.type(data_min), "data_range": data.dtype.type(data_max - data_min)}
+    numexpr.evaluate("(data - data_min) / data_range", local_dict=local_dict, out=data, casting="same_kind")
+    return data
+
+
+_numba_kernel = None
+
+
+def _numba_log_normalize(data):
+    global _numba_kernel
+    if _numba_kernel is None:
+        import numba
+
+        @numba.njit(cache=True)
+        def kernel(flat):
+            data_min = np.inf
+            data_max = -np.inf
+            for i in range(flat.size):
+                value = np.log1p(flat[i])
+                flat[i] = value
+                data_min = min(data_min, value)
+                data_max = max(data_max, value)
+            if data_max == data_min:
+                flat[:] = 0
+                return
+            data_range = data_max - data_min
+            for i in range(flat.size):
+                flat[i] = (flat[i] - data_min) / data_range
+
+        _numba_kernel = kernel
+    if data.flags.c_contiguous:
+        _numba_kernel(data.reshape(-1))
+    else:
+        # Il kernel lavora su un vettore contiguo: una vista non contigua viene copiata e riscritta
+        work = np.ascontiguousarray(data)
+        _numba_kernel(work.reshape(-1))
+        data[...] = work
+    return data
+
+
+def check_backend(backend):
+    """Verifica che l'implementazione sia nota e, per numexpr/numba, che il modulo sia installato."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+    if backend != "numpy":
+        try:
+            __import__(backend)
+        except ImportError:
+            raise ValueError(f"Backend '{backend}' requires the {backend} package, which is not installed") from None
+    return backend
+
+
+def normalize_and_log_transform_in_place(data, backend="numpy"):
+    """
+    normalize_and_log_transform scritta nella matrice stessa (float): nessun array temporaneo.
+    Con backend="numpy" il risultato è identico bit per bit a quello della versione che alloca
+    (stessi ufunc nello stesso dtype); il minimo e il massimo sono calcolati una volta sola.
+    """
+    if backend == "numexpr":
+        return _numexpr_log_normalize(data)
+    if backend == "numba":
+        return _numba_log_normalize(data)
+    np.log1p(data, out=data)
+    data_min = data.min()
+    data_max = data.max()
+    if data_max == data_min:
+        data.fill(0)
+        return data
+    np.subtract(data, data_min, out=data)
+    np.divide(data, data_max - data_min, out=data)
+    return data
+
+
+def apply_normalization_in_place(data, normalization, backend="numpy"):
+    """Come apply_normalization, ma scrive il risultato in data."""
+    if normalization == "none":
+        return data
+    if normalization == "log":
+        return normalize_and_log_transform_in_place(data, backend)
+    raise ValueError(f"Unknown normalization '{normalization}', expected one of {NORMALIZATIONS}")
+
+
+def apply_normalization(data, normalization):
+    """Applica la normalizzazione scelta ("none" o "log") a un'immagine."""
+    if normalization == "none":
+        return data
+    if normalization == "log":
+        return normalize_and_log_transform(data)
+    raise ValueError(f"Unknown normalization '{normalization}', expected one of {NORMALIZATIONS}")
+
+
+def merge_antennas(antenna_data, out=None):
+    """
+    Concatena orizzontalmente le matrici (frames, bins) delle antenne: RX0 | RX1 | RX2.
+    Con out la concatenazione è scritta in quella matrice (frames, somma dei bins).
+    """
+    if out is None:
+        return np.hstack(antenna_data)
+    return np.concatenate(antenna_data, axis=1, out=out)
+
+
+def pad_to_height(data, height, out=None):
+    """
+    Copia i dati in una matrice di zeri di altezza fissa (righe di zeri in fondo).
+    Come la matrice np.zeros degli script originali, il risultato è sempre float64:
+    così i livelli di grigio delle immagini restano identici.
+    out: matrice float64 (max(height, righe), colonne) da riusare al posto di una nuova.
+    """
+    shape = (max(height, data.shape[0]), data.shape[1])
+    if out is None:
+        padded = np.zeros(shape)
+    else:
+        padded = out
+        padded[data.shape[0]:] = 0
+    padded[:data.shape[0]] = data
+    return padded
+
+
+class TransformWorkspace:
+    """
+    Buffer riutilizzati tra un'immagine e la successiva, uno per nome (es. "merged", "rx0").
+    Un buffer viene riallocato solo se serve più spazio (acquisizione più lunga, altra larghezza
+    o altro dtype): a regime nessuna immagine alloca memoria.
+    Le matrici restituite sono viste sui buffer: restano valide fino alla richiesta successiva
+    dello stesso buffer.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def buffer(self, name, shape, dtype=np.float32):
+        """Vista (shape) sul buffer name, contenuto non inizializzato."""
+        dtype = np.dtype(dtype)
+        rows, columns = shape
+        current = self._buffers.get(name)
+        if current is None or current.dtype != dtype or current.shape[1] != columns or current.shape[0] < rows:
+            capacity = rows if current is None or current.shape[1] != columns else max(rows, current.shape[0])
+            current = self._buffers[name] = np.empty((capacity, columns), dtype=dtype)
+        return current[:rows]
+
+    @property
+    def nbytes(self):
+        """Memoria occupata da tutti i buffer."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
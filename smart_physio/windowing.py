@@ -0,0 +1,68 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Gestione della coda di un'acquisizione (righe che non riempiono una finestra intera):
+# - "drop": le righe rimanenti vengono scartate
+# - "pad":  ultima finestra completata con righe di zeri fino alla lunghezza piena
+# - "keep": ultima finestra più corta (come le _partN di Function_prepare_Final_compact_form)
+TAIL_POLICIES = ("drop", "pad", "keep")
+
+
+def check_window(window, hop, tail):
+    """Verifica i parametri di segmentazione e restituisce hop (None = finestre disgiunte)."""
+    if window is None or window < 1:
+        raise ValueError(f"Invalid window length: {window}")
+    hop = window if hop is None else hop
+    if hop < 1:
+        raise ValueError(f"Invalid hop: {hop}")
+    if tail not in TAIL_POLICIES:
+        raise ValueError(f"Unknown tail policy '{tail}', expected one of {TAIL_POLICIES}")
+    return hop
+
+
+def tail_start(n_rows, window, hop):
+    """Prima riga della coda non coperta da finestre intere, o None se non c'è coda."""
+    if n_rows < window:
+        return 0 if n_rows else None
+    last_start = (n_rows - window) // hop * hop
+    # C'è coda solo se l'ultima finestra intera non arriva in fondo e la successiva parte prima della fine
+    # (con hop > window le righe tra una finestra e l'altra non sono coda)
+    next_start = last_start + hop
+    if last_start + window < n_rows and next_start < n_rows:
+        return next_start
+    return None
+
+
+def count_windows(n_rows, window, hop=None, tail="drop"):
+    """Numero di finestre prodotte da iter_windows per un'acquisizione di n_rows righe."""
+    hop = check_window(window, hop, tail)
+    full = (n_rows - window) // hop + 1 if n_rows >= window else 0
+    if tail != "drop" and tail_start(n_rows, window, hop) is not None:
+        return full + 1
+    return full
+
+
+def iter_windows(data, window, hop=None, tail="drop"):
+    """
+    Divide una matrice (frames, colonne) in finestre di window righe, una ogni hop righe.
+    Le finestre intere sono viste della matrice originale (sliding_window_view): nessuna
+    copia finché la finestra non viene normalizzata o salvata. Solo la coda con tail="pad"
+    viene copiata in una nuova matrice di zeri.
+    """
+    hop = check_window(window, hop, tail)
+    n_rows = data.shape[0]
+    if n_rows >= window:
+        # sliding_window_view mette la finestra nell'ultimo asse: (n, colonne, window)
+        views = sliding_window_view(data, window, axis=0)[::hop]
+        for view in views:
+            yield view.T if view.ndim == 2 else np.moveaxis(view, -1, 0)
+
+    start = tail_start(n_rows, window, hop)
+    if start is None or tail == "drop":
+        return
+    if tail == "keep":
+        yield data[start:]
+    else:
+        padded = np.zeros((window,) + data.shape[1:], dtype=data.dtype)
+        padded[:n_rows - start] = data[start:]
+        yield padded
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from smart_physio.fixed_point import FixedPointSpec, fixed_point_images, quantize_magnitude, reference_gray_image
+from smart_physio.pipeline import PipelineConfig
+
+
+def random_codes(rng, heights, n_bins=40, spec=FixedPointSpec()):
+    """Codici di magnitudine delle antenne, su più ordini di grandezza (tutta la tabella del log)."""
+    codes = []
+    for height in heights:
+        magnitude = rng.lognormal(mean=2.0, sigma=2.5, size=(height, n_bins))
+        codes.append(quantize_magnitude(magnitude, spec.frac_bits)[0])
+    return codes
+
+
+def aligned_reference_codes(antenna_codes, rows):
+    """Prime rows righe di ogni antenna come liste, con righe di codici zero dove un'antenna è più corta."""
+    return [codes[:rows].tolist() + [[0] * codes.shape[1]] * (rows - min(rows, len(codes)))
+            for codes in antenna_codes]
+
+
+@pytest.mark.parametrize("normalization", ["log", "none"])
+@pytest.mark.parametrize("pad_height", [False, True])
+@pytest.mark.parametrize("max_height, heights, alignment", [
+    (None, (70, 70), "strict"),
+    (50, (70, 70), "strict"),
+    (100, (70, 70, 70), "strict"),
+    (None, (70, 55), "trim"),
+    (None, (55, 70, 62), "pad"),
+    (60, (70, 45), "pad"),
+])
+def test_vectorized_images_match_the_scalar_reference(normalization, pad_height, max_height, heights, alignment):
+    if pad_height and max_height is None:
+        pytest.skip("pad_height needs max_height")
+    spec = FixedPointSpec()
+    config = PipelineConfig(antennas=("rx0", "rx1", "rx2")[:len(heights)], normalization=normalization,
+                            max_height=max_height, pad_height=pad_height, alignment=alignment)
+    rng = np.random.default_rng(len(heights) * 1000 + (max_height or 0))
+    antenna_codes = random_codes(rng, heights, spec=spec)
+    images = list(fixed_point_images(config, antenna_codes, spec))
+    assert len(images) == 1
+
+    rows = min(heights) if alignment == "trim" else max(heights)
+    if max_height is not None:
+        rows = min(rows, max_height)
+    expected = reference_gray_image(aligned_reference_codes(antenna_codes, rows), normalization, spec,
+                                    max_height if pad_height else None)
+    np.testing.assert_array_equal(images[0], expected)
+
+
+@pytest.mark.parametrize("normalization", ["log", "none"])
+def test_split_windows_match_the_scalar_reference(normalization):
+    spec = FixedPointSpec()
+    config = PipelineConfig(normalization=normalization, max_height=30, split_height=True, tail="pad")
+    antenna_codes = random_codes(np.random.default_rng(7), (100, 100), spec=spec)
+    images = list(fixed_point_images(config, antenna_codes, spec))
+    # Finestre disgiunte di 30 righe; la coda (90-99) completata fino a 30 righe
+    starts = [0, 30, 60, 90]
+    assert len(images) == len(starts)
+    for image, start in zip(images, starts):
+        window = [codes[start:start + 30] for codes in antenna_codes]
+        expected = reference_gray_image([codes.tolist() for codes in window], normalization, spec, 30)
+        np.testing.assert_array_equal(image, expected)
+
+
+def test_constant_image_is_black():
+    spec = FixedPointSpec()
+    codes = [np.full((20, 40), 123, dtype=np.uint32)] * 2
+    image = next(fixed_point_images(PipelineConfig(normalization="log"), codes, spec))
+    np.testing.assert_array_equal(image, reference_gray_image([c.tolist() for c in codes], "log", spec))
+    assert not image.any()
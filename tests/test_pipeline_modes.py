@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from smart_physio.pipeline import PipelineConfig, run_pipeline
+from smart_physio.synthetic import write_synthetic_dataset
+
+
+def read_images(folder):
+    """{nome del PNG: byte} di una cartella di output."""
+    images = {}
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), "rb") as f:
+            images[name] = f.read()
+    return images
+
+
+@pytest.fixture(scope="module")
+def datasets(tmp_path_factory):
+    """Un dataset sintetico per sensore, con acquisizioni di lunghezza diversa dal max_height predefinito."""
+    root = tmp_path_factory.mktemp("datasets")
+    paths = {}
+    for sensor in ("infineon", "sr250mate"):
+        paths[sensor] = str(root / sensor)
+        write_synthetic_dataset(paths[sensor], sensor, n_captures=6, n_frames=90, seed=1)
+    return paths
+
+
+def run_modes(config, dataset_path, output_root, modes):
+    images = {}
+    for name, options in modes.items():
+        output_path = str(output_root / name)
+        result = run_pipeline(config, dataset_path, output_path, **options)
+        assert result.generated_images > 0
+        images[name] = read_images(output_path)
+    return images
+
+
+@pytest.mark.parametrize("sensor", ["infineon", "sr250mate"])
+@pytest.mark.parametrize("options", [
+    {},
+    {"normalization": "log"},
+    {"normalization": "log", "pad_height": True, "max_height": 100},
+    {"antennas": ("rx0", "rx1", "rx2"), "max_height": 60},
+])
+def test_serial_batch_and_workers_write_the_same_images(datasets, tmp_path, sensor, options):
+    config = PipelineConfig(sensor=sensor, **options)
+    images = run_modes(config, datasets[sensor], tmp_path, {
+        "serial": {},
+        "batch": {"batch": True},
+        "workers": {"workers": 2, "chunksize": 1},
+    })
+    assert images["serial"]
+    assert images["batch"] == images["serial"]
+    assert images["workers"] == images["serial"]
+
+
+@pytest.mark.parametrize("tail", ["drop", "pad", "keep"])
+def test_split_height_serial_and_workers_write_the_same_images(datasets, tmp_path, tail):
+    # La modalità batch non divide in finestre: solo seriale e pool di processi
+    config = PipelineConfig(normalization="log", max_height=40, split_height=True, hop=20, tail=tail)
+    images = run_modes(config, datasets["infineon"], tmp_path, {
+        "serial": {},
+        "workers": {"workers": 2, "chunksize": 1},
+    })
+    assert images["workers"] == images["serial"]
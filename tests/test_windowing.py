@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from smart_physio.windowing import TAIL_POLICIES, count_windows, iter_windows
+
+
+def naive_windows(data, window, hop, tail):
+    """
+    Segmentazione per definizione: inizi 0, hop, 2 * hop, ... prima della fine; finestre intere
+    quelle che entrano nelle righe, coda il primo inizio successivo se restano righe in fondo non
+    coperte da nessuna finestra intera.
+    """
+    n_rows = data.shape[0]
+    starts = range(0, n_rows, hop)
+    full = [start for start in starts if start + window <= n_rows]
+    rest = [start for start in starts if start + window > n_rows]
+    windows = [data[start:start + window] for start in full]
+    covered = full[-1] + window if full else 0
+    if tail == "drop" or not rest or covered >= n_rows:
+        return windows
+    start = rest[0]
+    if tail == "keep":
+        return windows + [data[start:]]
+    padded = np.zeros((window,) + data.shape[1:], dtype=data.dtype)
+    padded[:n_rows - start] = data[start:]
+    return windows + [padded]
+
+
+@pytest.mark.parametrize("tail", TAIL_POLICIES)
+def test_windows_match_naive_slicing(tail):
+    for n_rows in range(0, 31):
+        data = np.arange(n_rows * 2, dtype=np.float32).reshape(n_rows, 2)
+        for window in range(1, 13):
+            for hop in range(1, 15):
+                expected = naive_windows(data, window, hop, tail)
+                windows = list(iter_windows(data, window, hop, tail))
+                case = f"rows={n_rows} window={window} hop={hop} tail={tail}"
+                assert len(windows) == len(expected), case
+                assert count_windows(n_rows, window, hop, tail) == len(expected), case
+                for got, want in zip(windows, expected):
+                    np.testing.assert_array_equal(got, want, err_msg=case)
+
+
+def test_no_tail_when_last_window_reaches_the_end():
+    data = np.arange(100)[:, None]
+    starts = [(int(w[0, 0]), len(w)) for w in iter_windows(data, 40, 20, "keep")]
+    assert starts == [(0, 40), (20, 40), (40, 40), (60, 40)]
+
+
+def test_windows_on_3d_captures():
+    data = np.arange(25 * 4 * 3, dtype=np.float32).reshape(25, 4, 3)
+    for got, want in zip(iter_windows(data, 10, 5, "pad"), naive_windows(data, 10, 5, "pad")):
+        np.testing.assert_array_equal(got, want)